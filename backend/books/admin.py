@@ -1,13 +1,13 @@
 from django.contrib import admin
-from .models import Book, Author, Tag, Shelf, Chapter, Section, SubSection, PageRange
+from .models import Book, BookCoverImage, Author, Tag, Shelf, Chapter, Section, SubSection, PageRange, DuplicateCandidate
 
 
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
     list_display = ['title', 'primary_isbn_13', 'publisher', 'publication_date', 'source', 'created_at']
     list_filter = ['source', 'language', 'publication_date', 'created_at']
-    search_fields = ['title', 'subtitle', 'description', 'primary_isbn_13', 'isbn_10', 'publisher']
-    readonly_fields = ['id', 'created_at', 'updated_at']
+    search_fields = ['title', 'subtitle', 'description', 'primary_isbn_13', 'isbn_10', 'canonical_isbn', 'publisher']
+    readonly_fields = ['id', 'canonical_isbn', 'created_at', 'updated_at']
     filter_horizontal = ['authors']
     ordering = ['-created_at']
 
@@ -82,3 +82,21 @@ class PageRangeAdmin(admin.ModelAdmin):
             return f"Chapter: {obj.chapter.title}"
         return "No parent"
     get_parent.short_description = 'Parent Reference'
+
+
+@admin.register(DuplicateCandidate)
+class DuplicateCandidateAdmin(admin.ModelAdmin):
+    list_display = ['book_a', 'book_b', 'similarity', 'status', 'created_at']
+    list_filter = ['status']
+    search_fields = ['book_a__title', 'book_b__title']
+    readonly_fields = ['book_a', 'book_b', 'similarity', 'created_at', 'updated_at']
+    ordering = ['-similarity']
+
+
+@admin.register(BookCoverImage)
+class BookCoverImageAdmin(admin.ModelAdmin):
+    list_display = ['book', 'is_primary', 'content_type', 'width', 'height', 'uploaded_at']
+    list_filter = ['is_primary', 'content_type']
+    search_fields = ['book__title', 'source_url']
+    readonly_fields = ['variants', 'uploaded_at']
+    ordering = ['-uploaded_at']
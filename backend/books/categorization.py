@@ -0,0 +1,247 @@
+import logging
+import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+from django.core.cache import cache
+from django.db import transaction
+from preposition_core.background import run_in_background
+from .models import Book, Tag
+
+logger = logging.getLogger(__name__)
+
+MAX_CATEGORIES = 5
+CHUNK_SIZE = 500
+LIBRARY_LOCK_SECONDS = 1800  # Upper bound on one library run, after which the lock expires
+STATUS_SECONDS = 24 * 3600
+
+CATEGORY_KEYWORDS = {
+    'fiction': ['novel', 'story', 'tale', 'fiction', 'fantasy', 'mystery', 'romance', 'thriller', 'sci-fi', 'science fiction'],
+    'non-fiction': ['non-fiction', 'nonfiction', 'biography', 'autobiography', 'memoir', 'history', 'science', 'philosophy'],
+    'philosophy': ['philosophy', 'philosophical', 'ethics', 'metaphysics', 'epistemology', 'logic', 'moral', 'existential'],
+    'science': ['science', 'scientific', 'physics', 'chemistry', 'biology', 'mathematics', 'research', 'experiment'],
+    'history': ['history', 'historical', 'ancient', 'medieval', 'modern', 'war', 'battle', 'civilization'],
+    'biography': ['biography', 'autobiography', 'memoir', 'life story', 'personal', 'diary'],
+    'technology': ['technology', 'computer', 'software', 'programming', 'digital', 'internet', 'ai', 'artificial intelligence'],
+    'business': ['business', 'management', 'economics', 'finance', 'marketing', 'entrepreneurship', 'leadership'],
+    'self-help': ['self-help', 'personal development', 'motivation', 'success', 'happiness', 'mindfulness'],
+    'religion': ['religion', 'religious', 'spiritual', 'theology', 'faith', 'bible', 'quran', 'meditation'],
+    'politics': ['politics', 'political', 'government', 'policy', 'democracy', 'socialism', 'capitalism'],
+    'psychology': ['psychology', 'psychological', 'mental health', 'behavior', 'mind', 'therapy', 'counseling'],
+    'education': ['education', 'learning', 'teaching', 'academic', 'textbook', 'course', 'study'],
+    'art': ['art', 'artistic', 'painting', 'sculpture', 'design', 'creative', 'aesthetic'],
+    'literature': ['literature', 'literary', 'classic', 'poetry', 'drama', 'theater', 'play'],
+    'travel': ['travel', 'journey', 'adventure', 'exploration', 'geography', 'culture', 'destination'],
+    'cooking': ['cooking', 'recipe', 'food', 'culinary', 'kitchen', 'chef', 'gastronomy'],
+    'health': ['health', 'medical', 'medicine', 'wellness', 'fitness', 'nutrition', 'diet'],
+    'environment': ['environment', 'environmental', 'climate', 'ecology', 'sustainability', 'nature', 'conservation'],
+    'sports': ['sports', 'athletic', 'fitness', 'game', 'competition', 'olympic', 'team']
+}
+
+# Checked in order for fiction; the first matching sub-genre wins
+SUBGENRE_KEYWORDS = [
+    ('fantasy', ['fantasy', 'magic', 'wizard', 'dragon']),
+    ('mystery', ['mystery', 'detective', 'crime', 'murder']),
+    ('romance', ['romance', 'love', 'relationship']),
+    ('thriller', ['thriller', 'suspense', 'action']),
+    ('science-fiction', ['sci-fi', 'science fiction', 'space', 'future']),
+]
+
+SPECIFIC_CATEGORIES = {'philosophy', 'science', 'history', 'biography', 'technology'}
+
+
+def _compile(keywords: Iterable[str]) -> re.Pattern:
+    """Compile keywords into one word-bounded alternation, longest first, allowing plurals."""
+    alternatives = '|'.join(re.escape(keyword) for keyword in sorted(set(keywords), key=len, reverse=True))
+    return re.compile(rf'\b({alternatives})(?:e?s)?\b')
+
+
+def _build_keyword_index() -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+    """Map each keyword to its categories, and to the shorter keywords it contains.
+
+    The combined pattern reports only the longest keyword at each position, so
+    'science fiction' also credits 'science' and 'fiction' through this table.
+    """
+    categories_by_keyword = defaultdict(list)
+    for category, keywords in CATEGORY_KEYWORDS.items():
+        for keyword in keywords:
+            categories_by_keyword[keyword].append(category)
+    contained = {
+        keyword: [other for other in categories_by_keyword if re.search(rf'\b{re.escape(other)}\b', keyword)]
+        for keyword in categories_by_keyword
+    }
+    return dict(categories_by_keyword), contained
+
+
+_CATEGORIES_BY_KEYWORD, _CONTAINED_KEYWORDS = _build_keyword_index()
+_CATEGORY_RE = _compile(_CATEGORIES_BY_KEYWORD)
+_SUBGENRE_RES = [(subgenre, _compile(keywords)) for subgenre, keywords in SUBGENRE_KEYWORDS]
+
+
+def categorize_text(title: str, description: str = None, authors: List[str] = None) -> List[str]:
+    """Return categories for a book's title, description and author names."""
+    text = f"{title or ''} {description or ''} {' '.join(authors or [])}".lower()
+
+    matched = set()
+    for keyword in _CATEGORY_RE.findall(text):
+        matched.update(_CONTAINED_KEYWORDS[keyword])
+
+    scores = defaultdict(int)
+    for keyword in matched:
+        for category in _CATEGORIES_BY_KEYWORD[keyword]:
+            scores[category] += 1
+
+    # Stable sort keeps the table order between equal scores
+    order = {category: i for i, category in enumerate(CATEGORY_KEYWORDS)}
+    ranked = sorted(scores, key=lambda category: (-scores[category], order[category]))
+    categories = ranked[:MAX_CATEGORIES]
+
+    if 'fiction' in categories:
+        for subgenre, pattern in _SUBGENRE_RES:
+            if pattern.search(text):
+                if subgenre not in categories:
+                    categories.append(subgenre)
+                break
+    return categories
+
+
+def calculate_confidence(categories: List[str]) -> float:
+    """Confidence grows with the number of categories, boosted for specific ones."""
+    if not categories:
+        return 0.0
+    base_confidence = min(len(categories) * 0.2, 1.0)
+    specific_boost = sum(0.1 for category in categories if category in SPECIFIC_CATEGORIES)
+    return min(base_confidence + specific_boost, 1.0)
+
+
+def _categorize_chunk(rows: List[Tuple[str, str, str, List[str]]]) -> List[Tuple[str, List[str], float]]:
+    results = []
+    for book_id, title, description, authors in rows:
+        categories = categorize_text(title, description, authors)
+        results.append((book_id, categories, calculate_confidence(categories)))
+    return results
+
+
+def _book_rows(book_ids: Iterable) -> List[Tuple[str, str, str, List[str]]]:
+    """Load title, description and author names for books in two queries."""
+    books = {
+        str(pk): (title, description)
+        for pk, title, description in Book.objects.filter(id__in=book_ids).values_list('id', 'title', 'description')
+    }
+    authors = defaultdict(list)
+    for book_id, name in Book.authors.through.objects.filter(book_id__in=books).values_list('book_id', 'author__name'):
+        authors[str(book_id)].append(name)
+    return [(book_id, title, description, authors[book_id]) for book_id, (title, description) in books.items()]
+
+
+def categorize_books(book_ids: Iterable, workers: int = 1, chunk_size: int = CHUNK_SIZE) -> Dict[str, Dict]:
+    """Categorize many books, splitting the work into chunks across worker processes."""
+    rows = _book_rows(book_ids)
+    chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunk_results = list(executor.map(_categorize_chunk, chunks))
+    else:
+        chunk_results = [_categorize_chunk(chunk) for chunk in chunks]
+
+    return {
+        book_id: {'categories': categories, 'confidence': confidence}
+        for results in chunk_results
+        for book_id, categories, confidence in results
+    }
+
+
+def apply_category_tags(categories_by_library_book: Dict[int, List[str]]) -> int:
+    """Tag library books with their categories; returns the number of tag links created."""
+    from libraries.models import LibraryBookTag
+
+    names = {name for categories in categories_by_library_book.values() for name in categories}
+    if not names:
+        return 0
+
+    with transaction.atomic():
+        tags = {tag.name: tag.id for tag in Tag.objects.filter(name__in=names)}
+        for name in names - set(tags):
+            # Few distinct categories; get_or_create keeps tag signals firing
+            tags[name] = Tag.objects.get_or_create(name=name)[0].id
+
+        links = [
+            LibraryBookTag(library_book_id=library_book_id, tag_id=tags[name])
+            for library_book_id, categories in categories_by_library_book.items()
+            for name in categories
+        ]
+        existing = set(
+            LibraryBookTag.objects.filter(library_book_id__in=categories_by_library_book)
+            .values_list('library_book_id', 'tag_id')
+        )
+        new_links = [link for link in links if (link.library_book_id, link.tag_id) not in existing]
+        LibraryBookTag.objects.bulk_create(new_links, batch_size=1000, ignore_conflicts=True)
+    return len(new_links)
+
+
+def categorize_library(library_id: int, workers: int = 1, auto_tag: bool = False,
+                       min_confidence: float = 0.0) -> Dict:
+    """Categorize every book of a library, optionally tagging it with the result."""
+    from libraries.models import LibraryBook
+
+    library_books = dict(
+        (str(book_id), library_book_id)
+        for library_book_id, book_id in LibraryBook.objects.filter(library_id=library_id).values_list('id', 'book_id')
+    )
+    results = categorize_books(library_books.keys(), workers=workers)
+
+    tagged = 0
+    if auto_tag:
+        tagged = apply_category_tags({
+            library_books[book_id]: result['categories']
+            for book_id, result in results.items()
+            if result['categories'] and result['confidence'] >= min_confidence
+        })
+
+    logger.info(f"Categorized {len(results)} books in library {library_id}, created {tagged} tag links")
+    return {'books': results, 'tagged': tagged}
+
+
+def _lock_key(library_id: int) -> str:
+    return f'books:categorize-library:{library_id}'
+
+
+def _status_key(library_id: int) -> str:
+    return f'books:categorize-library-status:{library_id}'
+
+
+def categorization_status(library_id: int) -> Optional[Dict]:
+    """Status of the latest background categorization of a library, with its results once done."""
+    return cache.get(_status_key(library_id))
+
+
+def schedule_library_categorization(library_id: int, auto_tag: bool = False, min_confidence: float = 0.0) -> bool:
+    """Categorize a library on the background pool unless a run for it is already going.
+
+    Returns False when another run holds the library's lock; its status
+    reports the outcome.
+    """
+    if not cache.add(_lock_key(library_id), True, LIBRARY_LOCK_SECONDS):
+        return False
+    cache.set(_status_key(library_id), {'status': 'running'}, STATUS_SECONDS)
+    run_in_background(_categorize_library_locked, library_id, auto_tag, min_confidence)
+    return True
+
+
+def _categorize_library_locked(library_id: int, auto_tag: bool, min_confidence: float) -> Dict:
+    try:
+        result = categorize_library(library_id, auto_tag=auto_tag, min_confidence=min_confidence)
+    except Exception:
+        cache.set(_status_key(library_id), {'status': 'failed'}, STATUS_SECONDS)
+        raise
+    else:
+        cache.set(_status_key(library_id), {
+            'status': 'done',
+            'count': len(result['books']),
+            'tagged': result['tagged'],
+            'results': result['books'],
+        }, STATUS_SECONDS)
+        return result
+    finally:
+        cache.delete(_lock_key(library_id))
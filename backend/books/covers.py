@@ -0,0 +1,326 @@
+"""
+Cover search and the local cover cache.
+
+``search_covers`` queries Google Books and Open Library concurrently and
+caches the combined results. ``cache_cover`` downloads a chosen cover once,
+stores the original next to its ``BookCoverImage`` row and, when Pillow is
+installed, renders resized WebP and JPEG variants that are served with
+long-lived cache headers instead of hot-linking the remote image.
+
+Because the URL to cache comes from the client, downloads are limited to the
+cover providers' hosts (``COVER_ALLOWED_HOSTS``). Each host must resolve to
+public addresses only, and redirects are followed one hop at a time so every
+hop passes the same checks.
+"""
+import hashlib
+import io
+import ipaddress
+import logging
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+from ingest.http_client import http_client
+from .models import Book, BookCoverImage
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is in requirements.txt; without it only the original is served
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Bounding boxes (width, height); covers are scaled down to fit, never up
+COVER_VARIANTS = {
+    'thumbnail': (96, 144),
+    'list': (240, 360),
+    'detail': (600, 900),
+}
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+# Originals are served from our origin, so only plain raster formats are accepted
+ORIGINAL_EXTENSIONS = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/gif': 'gif', 'image/webp': 'webp'}
+MAX_RESULTS = 10
+MAX_REDIRECTS = 3
+DEFAULT_ALLOWED_HOSTS = ['books.google.com', 'books.googleusercontent.com', 'covers.openlibrary.org', 'archive.org']
+
+
+class CoverDownloadError(Exception):
+    """The chosen cover could not be downloaded or is not an image."""
+
+
+class CoverURLNotAllowed(CoverDownloadError):
+    """The cover URL is not on a cover provider's host or resolves to an internal address."""
+
+
+def _google_covers(title: str = None, author: str = None, isbn: str = None) -> List[Dict]:
+    """Search Google Books API for cover images."""
+    query_parts = []
+    if isbn:
+        query_parts.append(f"isbn:{isbn}")
+    if title:
+        query_parts.append(f'"{title}"')
+    if author:
+        query_parts.append(f'"{author}"')
+
+    params = {
+        'q': " ".join(query_parts),
+        'maxResults': 5,
+        'fields': 'items(volumeInfo(title,authors,imageLinks))'
+    }
+    response = http_client.get(
+        "https://www.googleapis.com/books/v1/volumes", params=params, timeout=10, provider='google_books'
+    )
+    response.raise_for_status()
+
+    covers = []
+    for item in response.json().get('items', []):
+        volume_info = item.get('volumeInfo', {})
+        image_links = volume_info.get('imageLinks', {})
+
+        # Try different image sizes
+        for size in ['extraLarge', 'large', 'medium', 'small', 'thumbnail']:
+            if size in image_links:
+                covers.append({
+                    'url': image_links[size].replace('http://', 'https://'),
+                    'source': 'Google Books',
+                    'title': volume_info.get('title', ''),
+                    'authors': volume_info.get('authors', [])
+                })
+                break
+    return covers
+
+
+def _open_library_covers(isbn: str) -> List[Dict]:
+    """Search Open Library API for cover images."""
+    params = {
+        'bibkeys': f'ISBN:{isbn}',
+        'format': 'json',
+        'jscmd': 'data'
+    }
+    response = http_client.get("https://openlibrary.org/api/books", params=params, timeout=10, provider='open_library')
+    response.raise_for_status()
+
+    book_data = response.json().get(f'ISBN:{isbn}')
+    if not book_data:
+        return []
+    # The data view returns one object of sized URLs; prefer the largest
+    cover_data = book_data.get('cover') or {}
+    if isinstance(cover_data, dict):
+        urls = [cover_data[size] for size in ('large', 'medium', 'small') if cover_data.get(size)][:1]
+    else:
+        urls = [cover['url'] for cover in cover_data if isinstance(cover, dict) and 'url' in cover]
+    return [{
+        'url': url,
+        'source': 'Open Library',
+        'title': book_data.get('title', ''),
+        'authors': [author.get('name', '') for author in book_data.get('authors', [])]
+    } for url in urls]
+
+
+_search_executor = None
+_search_executor_lock = threading.Lock()
+
+
+def _get_search_executor() -> ThreadPoolExecutor:
+    global _search_executor
+    if _search_executor is None:
+        with _search_executor_lock:
+            if _search_executor is None:
+                _search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='cover-search')
+    return _search_executor
+
+
+def _search_cache_key(title: str, author: str, isbn: str) -> str:
+    query = '\x1f'.join((value or '').strip().lower() for value in (title, author, isbn))
+    return 'covers:search:' + hashlib.sha1(query.encode()).hexdigest()
+
+
+def search_covers(title: str = None, author: str = None, isbn: str = None) -> List[Dict]:
+    """Search every cover source concurrently, returning unique covers in source order.
+
+    Results are cached for ``COVER_SEARCH_CACHE_SECONDS`` unless a source
+    failed or missed the deadline, so a transient outage is not remembered.
+    """
+    key = _search_cache_key(title, author, isbn)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    executor = _get_search_executor()
+    futures = [executor.submit(_google_covers, title, author, isbn)]
+    if isbn:
+        futures.append(executor.submit(_open_library_covers, isbn))
+    wait(futures, timeout=getattr(settings, 'COVER_SEARCH_DEADLINE_SECONDS', 12))
+
+    covers = []
+    complete = True
+    for future in futures:
+        if not future.done():
+            complete = False
+            continue
+        try:
+            covers.extend(future.result())
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"Cover search source failed: {e}")
+            complete = False
+
+    # Remove duplicates and limit results
+    unique_covers = []
+    seen_urls = set()
+    for cover in covers:
+        if cover['url'] not in seen_urls:
+            unique_covers.append(cover)
+            seen_urls.add(cover['url'])
+    unique_covers = unique_covers[:MAX_RESULTS]
+    if complete:
+        cache.set(key, unique_covers, getattr(settings, 'COVER_SEARCH_CACHE_SECONDS', 6 * 3600))
+    return unique_covers
+
+
+def _check_url(url: str):
+    """Raise ``CoverURLNotAllowed`` unless ``url`` is on a cover host that resolves to public addresses."""
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    if parts.scheme not in ('http', 'https') or not host:
+        raise CoverURLNotAllowed("Cover URL must be an http(s) URL")
+    allowed = getattr(settings, 'COVER_ALLOWED_HOSTS', DEFAULT_ALLOWED_HOSTS)
+    if not any(host == name or host.endswith('.' + name) for name in allowed):
+        raise CoverURLNotAllowed(f"Covers are not downloaded from {host}")
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)}
+    except (OSError, UnicodeError, ValueError) as e:
+        raise CoverDownloadError(f"Could not resolve {host}: {e}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%', 1)[0])
+        if ip.version == 6 and ip.ipv4_mapped:
+            ip = ip.ipv4_mapped
+        # Private, loopback, link-local and reserved ranges are all non-global
+        if not ip.is_global or ip.is_multicast:
+            raise CoverURLNotAllowed(f"{host} resolves to a non-public address")
+
+
+def _download(url: str) -> Tuple[bytes, str]:
+    max_bytes = getattr(settings, 'COVER_MAX_BYTES', 5 * 1024 * 1024)
+    try:
+        for _ in range(MAX_REDIRECTS + 1):
+            _check_url(url)
+            response = http_client.get(url, timeout=10, stream=True, allow_redirects=False)
+            if not response.is_redirect:
+                break
+            url = urljoin(url, response.headers['Location'])
+            response.close()
+        else:
+            raise CoverDownloadError(f"More than {MAX_REDIRECTS} redirects")
+        response.raise_for_status()
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+        if content_type not in ORIGINAL_EXTENSIONS:
+            raise CoverDownloadError(f"Unsupported cover type ({content_type or 'unknown'})")
+        data = bytearray()
+        for chunk in response.iter_content(64 * 1024):
+            data.extend(chunk)
+            if len(data) > max_bytes:
+                raise CoverDownloadError(f"Cover is larger than {max_bytes} bytes")
+    except requests.RequestException as e:
+        raise CoverDownloadError(f"Download failed: {e}")
+    return bytes(data), content_type
+
+
+def _render_variants(data: bytes) -> Optional[Dict]:
+    """Resize the original into every variant and format; None when Pillow is unavailable or fails."""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            source.load()
+            image = source.convert('RGB')
+    except Exception as e:
+        logger.warning(f"Could not decode cover image: {e}")
+        return None
+
+    rendered = {'width': image.width, 'height': image.height, 'variants': {}}
+    for name, box in COVER_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail(box, Image.LANCZOS)
+        files = {}
+        for fmt, (pil_format, _, options) in VARIANT_FORMATS.items():
+            buffer = io.BytesIO()
+            resized.save(buffer, pil_format, **options)
+            files[fmt] = buffer.getvalue()
+        rendered['variants'][name] = {'width': resized.width, 'height': resized.height, 'files': files}
+    return rendered
+
+
+def _delete_files(cover: BookCoverImage):
+    for path in [cover.image.name] + [
+        files[fmt] for files in cover.variants.values() for fmt in VARIANT_FORMATS if files.get(fmt)
+    ]:
+        default_storage.delete(path)
+
+
+def cache_cover(book: Book, url: str, make_primary: bool = True) -> BookCoverImage:
+    """Download a cover once and store it with its resized variants.
+
+    A cover already cached for this book and URL is reused; otherwise the
+    image is fetched, written under ``book_covers/<book>/<cover>/`` and
+    recorded as a ``BookCoverImage``. Raises ``CoverURLNotAllowed`` for URLs
+    outside the cover providers.
+    """
+    cover = BookCoverImage.objects.filter(book=book, source_url=url).first()
+    if cover is None:
+        data, content_type = _download(url)
+        cover = BookCoverImage(book=book, source_url=url, content_type=content_type)
+        base = f"book_covers/{book.id}/{cover.id}"
+        cover.image.save(f"original.{ORIGINAL_EXTENSIONS[content_type]}", ContentFile(data), save=False)
+
+        rendered = _render_variants(data)
+        if rendered:
+            cover.width, cover.height = rendered['width'], rendered['height']
+            for name, variant in rendered['variants'].items():
+                cover.variants[name] = {'width': variant['width'], 'height': variant['height']}
+                for fmt, content in variant['files'].items():
+                    cover.variants[name][fmt] = default_storage.save(f"{base}/{name}.{fmt}", ContentFile(content))
+        try:
+            with transaction.atomic():
+                cover.save()
+        except IntegrityError:
+            # Another request cached the same URL while this one was downloading
+            _delete_files(cover)
+            cover = BookCoverImage.objects.get(book=book, source_url=url)
+
+    if make_primary and not cover.is_primary:
+        with transaction.atomic():
+            book.cover_images.exclude(pk=cover.pk).update(is_primary=False)
+            cover.is_primary = True
+            cover.save(update_fields=['is_primary'])
+    return cover
+
+
+def cover_variant(cover: BookCoverImage, variant: str, accept: str = '') -> Tuple[str, str]:
+    """Return ``(storage path, content type)`` for a variant, preferring WebP when accepted."""
+    files = cover.variants.get(variant)
+    if not files:
+        return cover.image.name, cover.content_type
+    if 'image/webp' in accept and files.get('webp'):
+        return files['webp'], VARIANT_FORMATS['webp'][1]
+    return files['jpeg'], VARIANT_FORMATS['jpeg'][1]
+
+
+def cover_urls(cover: BookCoverImage, request=None) -> Dict[str, str]:
+    """URLs of every variant of a cached cover (plus the original)."""
+    urls = {}
+    for variant in list(COVER_VARIANTS) + ['original']:
+        url = reverse('cover-image', args=[cover.id, variant])
+        urls[variant] = request.build_absolute_uri(url) if request is not None else url
+    return urls
@@ -0,0 +1,205 @@
+import logging
+import re
+import unicodedata
+import zlib
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Set, Tuple
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from preposition_core.background import run_in_background
+from .models import Book, BookSignature, DuplicateCandidate
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 128
+BANDS = 32
+ROWS_PER_BAND = NUM_PERM // BANDS
+MAX_BUCKET_SIZE = 50  # Buckets larger than this are common words, not duplicates
+DEFAULT_THRESHOLD = 0.5
+SCAN_LOCK_KEY = 'books:duplicate-scan'
+SCAN_LOCK_SECONDS = 1800  # Upper bound on a scan, after which the lock expires
+
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.RandomState(20240901)  # Fixed seed keeps stored signatures comparable
+_PERM_A = _rng.randint(1, (1 << 31) - 1, size=NUM_PERM).astype(np.uint64)
+_PERM_B = _rng.randint(0, (1 << 31) - 1, size=NUM_PERM).astype(np.uint64)
+
+_NON_WORD_RE = re.compile(r'[^\w]+', re.UNICODE)
+_STOP_WORDS = {'the', 'a', 'an', 'and', 'of', 'edition', 'ed', 'vol', 'volume'}
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    words = _NON_WORD_RE.sub(' ', text.casefold()).split()
+    return ' '.join(word for word in words if word not in _STOP_WORDS)
+
+
+def _char_shingles(text: str, prefix: str, size: int = 3) -> Set[str]:
+    if len(text) <= size:
+        return {prefix + text} if text else set()
+    return {prefix + text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def book_shingles(title: str, authors: Iterable[str], publisher: str = None) -> Set[str]:
+    """Character shingles of title and authors, plus publisher words."""
+    shingles = _char_shingles(_normalize(title), 't:')
+    # Sort author name words so "Tzu, Sun" and "Sun Tzu" agree
+    for author in authors:
+        shingles |= _char_shingles(' '.join(sorted(_normalize(author).split())), 'a:')
+    shingles |= {f'p:{word}' for word in _normalize(publisher).split()}
+    return shingles
+
+
+def minhash(shingles: Set[str]) -> np.ndarray:
+    """Compute a MinHash signature with NUM_PERM universal hash functions."""
+    if not shingles:
+        return np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint32)
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode('utf-8')) & 0x7fffffff for s in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+    permuted = (np.outer(_PERM_A, hashes) + _PERM_B[:, None]) % _MERSENNE_PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def estimated_similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    return float(np.mean(sig_a == sig_b))
+
+
+def lsh_candidate_pairs(signatures: Dict[str, np.ndarray]) -> Set[Tuple[str, str]]:
+    """Bucket signatures band by band; books sharing any bucket become candidate pairs."""
+    pairs = set()
+    for band in range(BANDS):
+        start = band * ROWS_PER_BAND
+        buckets = defaultdict(list)
+        for book_id, signature in signatures.items():
+            buckets[signature[start:start + ROWS_PER_BAND].tobytes()].append(book_id)
+        for members in buckets.values():
+            if len(members) < 2 or len(members) > MAX_BUCKET_SIZE:
+                continue
+            members.sort()
+            for i, first in enumerate(members):
+                for second in members[i + 1:]:
+                    pairs.add((first, second))
+    return pairs
+
+
+def _load_book_fields() -> Dict[str, Dict]:
+    books = {
+        str(row['id']): {'title': row['title'], 'publisher': row['publisher'], 'authors': [], 'updated_at': row['updated_at']}
+        for row in Book.objects.values('id', 'title', 'publisher', 'updated_at').iterator()
+    }
+    for book_id, name in Book.authors.through.objects.values_list('book_id', 'author__name').iterator():
+        if str(book_id) in books:
+            books[str(book_id)]['authors'].append(name)
+    return books
+
+
+def refresh_signatures(books: Dict[str, Dict], batch_size: int = 1000) -> Dict[str, np.ndarray]:
+    """Return signatures for all books, recomputing only those changed since last run."""
+    signatures = {}
+    stale = []
+    for book_id, signature, computed_at in BookSignature.objects.values_list('book_id', 'signature', 'computed_at').iterator():
+        book = books.get(str(book_id))
+        if book and computed_at >= book['updated_at']:
+            signatures[str(book_id)] = np.frombuffer(bytes(signature), dtype=np.uint32)
+
+    for book_id, book in books.items():
+        if book_id not in signatures:
+            signatures[book_id] = minhash(book_shingles(book['title'], book['authors'], book['publisher']))
+            stale.append(book_id)
+
+    for i in range(0, len(stale), batch_size):
+        batch = stale[i:i + batch_size]
+        with transaction.atomic():
+            BookSignature.objects.filter(book_id__in=batch).delete()
+            BookSignature.objects.bulk_create([
+                BookSignature(book_id=book_id, signature=signatures[book_id].tobytes())
+                for book_id in batch
+            ])
+    return signatures
+
+
+def find_duplicate_candidates(threshold: float = DEFAULT_THRESHOLD) -> Dict:
+    """Find near-duplicate books with MinHash/LSH and store them as candidates."""
+    books = _load_book_fields()
+    signatures = refresh_signatures(books)
+
+    pairs = lsh_candidate_pairs(signatures)
+    matches = []
+    for first, second in pairs:
+        similarity = estimated_similarity(signatures[first], signatures[second])
+        if similarity >= threshold:
+            matches.append((first, second, similarity))
+
+    existing = {
+        (str(a), str(b)): (candidate_id, candidate_status)
+        for candidate_id, a, b, candidate_status in DuplicateCandidate.objects.values_list(
+            'id', 'book_a_id', 'book_b_id', 'status'
+        )
+    }
+    new_candidates = []
+    updated = 0
+    for first, second, similarity in matches:
+        candidate_id, _ = existing.pop((first, second), (None, None))
+        if candidate_id:
+            # Keep reviewer decisions; only refresh the score
+            updated += DuplicateCandidate.objects.filter(id=candidate_id, status='pending').update(similarity=similarity)
+        else:
+            new_candidates.append(DuplicateCandidate(book_a_id=first, book_b_id=second, similarity=similarity))
+    DuplicateCandidate.objects.bulk_create(new_candidates, ignore_conflicts=True)
+
+    # Pending pairs this scan no longer finds have been edited apart; reviewed ones are kept
+    unmatched = [candidate_id for candidate_id, candidate_status in existing.values() if candidate_status == 'pending']
+    removed = 0
+    for i in range(0, len(unmatched), 1000):
+        removed += DuplicateCandidate.objects.filter(id__in=unmatched[i:i + 1000], status='pending').delete()[0]
+
+    summary = {
+        'books': len(books),
+        'candidate_pairs': len(pairs),
+        'matches': len(matches),
+        'created': len(new_candidates),
+        'updated': updated,
+        'removed': removed,
+    }
+    logger.info(f"Duplicate scan complete: {summary}")
+    return summary
+
+
+@contextmanager
+def duplicate_scan_lock():
+    """Hold the duplicate scan lock for the block; yields False, without it, when a scan is running."""
+    acquired = cache.add(SCAN_LOCK_KEY, True, SCAN_LOCK_SECONDS)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            cache.delete(SCAN_LOCK_KEY)
+
+
+def schedule_duplicate_scan(threshold: float = DEFAULT_THRESHOLD) -> bool:
+    """Scan for duplicates on the background pool unless a scan is already running.
+
+    Concurrent scans would race on replacing the same signature rows, so
+    returns False when another scan holds the lock.
+    """
+    if not cache.add(SCAN_LOCK_KEY, True, SCAN_LOCK_SECONDS):
+        return False
+    run_in_background(_scan_locked, threshold)
+    return True
+
+
+def _scan_locked(threshold: float) -> Dict:
+    try:
+        return find_duplicate_candidates(threshold)
+    finally:
+        cache.delete(SCAN_LOCK_KEY)
+
+
+def invalidate_signatures(book_ids: Iterable) -> int:
+    """Drop stored signatures so the next scan recomputes them, for changes that leave ``updated_at`` alone."""
+    return BookSignature.objects.filter(book_id__in=list(book_ids)).delete()[0]
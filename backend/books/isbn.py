@@ -0,0 +1,65 @@
+import re
+from typing import Optional
+
+_NON_ISBN_RE = re.compile(r'[^0-9X]')
+
+
+def clean_isbn(value: Optional[str]) -> str:
+    """Strip hyphens, spaces and any other separators from an ISBN string."""
+    if not value:
+        return ''
+    return _NON_ISBN_RE.sub('', str(value).upper())
+
+
+def _isbn10_check_digit(body: str) -> str:
+    total = sum((10 - i) * int(digit) for i, digit in enumerate(body))
+    check = (11 - total % 11) % 11
+    return 'X' if check == 10 else str(check)
+
+
+def _isbn13_check_digit(body: str) -> str:
+    total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(body))
+    return str((10 - total % 10) % 10)
+
+
+def is_valid_isbn10(value: str) -> bool:
+    isbn = clean_isbn(value)
+    return bool(re.fullmatch(r'\d{9}[\dX]', isbn)) and _isbn10_check_digit(isbn[:9]) == isbn[9]
+
+
+def is_valid_isbn13(value: str) -> bool:
+    isbn = clean_isbn(value)
+    return bool(re.fullmatch(r'\d{13}', isbn)) and _isbn13_check_digit(isbn[:12]) == isbn[12]
+
+
+def isbn10_to_isbn13(value: str) -> Optional[str]:
+    """Convert an ISBN-10 to its 978-prefixed ISBN-13 equivalent."""
+    isbn = clean_isbn(value)
+    if not re.fullmatch(r'\d{9}[\dX]', isbn):
+        return None
+    body = '978' + isbn[:9]
+    return body + _isbn13_check_digit(body)
+
+
+def isbn13_to_isbn10(value: str) -> Optional[str]:
+    """Convert a 978-prefixed ISBN-13 to ISBN-10. 979 ISBNs have no ISBN-10 form."""
+    isbn = clean_isbn(value)
+    if not re.fullmatch(r'978\d{10}', isbn):
+        return None
+    body = isbn[3:12]
+    return body + _isbn10_check_digit(body)
+
+
+def normalize_isbn(value: Optional[str]) -> Optional[str]:
+    """Return the canonical ISBN-13 for any ISBN-10 or ISBN-13 input, or None.
+
+    Check digits are not enforced so that stored books with mistyped ISBNs
+    still resolve to themselves; use ``is_valid_isbn10``/``is_valid_isbn13``
+    where strict validation is wanted.
+    """
+    isbn = clean_isbn(value)
+    if re.fullmatch(r'\d{13}', isbn):
+        return isbn
+    if len(isbn) == 10:
+        return isbn10_to_isbn13(isbn)
+    return None
@@ -0,0 +1,62 @@
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from books.categorization import categorize_library
+from libraries.models import Library
+import time
+
+
+class Command(BaseCommand):
+    help = 'Categorize every book in a library by keyword analysis, optionally tagging them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'library_id',
+            type=int,
+            help='Library to categorize',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of worker processes for categorizing chunks of books',
+        )
+        parser.add_argument(
+            '--auto-tag',
+            action='store_true',
+            help='Tag each library book with its categories',
+        )
+        parser.add_argument(
+            '--min-confidence',
+            type=float,
+            default=0.0,
+            help='Only auto-tag books categorized with at least this confidence (0-1)',
+        )
+
+    def handle(self, *args, **options):
+        library_id = options['library_id']
+        if not Library.objects.filter(id=library_id).exists():
+            raise CommandError(f'Library {library_id} does not exist')
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+
+        started = time.monotonic()
+        result = categorize_library(
+            library_id,
+            workers=options['workers'],
+            auto_tag=options['auto_tag'],
+            min_confidence=options['min_confidence']
+        )
+        elapsed = time.monotonic() - started
+
+        counts = Counter(category for book in result['books'].values() for category in book['categories'])
+        for category, count in counts.most_common():
+            self.stdout.write(f'  {category}: {count}')
+
+        books = len(result['books'])
+        rate = books / elapsed if elapsed else books
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Categorized {books} books in {elapsed:.2f}s ({rate:.0f} books/s), "
+                f"created {result['tagged']} tag links"
+            )
+        )
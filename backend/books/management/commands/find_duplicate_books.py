@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from books.dedup import find_duplicate_candidates, duplicate_scan_lock, DEFAULT_THRESHOLD
+import time
+
+
+class Command(BaseCommand):
+    help = 'Find near-duplicate books using MinHash signatures and LSH bucketing'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=DEFAULT_THRESHOLD,
+            help='Minimum estimated similarity (0-1) for a pair to be stored as a candidate',
+        )
+
+    def handle(self, *args, **options):
+        threshold = options['threshold']
+        if not 0 < threshold <= 1:
+            raise CommandError('--threshold must be between 0 and 1')
+
+        with duplicate_scan_lock() as acquired:
+            if not acquired:
+                raise CommandError('A duplicate scan is already running')
+            started = time.monotonic()
+            summary = find_duplicate_candidates(threshold)
+            elapsed = time.monotonic() - started
+
+        self.stdout.write(
+            f"Scanned {summary['books']} books: {summary['candidate_pairs']} LSH candidate pairs, "
+            f"{summary['matches']} above threshold"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Duplicate scan complete in {elapsed:.2f}s: {summary['created']} new candidates, "
+                f"{summary['updated']} updated, {summary['removed']} removed"
+            )
+        )
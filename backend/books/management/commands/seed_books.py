@@ -2,6 +2,7 @@ from django.core.management.base import BaseCommand
 from django.db import transaction
 from books.models import Book, Author
 from libraries.models import Library
+from books.isbn import clean_isbn, normalize_isbn
 from ingest.clients import BookMetadataClient
 
 
@@ -33,24 +34,25 @@ class Command(BaseCommand):
         client = BookMetadataClient()
         created_books = []
         
+        # Fetch metadata for every new ISBN up front with batched provider requests
+        existing_books = Book.find_by_isbns(isbns)
+        metadata_by_isbn = client.lookup_many(
+            [isbn for isbn in isbns if normalize_isbn(isbn) not in existing_books]
+        )
+        
         for isbn in isbns:
             self.stdout.write(f"Processing ISBN: {isbn}")
             
             try:
                 # Check if book already exists
-                existing_book = Book.objects.filter(
-                    primary_isbn_13=isbn
-                ).first() or Book.objects.filter(
-                    isbn_10=isbn
-                ).first()
+                existing_book = Book.find_by_isbn(isbn)
                 
                 if existing_book:
                     self.stdout.write(f"Book already exists: {existing_book.title}")
                     created_books.append(existing_book)
                     continue
                 
-                # Lookup book metadata
-                metadata = client.lookup_by_isbn(isbn)
+                metadata = metadata_by_isbn.get(clean_isbn(isbn))
                 
                 if not metadata:
                     self.stdout.write(
@@ -58,6 +60,12 @@ class Command(BaseCommand):
                     )
                     continue
                 
+                existing_book = Book.find_by_isbn(metadata.get('primary_isbn_13')) or Book.find_by_isbn(metadata.get('isbn_10'))
+                if existing_book:
+                    self.stdout.write(f"Book already exists: {existing_book.title}")
+                    created_books.append(existing_book)
+                    continue
+                
                 with transaction.atomic():
                     # Create or get authors
                     authors = []
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-19 09:59
+
+from django.db import migrations, models
+
+
+def backfill_canonical_isbn(apps, schema_editor):
+    from books.isbn import normalize_isbn
+
+    Book = apps.get_model("books", "Book")
+    seen = set()
+    for book in Book.objects.order_by("created_at").only("id", "primary_isbn_13", "isbn_10").iterator():
+        canonical_isbn = normalize_isbn(book.primary_isbn_13) or normalize_isbn(book.isbn_10)
+        # Later duplicates of an ISBN keep a null canonical ISBN rather than failing the migration
+        if not canonical_isbn or canonical_isbn in seen:
+            continue
+        seen.add(canonical_isbn)
+        Book.objects.filter(id=book.id).update(canonical_isbn=canonical_isbn)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0003_chapter_section_subsection_pagerange_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="canonical_isbn",
+            field=models.CharField(
+                blank=True, editable=False, max_length=13, null=True, unique=True
+            ),
+        ),
+        migrations.RunPython(backfill_canonical_isbn, migrations.RunPython.noop),
+    ]
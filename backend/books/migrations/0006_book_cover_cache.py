@@ -0,0 +1,55 @@
+# Generated by Django 5.0.2 on 2026-10-19 10:26
+
+import books.models
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0005_booksignature_duplicatecandidate"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookCoverImage",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("source_url", models.URLField(blank=True, max_length=500)),
+                ("image", models.FileField(upload_to=books.models.cover_upload_path)),
+                ("content_type", models.CharField(default="image/jpeg", max_length=50)),
+                ("width", models.PositiveIntegerField(blank=True, null=True)),
+                ("height", models.PositiveIntegerField(blank=True, null=True)),
+                ("variants", models.JSONField(blank=True, default=dict)),
+                ("is_primary", models.BooleanField(default=False)),
+                ("uploaded_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "book",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cover_images",
+                        to="books.book",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-uploaded_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["book", "source_url"],
+                        name="books_bookc_book_id_aa03d4_idx",
+                    )
+                ],
+            },
+        ),
+    ]
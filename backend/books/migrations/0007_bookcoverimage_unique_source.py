@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-19 11:16
+
+from django.db import migrations, models
+
+
+def remove_duplicate_covers(apps, schema_editor):
+    BookCoverImage = apps.get_model("books", "BookCoverImage")
+    seen = set()
+    # Keep the primary (then newest) cover of each book and source URL
+    for cover in BookCoverImage.objects.order_by("-is_primary", "-uploaded_at").only("id", "book_id", "source_url").iterator():
+        key = (cover.book_id, cover.source_url)
+        if key in seen:
+            BookCoverImage.objects.filter(id=cover.id).delete()
+        seen.add(key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("books", "0006_book_cover_cache"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_covers, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name="bookcoverimage",
+            name="books_bookc_book_id_aa03d4_idx",
+        ),
+        migrations.AddConstraint(
+            model_name="bookcoverimage",
+            constraint=models.UniqueConstraint(
+                fields=("book", "source_url"), name="unique_book_cover_source"
+            ),
+        ),
+    ]
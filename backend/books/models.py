@@ -1,6 +1,7 @@
 import uuid
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from .isbn import normalize_isbn
 
 
 class Author(models.Model):
@@ -21,6 +22,8 @@ class Book(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     primary_isbn_13 = models.CharField(max_length=13, unique=True, null=True, blank=True)
     isbn_10 = models.CharField(max_length=10, null=True, blank=True)
+    # Canonical ISBN-13 derived from primary_isbn_13 or isbn_10, used for all lookups
+    canonical_isbn = models.CharField(max_length=13, unique=True, null=True, blank=True, editable=False)
     title = models.CharField(max_length=500)
     subtitle = models.CharField(max_length=500, null=True, blank=True)
     description = models.TextField(null=True, blank=True)
@@ -46,11 +49,65 @@ class Book(models.Model):
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        canonical_isbn = normalize_isbn(self.primary_isbn_13) or normalize_isbn(self.isbn_10)
+        if canonical_isbn != self.canonical_isbn:
+            # Duplicates left null by the backfill migration stay null rather than failing to save
+            taken = canonical_isbn and Book.objects.filter(canonical_isbn=canonical_isbn).exclude(pk=self.pk).exists()
+            self.canonical_isbn = None if taken else canonical_isbn
+        super().save(*args, **kwargs)
+
     @property
     def display_isbn(self):
         """Return the primary ISBN for display."""
         return self.primary_isbn_13 or self.isbn_10 or 'No ISBN'
 
+    @classmethod
+    def find_by_isbn(cls, isbn):
+        """Find a book by any ISBN-10 or ISBN-13 form of its ISBN."""
+        canonical_isbn = normalize_isbn(isbn)
+        if not canonical_isbn:
+            return None
+        return cls.objects.filter(canonical_isbn=canonical_isbn).first()
+
+    @classmethod
+    def find_by_isbns(cls, isbns):
+        """Map each canonical ISBN to its existing book with a single query."""
+        canonical_isbns = {normalize_isbn(isbn) for isbn in isbns} - {None}
+        return {
+            book.canonical_isbn: book
+            for book in cls.objects.filter(canonical_isbn__in=canonical_isbns)
+        }
+
+
+def cover_upload_path(instance, filename):
+    """Keep a cover's original and its variants together under one directory."""
+    return f"book_covers/{instance.book_id}/{instance.id}/{filename}"
+
+
+class BookCoverImage(models.Model):
+    """Locally cached cover: the downloaded original plus resized variants."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='cover_images')
+    source_url = models.URLField(max_length=500, blank=True)  # Where the original was downloaded from
+    image = models.FileField(upload_to=cover_upload_path)  # Original; FileField so Pillow stays optional
+    content_type = models.CharField(max_length=50, default='image/jpeg')
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    # {variant: {'width', 'height', 'webp': path, 'jpeg': path}}; empty when Pillow is unavailable
+    variants = models.JSONField(default=dict, blank=True)
+    is_primary = models.BooleanField(default=False)
+    uploaded_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-uploaded_at']
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'source_url'], name='unique_book_cover_source'),
+        ]
+
+    def __str__(self):
+        return f"Cover for {self.book.title}"
+
 
 class Chapter(models.Model):
     """Chapter model for book chapters."""
@@ -179,3 +236,39 @@ class Shelf(models.Model):
             )
             shelves.append(shelf)
         return shelves
+
+
+class BookSignature(models.Model):
+    """MinHash signature of a book's normalized title, authors and publisher."""
+    book = models.OneToOneField(Book, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    signature = models.BinaryField()  # uint32 MinHash values
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Signature for {self.book}"
+
+
+class DuplicateCandidate(models.Model):
+    """A pair of books that are likely duplicates of each other."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('dismissed', 'Dismissed'),
+        ('merged', 'Merged'),
+    ]
+
+    book_a = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    book_b = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='+')
+    similarity = models.FloatField()  # Estimated Jaccard similarity
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-similarity']
+        unique_together = ['book_a', 'book_b']
+        indexes = [
+            models.Index(fields=['status', 'similarity']),
+        ]
+
+    def __str__(self):
+        return f"{self.book_a} ~ {self.book_b} ({self.similarity:.2f})"
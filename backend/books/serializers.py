@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from .models import Book, Author, Tag, Shelf, Chapter, Section, SubSection, PageRange
+from .models import Book, Author, Tag, Shelf, Chapter, Section, SubSection, PageRange, DuplicateCandidate
+from .isbn import normalize_isbn
+from .covers import cover_urls
 
 
 class AuthorSerializer(serializers.ModelSerializer):
@@ -48,15 +50,45 @@ class ChapterSerializer(serializers.ModelSerializer):
 class BookSerializer(serializers.ModelSerializer):
     authors = AuthorSerializer(many=True, read_only=True)
     chapters = ChapterSerializer(many=True, read_only=True)
+    cover = serializers.SerializerMethodField()
 
     class Meta:
         model = Book
         fields = [
-            'id', 'primary_isbn_13', 'isbn_10', 'title', 'subtitle', 'description',
-            'publisher', 'publication_date', 'page_count', 'language', 'cover_url',
+            'id', 'primary_isbn_13', 'isbn_10', 'canonical_isbn', 'title', 'subtitle', 'description',
+            'publisher', 'publication_date', 'page_count', 'language', 'cover_url', 'cover',
             'toc_json', 'source', 'authors', 'chapters', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'canonical_isbn', 'created_at', 'updated_at']
+
+    def get_cover(self, obj):
+        """Local variant URLs of the cached copy of cover_url, or None to use cover_url itself."""
+        cover = next(
+            (image for image in obj.cover_images.all() if image.is_primary and image.source_url == obj.cover_url), None
+        )
+        return cover_urls(cover, self.context.get('request')) if cover else None
+
+
+class DuplicateBookSerializer(serializers.ModelSerializer):
+    authors = AuthorSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Book
+        fields = [
+            'id', 'primary_isbn_13', 'isbn_10', 'title', 'subtitle', 'publisher',
+            'publication_date', 'cover_url', 'source', 'authors'
+        ]
+        read_only_fields = fields
+
+
+class DuplicateCandidateSerializer(serializers.ModelSerializer):
+    book_a = DuplicateBookSerializer(read_only=True)
+    book_b = DuplicateBookSerializer(read_only=True)
+
+    class Meta:
+        model = DuplicateCandidate
+        fields = ['id', 'book_a', 'book_b', 'similarity', 'status', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'book_a', 'book_b', 'similarity', 'created_at', 'updated_at']
 
 
 class BookCreateSerializer(serializers.ModelSerializer):
@@ -68,6 +100,23 @@ class BookCreateSerializer(serializers.ModelSerializer):
             'toc_json', 'source'
         ]
 
+    def validate(self, attrs):
+        primary_isbn_13 = attrs.get('primary_isbn_13', getattr(self.instance, 'primary_isbn_13', None))
+        isbn_10 = attrs.get('isbn_10', getattr(self.instance, 'isbn_10', None))
+        canonical_isbn = normalize_isbn(primary_isbn_13) or normalize_isbn(isbn_10)
+        if self.instance is not None and canonical_isbn == (
+            normalize_isbn(self.instance.primary_isbn_13) or normalize_isbn(self.instance.isbn_10)
+        ):
+            # Unchanged ISBN: existing duplicates predate the canonical index
+            canonical_isbn = None
+        if canonical_isbn:
+            duplicates = Book.objects.filter(canonical_isbn=canonical_isbn)
+            if self.instance is not None:
+                duplicates = duplicates.exclude(pk=self.instance.pk)
+            if duplicates.exists():
+                raise serializers.ValidationError("A book with this ISBN already exists.")
+        return attrs
+
 
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
@@ -106,3 +155,18 @@ class PageRangeCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = PageRange
         fields = ['start_page', 'end_page']
+
+
+class CategorizeBatchSerializer(serializers.Serializer):
+    """Validate batch categorization parameters."""
+    library_id = serializers.IntegerField(required=False)
+    book_ids = serializers.ListField(child=serializers.CharField(), required=False, allow_empty=False)
+    auto_tag = serializers.BooleanField(default=False)
+    min_confidence = serializers.FloatField(default=0)
+
+    def validate(self, attrs):
+        if not attrs.get('library_id') and not attrs.get('book_ids'):
+            raise serializers.ValidationError("library_id or book_ids is required")
+        if attrs['auto_tag'] and not attrs.get('library_id'):
+            raise serializers.ValidationError("auto_tag requires library_id")
+        return attrs
@@ -0,0 +1,21 @@
+from django.db.models.signals import m2m_changed, post_save
+from django.dispatch import receiver
+from .dedup import invalidate_signatures
+from .models import Author, Book
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def invalidate_author_signatures(sender, instance, action, reverse, pk_set, **kwargs):
+    # Author edits do not touch Book.updated_at, which signature staleness is keyed on
+    if action in ('post_add', 'post_remove'):
+        invalidate_signatures(pk_set if reverse else [instance.pk])
+    elif action == 'post_clear' and not reverse:
+        invalidate_signatures([instance.pk])
+    elif action == 'pre_clear' and reverse:
+        # Afterwards the author's books can no longer be looked up
+        invalidate_signatures(instance.books.values_list('id', flat=True))
+
+@receiver(post_save, sender=Author)
+def invalidate_renamed_author_signatures(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_signatures(instance.books.values_list('id', flat=True))
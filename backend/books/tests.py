@@ -1,11 +1,28 @@
-from django.test import TestCase
+import io
+import shutil
+import socket
+import tempfile
+import time
+from unittest import mock
+import requests
+from requests.adapters import BaseAdapter
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth.models import User
-from .models import Book, Author, Tag, Shelf
+from .covers import cache_cover
+from .models import Book, Author, Tag, Shelf, BookCoverImage, BookSignature, DuplicateCandidate
+from .dedup import SCAN_LOCK_KEY, book_shingles, minhash, estimated_similarity
+from .categorization import categorize_text
+from .isbn import normalize_isbn, isbn10_to_isbn13, isbn13_to_isbn10, is_valid_isbn13
 from libraries.models import Library, LibraryBook
-from notes.models import Rating, Review
+from ingest.http_client import http_client
+from ingest.replay import ProviderCorpus, ReplayAdapter
+from notes.models import Note, Rating, Review
 
 
 class BookModelTest(TestCase):
@@ -130,6 +147,367 @@ class BookAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
 
+class ISBNNormalizationTest(TestCase):
+    def test_isbn_conversion(self):
+        """Test ISBN-10 and ISBN-13 conversion"""
+        self.assertEqual(isbn10_to_isbn13('0-306-40615-2'), '9780306406157')
+        self.assertEqual(isbn13_to_isbn10('978-0-306-40615-7'), '0306406152')
+        self.assertIsNone(isbn13_to_isbn10('9791234567896'))
+        self.assertTrue(is_valid_isbn13('9780306406157'))
+
+    def test_normalize_isbn(self):
+        """Test that all forms of an ISBN normalize to the same ISBN-13"""
+        self.assertEqual(normalize_isbn('0306406152'), '9780306406157')
+        self.assertEqual(normalize_isbn(' 978-0-306-40615-7 '), '9780306406157')
+        self.assertEqual(normalize_isbn('080442957x'), '9780804429573')
+        self.assertIsNone(normalize_isbn('not an isbn'))
+
+    def test_find_by_isbn(self):
+        """Test finding a book by any form of its ISBN"""
+        book = Book.objects.create(title="Experiments", isbn_10="0306406152")
+        self.assertEqual(book.canonical_isbn, '9780306406157')
+        self.assertEqual(Book.find_by_isbn('978-0-306-40615-7'), book)
+        self.assertEqual(Book.find_by_isbn('0-306-40615-2'), book)
+        self.assertIsNone(Book.find_by_isbn('9780000000002'))
+
+    def test_lookup_uses_canonical_isbn(self):
+        """Test that lookup finds a stored ISBN-13 book from its hyphenated ISBN-10"""
+        book = Book.objects.create(title="Experiments", primary_isbn_13="9780306406157")
+        response = self.client.post(reverse('book-lookup'), {'isbn': '0-306-40615-2'}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['id'], str(book.id))
+
+    def test_create_rejects_equivalent_isbn(self):
+        """Test that creating a book with an equivalent ISBN is rejected"""
+        Book.objects.create(title="Experiments", primary_isbn_13="9780306406157")
+        response = self.client.post(reverse('book-list'), {'title': 'Copy', 'isbn_10': '0306406152'}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_resave_backfilled_duplicate(self):
+        """Test that a legacy duplicate left without a canonical ISBN can still be saved and updated"""
+        original = Book.objects.create(title="Experiments", primary_isbn_13="9780306406157")
+        duplicate = Book.objects.create(title="Copy")
+        Book.objects.filter(id=duplicate.id).update(isbn_10='0306406152')
+        duplicate.refresh_from_db()
+
+        duplicate.title = "Experiments (copy)"
+        duplicate.save()
+        self.assertIsNone(duplicate.canonical_isbn)
+
+        response = self.client.patch(
+            reverse('book-detail', args=[duplicate.id]), {'title': 'Renamed copy'}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Book.find_by_isbn('0306406152'), original)
+
+
+class DuplicateDetectionTest(APITestCase):
+    def setUp(self):
+        self.sun_tzu = Author.objects.create(name="Sun Tzu")
+        self.book = Book.objects.create(title="The Art of War", publisher="Penguin Classics")
+        self.book.authors.add(self.sun_tzu)
+        self.variant = Book.objects.create(title="Art of War", publisher="Penguin")
+        self.variant.authors.add(Author.objects.create(name="Tzu, Sun"))
+        self.other = Book.objects.create(title="Meditations", publisher="Penguin Classics")
+        self.other.authors.add(Author.objects.create(name="Marcus Aurelius"))
+
+    def test_minhash_similarity(self):
+        """Test that MinHash similarity separates variants from unrelated books"""
+        sig_a = minhash(book_shingles("The Art of War", ["Sun Tzu"], "Penguin Classics"))
+        sig_b = minhash(book_shingles("Art of War", ["Tzu, Sun"], "Penguin"))
+        sig_c = minhash(book_shingles("Meditations", ["Marcus Aurelius"], "Penguin Classics"))
+        self.assertGreater(estimated_similarity(sig_a, sig_b), 0.7)
+        self.assertLess(estimated_similarity(sig_a, sig_c), 0.3)
+
+    def test_scan_lists_candidates(self):
+        """Test that a scan stores the near-duplicate pair and the endpoint lists it"""
+        response = self.client.post(reverse('duplicatecandidate-scan'))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(DuplicateCandidate.objects.count(), 1)
+
+        response = self.client.get(reverse('duplicatecandidate-list'), {'status': 'pending'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        pair = {response.data['results'][0]['book_a']['id'], response.data['results'][0]['book_b']['id']}
+        self.assertEqual(pair, {str(self.book.id), str(self.variant.id)})
+
+    def test_dismissed_candidates_stay_dismissed(self):
+        """Test that rescanning keeps a reviewer's decision"""
+        self.client.post(reverse('duplicatecandidate-scan'))
+        candidate = DuplicateCandidate.objects.get()
+        response = self.client.patch(
+            reverse('duplicatecandidate-detail', args=[candidate.id]), {'status': 'dismissed'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.post(reverse('duplicatecandidate-scan'))
+        self.assertEqual(DuplicateCandidate.objects.get().status, 'dismissed')
+
+    def test_scan_not_started_twice(self):
+        """Test that a scan requested while another runs is not started"""
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'dedup'}}
+        with self.settings(CACHES=locmem):
+            from django.core.cache import cache
+            cache.add(SCAN_LOCK_KEY, True)
+            with mock.patch('books.dedup.run_in_background') as schedule:
+                response = self.client.post(reverse('duplicatecandidate-scan'))
+            self.assertEqual(response.data['message'], 'Duplicate scan already running')
+            schedule.assert_not_called()
+            cache.delete(SCAN_LOCK_KEY)
+
+    def test_author_changes_refresh_signatures_and_candidates(self):
+        """Test that author edits invalidate signatures and pairs no longer matching are pruned"""
+        self.client.post(reverse('duplicatecandidate-scan'))
+        self.assertEqual(DuplicateCandidate.objects.count(), 1)
+        self.assertTrue(BookSignature.objects.filter(book=self.variant).exists())
+
+        self.variant.authors.set([Author.objects.get(name="Marcus Aurelius")])
+        self.assertFalse(BookSignature.objects.filter(book=self.variant).exists())
+        self.variant.title = "Meditations on Strategy"
+        self.variant.save()
+
+        self.client.post(reverse('duplicatecandidate-scan'))
+        pairs = {frozenset((str(a), str(b))) for a, b in DuplicateCandidate.objects.values_list('book_a_id', 'book_b_id')}
+        self.assertNotIn(frozenset((str(self.book.id), str(self.variant.id))), pairs)
+
+
+# Library runs report their status through the cache
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'categorize'}})
+class CategorizationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.library = Library.objects.create(name="Categorized Library")
+        self.novel = Book.objects.create(title="The Dragon Novel", description="A story of magic and wizards")
+        self.physics = Book.objects.create(title="Physics Research", description="Scientific experiments")
+        for book in (self.novel, self.physics):
+            LibraryBook.objects.create(library=self.library, book=book)
+
+    def test_keywords_match_whole_words(self):
+        """Test that keywords match on word boundaries, phrases credit their words"""
+        self.assertEqual(categorize_text("Said the painter"), [])
+        self.assertIn('art', categorize_text("Art of Painting"))
+        categories = categorize_text("A science fiction novel")
+        self.assertEqual(categories[0], 'fiction')
+        self.assertIn('science', categories)
+        self.assertIn('science-fiction', categories)
+
+    def _categorize_library(self, data):
+        """Start a library run, which completes inline in tests, and return its reported status."""
+        url = reverse('book-categorize-batch')
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        return self.client.get(url, {'library_id': self.library.id}).data
+
+    def test_categorize_batch_auto_tags_library(self):
+        """Test batch categorization tags every library book in bulk in the background"""
+        data = {'library_id': self.library.id, 'auto_tag': True}
+        result = self._categorize_library(data)
+        self.assertEqual(result['status'], 'done')
+        self.assertEqual(result['count'], 2)
+        self.assertIn('fantasy', result['results'][str(self.novel.id)]['categories'])
+
+        novel_tags = set(LibraryBook.objects.get(book=self.novel).tags.values_list('name', flat=True))
+        self.assertIn('fiction', novel_tags)
+        self.assertIn('science', LibraryBook.objects.get(book=self.physics).tags.values_list('name', flat=True))
+
+        # Re-running does not duplicate tag links
+        self.assertEqual(self._categorize_library(data)['tagged'], 0)
+
+    def test_library_categorized_once_at_a_time(self):
+        """Test that a library run already in progress is not started again"""
+        url = reverse('book-categorize-batch')
+        with mock.patch('books.categorization.run_in_background') as schedule:
+            response = self.client.post(url, {'library_id': self.library.id}, format='json')
+            self.assertEqual(response.data['message'], 'Categorization started')
+            response = self.client.post(url, {'library_id': self.library.id}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertEqual(response.data['message'], 'Categorization already running')
+        schedule.assert_called_once()
+        self.assertEqual(self.client.get(url, {'library_id': self.library.id}).data['status'], 'running')
+
+    def test_categorize_batch_parses_parameters(self):
+        """Test that auto_tag strings are parsed as booleans and a non-integer library_id is a 400"""
+        url = reverse('book-categorize-batch')
+        self.assertEqual(self._categorize_library({'library_id': self.library.id, 'auto_tag': 'false'})['tagged'], 0)
+        self.assertFalse(LibraryBook.objects.filter(library=self.library, tags__isnull=False).exists())
+
+        response = self.client.post(url, {'library_id': 'abc'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('library_id', response.data)
+
+
+# Smallest valid GIF: one white pixel
+PIXEL_GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+    b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+
+class ImageAdapter(BaseAdapter):
+    """Transport adapter serving one image, or a redirect to ``location``, and counting downloads."""
+
+    def __init__(self, content, content_type='image/gif', location=None):
+        super().__init__()
+        self.content = content
+        self.content_type = content_type
+        self.location = location
+        self.calls = 0
+
+    def send(self, request, **kwargs):
+        self.calls += 1
+        response = requests.Response()
+        response.status_code = 302 if self.location else 200
+        response.url = request.url
+        response.request = request
+        response.headers['Content-Type'] = self.content_type
+        if self.location:
+            response.headers['Location'] = self.location
+        response.raw = io.BytesIO(self.content)
+        return response
+
+    def close(self):
+        pass
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'cover-tests'}})
+class CoverTest(APITestCase):
+    def setUp(self):
+        self.book = Book.objects.create(title="The Art of War", primary_isbn_13="9781599869773")
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # Hosts resolve to a public address unless a test maps them elsewhere
+        self.addresses = {}
+        resolver = mock.patch('books.covers.socket.getaddrinfo', side_effect=self._getaddrinfo)
+        resolver.start()
+        self.addCleanup(resolver.stop)
+
+    def _getaddrinfo(self, host, port, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (self.addresses.get(host, '93.184.216.34'), port))]
+
+    def _mount(self, prefix, adapter):
+        http_client.mount(prefix, adapter)
+        self.addCleanup(http_client.session.adapters.pop, prefix)
+
+    def test_search_covers_concurrent_and_cached(self):
+        """Test that cover sources are queried in parallel and repeat searches are cached"""
+        corpus = ProviderCorpus(
+            google_books={'9781599869773': {'volumeInfo': {
+                'title': 'The Art of War',
+                'imageLinks': {'thumbnail': 'http://books.google.com/cover.jpg'},
+                'industryIdentifiers': [{'type': 'ISBN_13', 'identifier': '9781599869773'}],
+            }}},
+            open_library={'9781599869773': {'title': 'The Art of War', 'covers': [42]}},
+        )
+        adapter = ReplayAdapter(corpus, latency=0.2)
+        for prefix in ('https://www.googleapis.com/', 'https://openlibrary.org/'):
+            self._mount(prefix, adapter)
+
+        url = reverse('book-search-covers')
+        started = time.monotonic()
+        response = self.client.post(url, {'isbn': '9781599869773'}, format='json')
+        self.assertLess(time.monotonic() - started, 0.35)
+        self.assertEqual(
+            [cover['url'] for cover in response.data['covers']],
+            ['https://books.google.com/cover.jpg', 'https://covers.openlibrary.org/b/id/42-L.jpg']
+        )
+
+        self.client.post(url, {'isbn': '9781599869773'}, format='json')
+        self.assertEqual(sum(adapter.requests.values()), 2)
+
+    def test_cached_cover_is_downloaded_once_and_served_locally(self):
+        """Test that a chosen cover is stored once and served with long-lived cache headers"""
+        adapter = ImageAdapter(PIXEL_GIF)
+        self._mount('https://covers.openlibrary.org/', adapter)
+
+        url = reverse('book-cache-cover', args=[self.book.id])
+        response = self.client.post(url, {'url': 'https://covers.openlibrary.org/b/id/1-L.gif'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.post(url, {'url': 'https://covers.openlibrary.org/b/id/1-L.gif'}, format='json')
+        self.assertEqual(adapter.calls, 1)
+
+        book = self.client.get(reverse('book-detail', args=[self.book.id])).data
+        self.assertEqual(book['cover_url'], 'https://covers.openlibrary.org/b/id/1-L.gif')
+        image = self.client.get(book['cover']['thumbnail'])
+        self.assertEqual(image.status_code, status.HTTP_200_OK)
+        self.assertIn('immutable', image['Cache-Control'])
+        self.assertTrue(image['Content-Type'].startswith('image/'))
+        image.close()
+
+        # Changing cover_url without caching falls back to the remote URL
+        self.client.patch(reverse('book-detail', args=[self.book.id]), {'cover_url': 'https://covers.openlibrary.org/b/id/2-L.gif'}, format='json')
+        self.assertIsNone(self.client.get(reverse('book-detail', args=[self.book.id])).data['cover'])
+
+    def test_cache_cover_rejects_non_images(self):
+        """Test that non-image downloads are refused"""
+        self._mount('https://covers.openlibrary.org/', ImageAdapter(b'<svg/>', content_type='image/svg+xml'))
+        url = reverse('book-cache-cover', args=[self.book.id])
+        response = self.client.post(url, {'url': 'https://covers.openlibrary.org/b/id/1-L.svg'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_502_BAD_GATEWAY)
+
+    def test_cache_cover_refuses_internal_urls(self):
+        """Test that URLs off the cover hosts, or resolving to internal addresses, are never fetched"""
+        adapter = ImageAdapter(PIXEL_GIF)
+        for prefix in ('https://covers.openlibrary.org/', 'http://169.254.169.254/', 'https://intranet.example/'):
+            self._mount(prefix, adapter)
+        self.addresses['covers.openlibrary.org'] = '10.0.0.5'
+
+        url = reverse('book-cache-cover', args=[self.book.id])
+        for cover_url in (
+            'http://169.254.169.254/latest/meta-data/',
+            'https://intranet.example/1.gif',
+            'file:///etc/passwd',
+            'https://covers.openlibrary.org/b/id/1-L.gif',
+        ):
+            response = self.client.post(url, {'url': cover_url}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, cover_url)
+        self.assertEqual(adapter.calls, 0)
+
+    def test_cache_cover_checks_every_redirect(self):
+        """Test that redirects are followed only to allowed hosts"""
+        archive = ImageAdapter(PIXEL_GIF)
+        internal = ImageAdapter(PIXEL_GIF)
+        self._mount('https://covers.openlibrary.org/b/id/1', ImageAdapter(b'', location='https://ia800100.us.archive.org/1.gif'))
+        self._mount('https://covers.openlibrary.org/b/id/2', ImageAdapter(b'', location='http://localhost:8000/admin/'))
+        self._mount('https://ia800100.us.archive.org/', archive)
+        self._mount('http://localhost:8000/', internal)
+
+        url = reverse('book-cache-cover', args=[self.book.id])
+        response = self.client.post(url, {'url': 'https://covers.openlibrary.org/b/id/1-L.gif'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['source_url'], 'https://covers.openlibrary.org/b/id/1-L.gif')
+        self.assertEqual(archive.calls, 1)
+
+        response = self.client.post(url, {'url': 'https://covers.openlibrary.org/b/id/2-L.gif'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(internal.calls, 0)
+
+    def test_concurrent_cache_keeps_one_cover(self):
+        """Test that a cover cached by another request during the download is reused, not duplicated"""
+        self._mount('https://covers.openlibrary.org/', ImageAdapter(PIXEL_GIF))
+        cover_url = 'https://covers.openlibrary.org/b/id/1-L.gif'
+        existing = BookCoverImage.objects.create(book=self.book, source_url=cover_url, image='book_covers/existing.gif')
+
+        # The other request's row is not visible yet when this one looks it up
+        with mock.patch.object(BookCoverImage.objects, 'filter', return_value=BookCoverImage.objects.none()):
+            cover = cache_cover(self.book, cover_url)
+        self.assertEqual(cover.pk, existing.pk)
+        self.assertTrue(cover.is_primary)
+        self.assertEqual(BookCoverImage.objects.count(), 1)
+
+    def test_nested_books_prefetch_covers(self):
+        """Test that listing notes does not query covers once per referenced book"""
+        library_book = LibraryBook.objects.create(library=Library.objects.create(name="Covers"), book=self.book)
+        for i in range(3):
+            book = Book.objects.create(title=f"Book {i}")
+            Note.objects.create(library_book=library_book, ref_book=book, title=f"Note {i}", content_markdown="")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('note-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sum('books_bookcoverimage' in query['sql'] for query in queries.captured_queries), 1)
+
+
 class AuthorAPITest(APITestCase):
     def setUp(self):
         self.author = Author.objects.create(name="Test Author")
@@ -1,23 +1,56 @@
-from rest_framework import viewsets, status
+from rest_framework import viewsets, status, mixins
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import transaction
-from .models import Book, Author, Tag, Shelf, Chapter, Section, SubSection, PageRange
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from .models import Book, BookCoverImage, Author, Tag, Shelf, Chapter, Section, SubSection, PageRange, DuplicateCandidate
 from .serializers import (
     BookSerializer, BookCreateSerializer, AuthorSerializer,
     TagSerializer, ShelfSerializer, ChapterSerializer, SectionSerializer,
     SubSectionSerializer, PageRangeSerializer, ChapterCreateSerializer,
-    SectionCreateSerializer, SubSectionCreateSerializer, PageRangeCreateSerializer
+    SectionCreateSerializer, SubSectionCreateSerializer, PageRangeCreateSerializer,
+    DuplicateCandidateSerializer, CategorizeBatchSerializer
+)
+from .dedup import schedule_duplicate_scan
+from .covers import COVER_VARIANTS, CoverDownloadError, CoverURLNotAllowed, cache_cover, cover_urls, cover_variant, search_covers
+from .categorization import (
+    categorize_text, calculate_confidence, categorize_books, categorization_status, schedule_library_categorization
 )
 from ingest.clients import BookMetadataClient
-import requests
+from ingest.bulk import BulkIngest
+from libraries.models import Library
 import json
 import re
 from typing import List, Dict, Optional
 
 
+@require_GET
+def cover_image(request, cover_id, variant):
+    """Serve a cached cover variant; paths are immutable, so browsers may cache them for a year."""
+    if variant not in COVER_VARIANTS and variant != 'original':
+        raise Http404('Unknown cover variant')
+    try:
+        cover = BookCoverImage.objects.get(pk=cover_id)
+    except BookCoverImage.DoesNotExist:
+        raise Http404('Cover not found')
+    
+    path, content_type = cover_variant(cover, variant, request.headers.get('Accept', ''))
+    try:
+        response = FileResponse(default_storage.open(path), content_type=content_type)
+    except FileNotFoundError:
+        raise Http404('Cover file missing')
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response['Vary'] = 'Accept'
+    return response
+
+
 class AuthorViewSet(viewsets.ModelViewSet):
     queryset = Author.objects.all()
     serializer_class = AuthorSerializer
@@ -126,7 +159,9 @@ class ShelfViewSet(viewsets.ModelViewSet):
             from libraries.models import ShelfItem
             from libraries.serializers import LibraryBookSerializer
             
-            shelf_items = ShelfItem.objects.filter(shelf=shelf).select_related('library_book__book')
+            shelf_items = ShelfItem.objects.filter(shelf=shelf).select_related('library_book__book').prefetch_related(
+                'library_book__book__cover_images'
+            )
             library_books = [item.library_book for item in shelf_items]
             
             serializer = LibraryBookSerializer(library_books, many=True)
@@ -231,8 +266,38 @@ class PageRangeViewSet(viewsets.ModelViewSet):
         return queryset
 
 
+class DuplicateCandidateViewSet(mixins.ListModelMixin,
+                                mixins.RetrieveModelMixin,
+                                mixins.UpdateModelMixin,
+                                viewsets.GenericViewSet):
+    """Near-duplicate book pairs found by the MinHash/LSH scan."""
+    queryset = DuplicateCandidate.objects.select_related('book_a', 'book_b').prefetch_related(
+        'book_a__authors', 'book_b__authors'
+    )
+    serializer_class = DuplicateCandidateSerializer
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_fields = ['status']
+    ordering_fields = ['similarity', 'created_at']
+    ordering = ['-similarity']
+
+    @action(detail=False, methods=['post'])
+    def scan(self, request):
+        """Start a background scan for near-duplicate books."""
+        threshold = request.data.get('threshold', 0.5)
+        try:
+            threshold = float(threshold)
+        except (TypeError, ValueError):
+            return Response({'error': 'threshold must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < threshold <= 1:
+            return Response({'error': 'threshold must be between 0 and 1'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not schedule_duplicate_scan(threshold):
+            return Response({'message': 'Duplicate scan already running'}, status=status.HTTP_202_ACCEPTED)
+        return Response({'message': 'Duplicate scan started'}, status=status.HTTP_202_ACCEPTED)
+
+
 class BookViewSet(viewsets.ModelViewSet):
-    queryset = Book.objects.all()
+    queryset = Book.objects.prefetch_related('cover_images')
     serializer_class = BookSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['source', 'language']
@@ -255,12 +320,8 @@ class BookViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Try to find existing book
-        book = Book.objects.filter(
-            primary_isbn_13=isbn
-        ).first() or Book.objects.filter(
-            isbn_10=isbn
-        ).first()
+        # Try to find existing book by any form of the ISBN
+        book = Book.find_by_isbn(isbn)
         
         if book:
             serializer = self.get_serializer(book)
@@ -285,12 +346,8 @@ class BookViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Try to find existing book
-        book = Book.objects.filter(
-            primary_isbn_13=isbn
-        ).first() or Book.objects.filter(
-            isbn_10=isbn
-        ).first()
+        # Try to find existing book by any form of the ISBN
+        book = Book.find_by_isbn(isbn)
         
         if book:
             serializer = self.get_serializer(book)
@@ -306,6 +363,12 @@ class BookViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
+        # The provider may report an ISBN form we already hold under another book record
+        book = Book.find_by_isbn(metadata.get('primary_isbn_13')) or Book.find_by_isbn(metadata.get('isbn_10'))
+        if book:
+            serializer = self.get_serializer(book)
+            return Response(serializer.data)
+        
         try:
             with transaction.atomic():
                 # Create or get authors
@@ -345,6 +408,42 @@ class BookViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=False, methods=['post'])
+    def bulk_ingest(self, request):
+        """Create books for many ISBNs, streaming one NDJSON progress line per ISBN."""
+        isbns = request.data.get('isbns')
+        if not isinstance(isbns, list) or not isbns:
+            return Response(
+                {'error': 'isbns must be a non-empty list'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        max_isbns = getattr(settings, 'BULK_INGEST_MAX_ISBNS', 1000)
+        if len(isbns) > max_isbns:
+            return Response(
+                {'error': f'At most {max_isbns} ISBNs can be ingested per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        library = None
+        library_id = request.data.get('library_id')
+        if library_id:
+            try:
+                library = Library.objects.get(id=library_id)
+            except (Library.DoesNotExist, ValueError):
+                return Response(
+                    {'error': 'Library not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+        events = BulkIngest(library=library).run([str(isbn) for isbn in isbns])
+        response = StreamingHttpResponse(
+            (json.dumps(event, cls=DjangoJSONEncoder) + '\n' for event in events),
+            content_type='application/x-ndjson'
+        )
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Let nginx pass progress lines through unbuffered
+        return response
+
     @action(detail=False, methods=['post'])
     def search_covers(self, request):
         """Search for book cover images from multiple sources."""
@@ -358,117 +457,39 @@ class BookViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        covers = []
-        
-        # Search Google Books API
-        if title or isbn:
-            try:
-                google_covers = self._search_google_covers(title, author, isbn)
-                covers.extend(google_covers)
-            except Exception as e:
-                print(f"Google Books cover search failed: {e}")
-        
-        # Search Open Library API
-        if isbn:
-            try:
-                openlib_covers = self._search_openlib_covers(isbn)
-                covers.extend(openlib_covers)
-            except Exception as e:
-                print(f"Open Library cover search failed: {e}")
-        
-        # Remove duplicates and limit results
-        unique_covers = []
-        seen_urls = set()
-        for cover in covers:
-            if cover['url'] not in seen_urls:
-                unique_covers.append(cover)
-                seen_urls.add(cover['url'])
-        
+        # Sources are queried concurrently and the combined results cached
         return Response({
-            'covers': unique_covers[:10]  # Limit to 10 results
+            'covers': search_covers(title, author, isbn)
         })
     
-    def _search_google_covers(self, title: str = None, author: str = None, isbn: str = None) -> List[Dict]:
-        """Search Google Books API for cover images."""
-        covers = []
-        
-        # Build search query
-        query_parts = []
-        if isbn:
-            query_parts.append(f"isbn:{isbn}")
-        if title:
-            query_parts.append(f'"{title}"')
-        if author:
-            query_parts.append(f'"{author}"')
-        
-        query = " ".join(query_parts)
-        
-        try:
-            url = "https://www.googleapis.com/books/v1/volumes"
-            params = {
-                'q': query,
-                'maxResults': 5,
-                'fields': 'items(volumeInfo(title,authors,imageLinks))'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            if 'items' in data:
-                for item in data['items']:
-                    volume_info = item.get('volumeInfo', {})
-                    image_links = volume_info.get('imageLinks', {})
-                    
-                    # Try different image sizes
-                    for size in ['extraLarge', 'large', 'medium', 'small', 'thumbnail']:
-                        if size in image_links:
-                            covers.append({
-                                'url': image_links[size].replace('http://', 'https://'),
-                                'source': 'Google Books',
-                                'title': volume_info.get('title', ''),
-                                'authors': volume_info.get('authors', [])
-                            })
-                            break
-        except Exception as e:
-            print(f"Google Books API error: {e}")
-        
-        return covers
-    
-    def _search_openlib_covers(self, isbn: str) -> List[Dict]:
-        """Search Open Library API for cover images."""
-        covers = []
+    @action(detail=True, methods=['post'])
+    def cache_cover(self, request, pk=None):
+        """Download a chosen cover once and serve resized local variants of it."""
+        book = self.get_object()
+        url = request.data.get('url') or book.cover_url
+        if not url:
+            return Response(
+                {'error': 'Cover URL is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         try:
-            # First get the book data
-            url = f"https://openlibrary.org/api/books"
-            params = {
-                'bibkeys': f'ISBN:{isbn}',
-                'format': 'json',
-                'jscmd': 'data'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            book_key = f'ISBN:{isbn}'
-            if book_key in data:
-                book_data = data[book_key]
-                covers_data = book_data.get('cover', [])
-                
-                for cover in covers_data:
-                    if isinstance(cover, dict) and 'url' in cover:
-                        covers.append({
-                            'url': cover['url'],
-                            'source': 'Open Library',
-                            'title': book_data.get('title', ''),
-                            'authors': [author.get('name', '') for author in book_data.get('authors', [])]
-                        })
-        except Exception as e:
-            print(f"Open Library API error: {e}")
-        
-        return covers
+            cover = cache_cover(book, url)
+        except CoverURLNotAllowed as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except CoverDownloadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+        
+        if book.cover_url != url:
+            book.cover_url = url
+            book.save(update_fields=['cover_url', 'updated_at'])
+        return Response({
+            'id': str(cover.id),
+            'source_url': cover.source_url,
+            'width': cover.width,
+            'height': cover.height,
+            'urls': cover_urls(cover, request)
+        })
 
     @action(detail=False, methods=['post'])
     def categorize(self, request):
@@ -505,80 +526,56 @@ class BookViewSet(viewsets.ModelViewSet):
             'confidence': self._calculate_confidence(categories)
         })
     
+    @action(detail=False, methods=['get', 'post'])
+    def categorize_batch(self, request):
+        """Categorize a list of books, or start categorizing a library in the background.
+
+        Library runs may auto-tag the books and answer 202; a GET with
+        ``library_id`` reports the status and results of the latest run.
+        """
+        if request.method == 'GET':
+            try:
+                library_id = int(request.query_params.get('library_id', ''))
+            except ValueError:
+                return Response({'error': 'library_id must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+            job = categorization_status(library_id)
+            if job is None:
+                return Response({'error': 'No categorization found for this library'}, status=status.HTTP_404_NOT_FOUND)
+            return Response({'library_id': library_id, **job})
+
+        serializer = CategorizeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        library_id = serializer.validated_data.get('library_id')
+        book_ids = serializer.validated_data.get('book_ids')
+        auto_tag = serializer.validated_data['auto_tag']
+
+        if library_id:
+            min_confidence = serializer.validated_data['min_confidence']
+            if not schedule_library_categorization(library_id, auto_tag=auto_tag, min_confidence=min_confidence):
+                return Response({
+                    'library_id': library_id,
+                    'status': 'running',
+                    'message': 'Categorization already running'
+                }, status=status.HTTP_202_ACCEPTED)
+            return Response({
+                'library_id': library_id,
+                'status': 'running',
+                'message': 'Categorization started'
+            }, status=status.HTTP_202_ACCEPTED)
+
+        try:
+            results = categorize_books(book_ids)
+        except ValidationError:
+            return Response(
+                {'error': 'book_ids must be a list of book IDs'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'count': len(results), 'results': results})
+
     def _analyze_book_content(self, title: str, description: str = None, authors: List[str] = None) -> List[str]:
         """Analyze book content to determine categories."""
-        categories = []
-        text_to_analyze = f"{title} {description or ''} {' '.join(authors or [])}".lower()
-        
-        # Define category keywords
-        category_keywords = {
-            'fiction': ['novel', 'story', 'tale', 'fiction', 'fantasy', 'mystery', 'romance', 'thriller', 'sci-fi', 'science fiction'],
-            'non-fiction': ['non-fiction', 'nonfiction', 'biography', 'autobiography', 'memoir', 'history', 'science', 'philosophy'],
-            'philosophy': ['philosophy', 'philosophical', 'ethics', 'metaphysics', 'epistemology', 'logic', 'moral', 'existential'],
-            'science': ['science', 'scientific', 'physics', 'chemistry', 'biology', 'mathematics', 'research', 'experiment'],
-            'history': ['history', 'historical', 'ancient', 'medieval', 'modern', 'war', 'battle', 'civilization'],
-            'biography': ['biography', 'autobiography', 'memoir', 'life story', 'personal', 'diary'],
-            'technology': ['technology', 'computer', 'software', 'programming', 'digital', 'internet', 'ai', 'artificial intelligence'],
-            'business': ['business', 'management', 'economics', 'finance', 'marketing', 'entrepreneurship', 'leadership'],
-            'self-help': ['self-help', 'personal development', 'motivation', 'success', 'happiness', 'mindfulness'],
-            'religion': ['religion', 'religious', 'spiritual', 'theology', 'faith', 'bible', 'quran', 'meditation'],
-            'politics': ['politics', 'political', 'government', 'policy', 'democracy', 'socialism', 'capitalism'],
-            'psychology': ['psychology', 'psychological', 'mental health', 'behavior', 'mind', 'therapy', 'counseling'],
-            'education': ['education', 'learning', 'teaching', 'academic', 'textbook', 'course', 'study'],
-            'art': ['art', 'artistic', 'painting', 'sculpture', 'design', 'creative', 'aesthetic'],
-            'literature': ['literature', 'literary', 'classic', 'poetry', 'drama', 'theater', 'play'],
-            'travel': ['travel', 'journey', 'adventure', 'exploration', 'geography', 'culture', 'destination'],
-            'cooking': ['cooking', 'recipe', 'food', 'culinary', 'kitchen', 'chef', 'gastronomy'],
-            'health': ['health', 'medical', 'medicine', 'wellness', 'fitness', 'nutrition', 'diet'],
-            'environment': ['environment', 'environmental', 'climate', 'ecology', 'sustainability', 'nature', 'conservation'],
-            'sports': ['sports', 'athletic', 'fitness', 'game', 'competition', 'olympic', 'team']
-        }
-        
-        # Score each category based on keyword matches
-        category_scores = {}
-        for category, keywords in category_keywords.items():
-            score = 0
-            for keyword in keywords:
-                if keyword in text_to_analyze:
-                    score += 1
-            if score > 0:
-                category_scores[category] = score
-        
-        # Sort by score and take top categories
-        sorted_categories = sorted(category_scores.items(), key=lambda x: x[1], reverse=True)
-        
-        # Add categories with score >= 1
-        for category, score in sorted_categories[:5]:  # Limit to top 5
-            if score >= 1:
-                categories.append(category)
-        
-        # Add specific genre detection
-        if 'fiction' in categories:
-            # Detect sub-genres
-            if any(word in text_to_analyze for word in ['fantasy', 'magic', 'wizard', 'dragon']):
-                categories.append('fantasy')
-            elif any(word in text_to_analyze for word in ['mystery', 'detective', 'crime', 'murder']):
-                categories.append('mystery')
-            elif any(word in text_to_analyze for word in ['romance', 'love', 'relationship']):
-                categories.append('romance')
-            elif any(word in text_to_analyze for word in ['thriller', 'suspense', 'action']):
-                categories.append('thriller')
-            elif any(word in text_to_analyze for word in ['sci-fi', 'science fiction', 'space', 'future']):
-                categories.append('science-fiction')
-        
-        return list(set(categories))  # Remove duplicates
-    
+        return categorize_text(title, description, authors)
+
     def _calculate_confidence(self, categories: List[str]) -> float:
         """Calculate confidence score for categorization."""
-        if not categories:
-            return 0.0
-        
-        # Simple confidence based on number of categories found
-        # More categories = higher confidence
-        base_confidence = min(len(categories) * 0.2, 1.0)
-        
-        # Boost confidence for specific categories
-        specific_categories = ['philosophy', 'science', 'history', 'biography', 'technology']
-        specific_boost = sum(0.1 for cat in categories if cat in specific_categories)
-        
-        return min(base_confidence + specific_boost, 1.0)
+        return calculate_confidence(categories)
@@ -1,11 +1,27 @@
 from django.contrib import admin
-from .models import BookFile
+from .models import BookFile, FileBlob, UploadSession
 
 
 @admin.register(BookFile)
 class BookFileAdmin(admin.ModelAdmin):
-    list_display = ['library_book', 'file_type', 'size_mb', 'text_extracted', 'uploaded_at']
-    list_filter = ['file_type', 'text_extracted', 'uploaded_at']
+    list_display = ['library_book', 'file_type', 'size_mb', 'extraction_status', 'uploaded_at']
+    list_filter = ['file_type', 'extraction_status', 'text_extracted', 'uploaded_at']
     search_fields = ['library_book__book__title', 'filename']
-    readonly_fields = ['checksum', 'uploaded_at', 'size_mb']
+    readonly_fields = ['checksum', 'uploaded_at', 'size_mb', 'extraction_progress', 'extraction_finished_at']
     ordering = ['-uploaded_at']
+
+
+@admin.register(FileBlob)
+class FileBlobAdmin(admin.ModelAdmin):
+    list_display = ['checksum', 'bytes', 'ref_count', 'created_at']
+    search_fields = ['checksum']
+    readonly_fields = ['checksum', 'file_path', 'bytes', 'ref_count', 'created_at']
+    ordering = ['-created_at']
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'library_book', 'offset', 'size', 'book_file', 'updated_at']
+    search_fields = ['filename', 'library_book__book__title']
+    readonly_fields = ['id', 'offset', 'book_file', 'created_at', 'updated_at']
+    ordering = ['-updated_at']
@@ -0,0 +1,83 @@
+"""
+Content-addressed storage for book files.
+
+File contents are stored once per SHA-256 under ``blobs/<aa>/<checksum>.<ext>``
+as a ``FileBlob`` that counts the BookFiles using it. Uploading contents that
+are already stored only adds a reference, and the stored file is deleted once
+the last BookFile using it is. The name a file was uploaded under is kept on
+its ``BookFile.original_name``, since the blob path only carries the checksum.
+
+Contents are written to storage before the transaction recording them
+commits, so callers acquire blobs inside ``blob_transaction``, which deletes
+the files it stored again if the transaction rolls back.
+"""
+import logging
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from .models import FileBlob
+
+logger = logging.getLogger(__name__)
+
+
+def blob_path(checksum: str, extension: str) -> str:
+    return f"blobs/{checksum[:2]}/{checksum}.{extension}"
+
+
+@contextmanager
+def blob_transaction():
+    """Atomic block yielding a list for ``acquire_blob``'s ``stored_paths``.
+
+    The files listed there are deleted if the block rolls back, since no
+    committed ``FileBlob`` refers to them.
+    """
+    stored_paths: List[str] = []
+    try:
+        with transaction.atomic():
+            yield stored_paths
+    except BaseException:
+        for path in stored_paths:
+            default_storage.delete(path)
+        raise
+
+
+def acquire_blob(content, checksum: str, size: int, extension: str,
+                 stored_paths: Optional[List[str]] = None) -> Tuple[FileBlob, bool]:
+    """Add a reference to the blob for ``checksum``, storing ``content`` only if there is none.
+
+    Returns ``(blob, stored)``; ``stored`` is False when the upload was a duplicate.
+    A newly stored file is added to ``stored_paths`` (see ``blob_transaction``).
+    """
+    if FileBlob.objects.filter(checksum=checksum).update(ref_count=F('ref_count') + 1):
+        return FileBlob.objects.get(checksum=checksum), False
+
+    path = default_storage.save(blob_path(checksum, extension), content)
+    if stored_paths is not None:
+        stored_paths.append(path)
+    blob, created = FileBlob.objects.get_or_create(
+        checksum=checksum, defaults={'file_path': path, 'bytes': size, 'ref_count': 1}
+    )
+    if not created:
+        # Another upload stored the same contents first
+        default_storage.delete(path)
+        if stored_paths is not None:
+            stored_paths.remove(path)
+        FileBlob.objects.filter(checksum=checksum).update(ref_count=F('ref_count') + 1)
+        blob.refresh_from_db()
+    return blob, created
+
+
+def release_blob(checksum: str):
+    """Drop a reference, deleting the blob and its file when nothing uses it any more."""
+    FileBlob.objects.filter(checksum=checksum, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+    blob = FileBlob.objects.filter(checksum=checksum, ref_count=0).first()
+    if blob is None:
+        return
+    # Conditional, so a reference taken since the decrement keeps the blob
+    deleted, _ = FileBlob.objects.filter(checksum=checksum, ref_count=0, book_files__isnull=True).delete()
+    if deleted:
+        path = blob.file_path
+        transaction.on_commit(lambda: default_storage.delete(path))
+        logger.info(f"Deleted unreferenced blob {checksum}")
@@ -0,0 +1,193 @@
+"""
+Resumable chunked uploads.
+
+A client opens an ``UploadSession`` that declares the file's name and size and,
+optionally, its SHA-256. It then sends the file as raw chunks, each placed at
+the session's current offset. A chunk is streamed straight from the request
+into its own file in storage and hashed on the way. It is kept only if its
+SHA-256 matches the one the client sent. After a dropped connection, the
+client reads the session's offset and continues from there.
+
+Once every byte has arrived the chunks are concatenated in order. The whole
+file is hashed during that pass, and the result is stored as a blob like any
+other upload. Memory use is bounded by the read size, not the file or chunk
+size, so ``MAX_RESUMABLE_UPLOAD_SIZE`` can be far larger than
+``MAX_UPLOAD_SIZE``.
+"""
+import hashlib
+import logging
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import transaction
+from django.utils import timezone
+from .blobs import acquire_blob, blob_transaction
+from .delivery import CONTENT_TYPES
+from .models import BookFile, UploadChunk, UploadSession
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 64 * 1024
+
+
+class ChunkError(Exception):
+    """A chunk or assembly request that cannot be accepted."""
+
+
+class OffsetMismatch(ChunkError):
+    """The chunk does not start at the session's current offset."""
+
+    def __init__(self, offset: int):
+        super().__init__(f"Expected a chunk at offset {offset}")
+        self.offset = offset
+
+
+class ChecksumMismatch(ChunkError):
+    """The received bytes do not match the checksum the client sent."""
+
+
+class IncompleteUpload(ChunkError):
+    """Assembly was requested before every byte arrived."""
+
+
+def max_resumable_upload_size() -> int:
+    return getattr(settings, 'MAX_RESUMABLE_UPLOAD_SIZE', 2 * 1024 * 1024 * 1024)
+
+
+def max_chunk_size() -> int:
+    return getattr(settings, 'UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+
+
+def chunk_path(session: UploadSession, offset: int) -> str:
+    return f"uploads/{session.id}/{offset:012d}.part"
+
+
+class _HashingReader:
+    """Read at most ``length`` bytes from a stream, hashing them on the way."""
+
+    def __init__(self, stream, length: int):
+        self.stream = stream
+        self.remaining = length
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.stream.read(size) if size else b''
+        self.remaining -= len(data)
+        self.size += len(data)
+        self.sha256.update(data)
+        return data
+
+
+def write_chunk(session: UploadSession, offset: int, stream, length: int, checksum: str = '') -> UploadChunk:
+    """Store ``length`` bytes of ``stream`` as the chunk of ``session`` at ``offset``.
+
+    ``checksum``, if given, is the SHA-256 the chunk must have. Raises
+    ``OffsetMismatch`` when the chunk is not the next one, including when a
+    concurrent request stored it first.
+    """
+    if offset != session.offset:
+        raise OffsetMismatch(session.offset)
+    if length > session.size - offset:
+        raise ChunkError(f"Chunk runs past the declared size of {session.size} bytes")
+
+    reader = _HashingReader(stream, length)
+    path = default_storage.save(chunk_path(session, offset), reader)
+    digest = reader.sha256.hexdigest()
+    if reader.size != length:
+        default_storage.delete(path)
+        raise ChunkError(f"Received {reader.size} of {length} bytes")
+    if checksum and checksum.lower() != digest:
+        default_storage.delete(path)
+        raise ChecksumMismatch("Chunk checksum does not match")
+
+    with transaction.atomic():
+        # Conditional, so only one of two requests for the same offset wins
+        claimed = UploadSession.objects.filter(id=session.id, offset=offset, book_file__isnull=True).update(
+            offset=offset + length, updated_at=timezone.now()
+        )
+        if claimed:
+            chunk = UploadChunk.objects.create(
+                session=session, offset=offset, bytes=length, checksum=digest, file_path=path
+            )
+    if not claimed:
+        default_storage.delete(path)
+        session.refresh_from_db()
+        raise OffsetMismatch(session.offset)
+
+    session.offset = offset + length
+    return chunk
+
+
+def assemble(session: UploadSession) -> BookFile:
+    """Concatenate the chunks of a finished session into a new BookFile."""
+    if session.offset != session.size:
+        raise IncompleteUpload(f"Received {session.offset} of {session.size} bytes")
+
+    sha256 = hashlib.sha256()
+    assembled = TemporaryUploadedFile(
+        session.filename, CONTENT_TYPES.get(session.file_type), session.size, None
+    )
+    try:
+        position = 0
+        for chunk in session.chunks.all():
+            if chunk.offset != position:
+                raise IncompleteUpload(f"Missing bytes at offset {position}")
+            with default_storage.open(chunk.file_path) as part:
+                for data in iter(lambda: part.read(READ_SIZE), b''):
+                    sha256.update(data)
+                    assembled.write(data)
+            position += chunk.bytes
+        if position != session.size:
+            raise IncompleteUpload(f"Missing bytes at offset {position}")
+
+        checksum = sha256.hexdigest()
+        if session.checksum and session.checksum != checksum:
+            raise ChecksumMismatch("File checksum does not match")
+
+        assembled.flush()
+        assembled.seek(0)
+        with blob_transaction() as stored_paths:
+            # The temporary file is moved into storage rather than copied
+            blob, _ = acquire_blob(assembled, checksum, session.size, session.file_type, stored_paths)
+            book_file = BookFile.objects.create(
+                library_book_id=session.library_book_id,
+                file_type=session.file_type,
+                file_path=blob.file_path,
+                original_name=session.filename,
+                blob=blob,
+                bytes=session.size,
+                checksum=checksum
+            )
+            # Conditional, so a concurrent request cannot assemble the session twice
+            if not UploadSession.objects.filter(id=session.id, book_file__isnull=True).update(
+                book_file=book_file, updated_at=timezone.now()
+            ):
+                raise ChunkError("Upload has already been assembled")
+            session.book_file = book_file
+            _delete_chunks(session)
+    finally:
+        assembled.close()
+
+    logger.info(f"Assembled upload {session.id} into file {book_file.id}")
+    return book_file
+
+
+def discard(session: UploadSession):
+    """Delete a session and any chunks it has stored."""
+    with transaction.atomic():
+        _delete_chunks(session)
+        session.delete()
+
+
+def _delete_chunks(session: UploadSession):
+    paths = list(session.chunks.values_list('file_path', flat=True))
+    session.chunks.all().delete()
+
+    def delete_files():
+        for path in paths:
+            default_storage.delete(path)
+
+    transaction.on_commit(delete_files)
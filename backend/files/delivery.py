@@ -0,0 +1,169 @@
+"""
+Serving stored book files.
+
+Responses carry a strong ETag (the file's SHA-256) and Last-Modified, so
+conditional requests get 304 or 412 without touching the file. A single byte
+range (``Range: bytes=...``, honouring ``If-Range``) gets a 206 with just
+that slice, which lets the PDF reader load large files lazily.
+
+With ``FILE_DOWNLOAD_OFFLOAD`` set to ``'x-accel-redirect'`` (nginx) or
+``'x-sendfile'`` (Apache, lighttpd) the response only names the file and
+the web server sends it, ranges included, without holding a Python worker.
+Otherwise full files go out through ``FileResponse``, which WSGI servers can
+hand to ``sendfile``, and ranges are streamed in chunks.
+"""
+import os
+import re
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+from .models import BookFile
+
+CONTENT_TYPES = {'pdf': 'application/pdf', 'epub': 'application/epub+zip'}
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested byte range lies outside the file."""
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Return the inclusive ``(first, last)`` byte positions of a single-range header.
+
+    Returns None for headers that should be ignored (malformed or multiple
+    ranges), which means serving the whole file.
+    """
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    if size == 0:
+        raise RangeNotSatisfiable()
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise RangeNotSatisfiable()
+        return max(size - length, 0), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first > last:
+        if first >= size:
+            raise RangeNotSatisfiable()
+        return None
+    return first, last
+
+
+def _etag(book_file: BookFile) -> str:
+    return f'"{book_file.checksum}"'
+
+
+def _range_applies(request, etag: str, last_modified: int) -> bool:
+    """Whether ``If-Range`` (if any) still matches, so the Range header may be used."""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+class _FileRange:
+    """Chunks of one byte range of an open file, which is closed with the response."""
+
+    def __init__(self, f, first: int, length: int):
+        self.file = f
+        self.first = first
+        self.length = length
+
+    def __iter__(self) -> Iterator[bytes]:
+        self.file.seek(self.first)
+        remaining = self.length
+        while remaining > 0:
+            data = self.file.read(min(CHUNK_SIZE, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+
+    def close(self):
+        self.file.close()
+
+
+def _offload(book_file: BookFile, mode: str) -> HttpResponse:
+    response = HttpResponse()
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'FILE_DOWNLOAD_OFFLOAD_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + quote(book_file.file_path)
+    else:
+        response['X-Sendfile'] = default_storage.path(book_file.file_path)
+    return response
+
+
+def _download_name(book_file: BookFile) -> str:
+    if book_file.original_name:
+        return book_file.original_name
+    # Content-addressed paths carry only the checksum, so older files are named after their book
+    title = book_file.library_book.book.title if book_file.library_book_id else ''
+    return f"{title or os.path.splitext(book_file.filename)[0]}.{book_file.file_type}"
+
+
+def serve_book_file(request, book_file: BookFile, as_attachment: bool = False) -> HttpResponse:
+    """Build the response for a GET or HEAD of a book file.
+
+    Raises ``FileNotFoundError`` before any response is built when the file
+    is missing from storage.
+    """
+    etag = _etag(book_file)
+    last_modified = int(book_file.uploaded_at.timestamp())
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        return conditional
+
+    size = book_file.bytes
+    byte_range = None
+    range_header = request.headers.get('Range')
+    if range_header and _range_applies(request, etag, last_modified):
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    offload = getattr(settings, 'FILE_DOWNLOAD_OFFLOAD', '')
+    if offload and request.method == 'GET':
+        # The web server answers the range itself
+        response = _offload(book_file, offload)
+    else:
+        if request.method == 'HEAD':
+            if not default_storage.exists(book_file.file_path):
+                raise FileNotFoundError(book_file.file_path)
+            response = HttpResponse()
+        elif byte_range is None:
+            response = FileResponse(default_storage.open(book_file.file_path))
+        else:
+            # Opened here, so a missing file is a 404 rather than a failure after the 206 headers
+            first, last = byte_range
+            response = StreamingHttpResponse(
+                _FileRange(default_storage.open(book_file.file_path), first, last - first + 1)
+            )
+        response['Content-Length'] = size
+        if byte_range is not None:
+            first, last = byte_range
+            response.status_code = 206
+            response['Content-Range'] = f'bytes {first}-{last}/{size}'
+            response['Content-Length'] = last - first + 1
+
+    response['Content-Type'] = CONTENT_TYPES.get(book_file.file_type, 'application/octet-stream')
+    response['Content-Disposition'] = content_disposition_header(as_attachment, _download_name(book_file))
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, max-age=86400'
+    return response
@@ -0,0 +1,176 @@
+"""
+Streaming EPUB text extraction.
+
+The spine is read from the package document named by
+``META-INF/container.xml``. Each spine document is then streamed out of the
+zip and through ``html.parser`` one at a time, so memory is bounded by the
+largest chapter rather than the book and nothing is unzipped to disk. Each
+spine document is one section, labelled with its first heading or title.
+
+Like ``pdftext`` this module imports nothing from Django, so it can run in
+worker processes.
+"""
+import io
+import posixpath
+import re
+import zipfile
+from html.parser import HTMLParser
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import unquote
+from xml.etree import ElementTree
+
+CONTAINER_PATH = 'META-INF/container.xml'
+CONTAINER_NS = '{urn:oasis:names:tc:opendocument:xmlns:container}'
+OPF_NS = '{http://www.idpf.org/2007/opf}'
+DOCUMENT_TYPES = {'application/xhtml+xml', 'text/html'}
+READ_SIZE = 64 * 1024
+
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'figcaption', 'figure',
+    'footer', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'ol', 'p', 'pre', 'section',
+    'table', 'td', 'th', 'tr', 'ul',
+}
+SKIP_TAGS = {'script', 'style', 'head', 'svg', 'math'}
+HEADING_TAGS = {'h1', 'h2', 'h3'}
+WHITESPACE = re.compile(r'\s+')
+
+
+class EpubError(Exception):
+    """The file is not a readable EPUB."""
+
+
+class _TextExtractor(HTMLParser):
+    """Collect the visible text of an XHTML document, one line per block."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: List[str] = []
+        self.title = ''
+        self.heading = ''
+        self._line: List[str] = []
+        self._skip = 0
+        self._in_title = False
+        self._heading_depth = 0
+        self._heading_text: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip += 1
+        elif tag == 'title':
+            self._in_title = True
+        elif tag in HEADING_TAGS and not self.heading:
+            self._heading_depth += 1
+        if tag in BLOCK_TAGS:
+            self._break()
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            self._break()
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip = max(self._skip - 1, 0)
+        elif tag == 'title':
+            self._in_title = False
+        elif tag in HEADING_TAGS and self._heading_depth:
+            self._heading_depth -= 1
+            if not self._heading_depth:
+                self.heading = _clean(''.join(self._heading_text))
+        if tag in BLOCK_TAGS:
+            self._break()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+        elif not self._skip:
+            self._line.append(data)
+            if self._heading_depth:
+                self._heading_text.append(data)
+
+    def close(self):
+        super().close()
+        self._break()
+
+    def _break(self):
+        line = _clean(''.join(self._line))
+        if line:
+            self.lines.append(line)
+        self._line = []
+
+    @property
+    def label(self) -> str:
+        return (self.heading or _clean(self.title))[:500]
+
+    @property
+    def text(self) -> str:
+        return '\n'.join(self.lines)
+
+
+def _clean(text: str) -> str:
+    return WHITESPACE.sub(' ', text).strip()
+
+
+def spine(archive: zipfile.ZipFile) -> List[str]:
+    """Archive member names of the spine documents, in reading order."""
+    try:
+        container = ElementTree.fromstring(archive.read(CONTAINER_PATH))
+        rootfile = container.find(f'.//{CONTAINER_NS}rootfile')
+        opf_path = rootfile.get('full-path')
+        package = ElementTree.fromstring(archive.read(opf_path))
+    except (KeyError, AttributeError, ElementTree.ParseError) as e:
+        raise EpubError(f"Missing or invalid package document: {e}")
+
+    base = posixpath.dirname(opf_path)
+    manifest = {
+        item.get('id'): item
+        for item in package.iterfind(f'{OPF_NS}manifest/{OPF_NS}item')
+    }
+    documents = []
+    for itemref in package.iterfind(f'{OPF_NS}spine/{OPF_NS}itemref'):
+        item = manifest.get(itemref.get('idref'))
+        if item is None or item.get('media-type') not in DOCUMENT_TYPES or not item.get('href'):
+            continue
+        href = unquote(item.get('href').split('#', 1)[0])
+        documents.append(posixpath.normpath(posixpath.join(base, href)))
+    return documents
+
+
+def _open(path: str) -> zipfile.ZipFile:
+    try:
+        return zipfile.ZipFile(path)
+    except zipfile.BadZipFile as e:
+        raise EpubError(f"Not an EPUB file: {e}")
+
+
+def chapter_count(path: str) -> int:
+    with _open(path) as archive:
+        return len(spine(archive))
+
+
+def _extract_document(archive: zipfile.ZipFile, name: str) -> Tuple[str, str]:
+    parser = _TextExtractor()
+    with archive.open(name) as member:
+        reader = io.TextIOWrapper(member, encoding='utf-8', errors='replace')
+        for block in iter(lambda: reader.read(READ_SIZE), ''):
+            parser.feed(block)
+    parser.close()
+    return parser.label, parser.text
+
+
+def iter_chapters(path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+    """Yield ``(label, text)`` for spine documents ``start`` to ``stop`` in reading order.
+
+    A document missing from the archive yields an empty section so section
+    numbers stay aligned with the spine.
+    """
+    with _open(path) as archive:
+        for name in spine(archive)[start:stop]:
+            try:
+                yield _extract_document(archive, name)
+            except KeyError:
+                yield '', ''
+
+
+def extract_chapter_range(path: str, start: int, stop: int) -> List[Tuple[str, str]]:
+    """Sections ``start`` to ``stop``; the unit of work for worker processes."""
+    return list(iter_chapters(path, start, stop))
@@ -0,0 +1,312 @@
+"""
+Background text extraction for uploaded book files.
+
+Uploads only store the file and call ``queue_extraction``; the text is
+extracted by ``extract_book_file`` on the background job pool, which moves
+``BookFile.extraction_status`` through queued, running and done (or failed)
+and records the percentage of pages processed as it goes. A file left queued
+or running for longer than ``EXTRACTION_STALE_SECONDS``, such as by a worker
+killed in a restart, can be queued and claimed again. The text is kept
+both joined on the file and per page as ``BookFilePage`` rows. A file whose
+contents were already extracted under another BookFile copies that result
+with ``reuse_extraction`` instead.
+
+``ParallelExtractor`` does the same for many files at once across worker
+processes, for backfills run from the ``extract_pdf_text`` command.
+"""
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import Q, Subquery
+from django.utils import timezone
+from preposition_core.background import run_in_background
+from .models import BookFile, BookFilePage
+from . import epubtext, pdftext
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = [BookFile.EXTRACTION_QUEUED, BookFile.EXTRACTION_RUNNING]
+PAGE_SEPARATOR = '\n\n'
+
+# Per file type: (section count, section iterator, range extractor for worker processes).
+# PDF sections are pages; EPUB sections are spine documents labelled with their chapter title.
+EXTRACTORS = {
+    'pdf': (pdftext.page_count, pdftext.iter_pages, pdftext.extract_page_range),
+    'epub': (epubtext.chapter_count, epubtext.iter_chapters, epubtext.extract_chapter_range),
+}
+
+
+def _claimable(statuses: List[str]) -> Q:
+    """Files not in ``statuses``, or whose claim on one has gone stale."""
+    stale_before = timezone.now() - timedelta(seconds=getattr(settings, 'EXTRACTION_STALE_SECONDS', 3600))
+    return (
+        ~Q(extraction_status__in=statuses)
+        | Q(extraction_started_at__isnull=True)
+        | Q(extraction_started_at__lt=stale_before)
+    )
+
+
+def queue_extraction(book_file: BookFile, force: bool = False) -> bool:
+    """Mark a file as queued and schedule its extraction.
+
+    Returns False without scheduling anything when an extraction for the file
+    is already queued or running and has not gone stale, unless ``force``.
+    """
+    files = BookFile.objects.filter(id=book_file.id)
+    if not force:
+        files = files.filter(_claimable(ACTIVE_STATUSES))
+    queued = files.update(
+        extraction_status=BookFile.EXTRACTION_QUEUED,
+        extraction_progress=0,
+        extraction_error='',
+        extraction_started_at=timezone.now()
+    )
+    if not queued:
+        return False
+    run_in_background(extract_book_file, book_file.id)
+    book_file.refresh_from_db()
+    return True
+
+
+def reuse_extraction(book_file: BookFile) -> bool:
+    """Copy the text and pages of an extracted file with the same contents, if there is one."""
+    source = BookFile.objects.filter(
+        checksum=book_file.checksum, extraction_status=BookFile.EXTRACTION_DONE, page_count__isnull=False
+    ).exclude(id=book_file.id).only('id', 'text_extracted', 'page_count').first()
+    if source is None:
+        return False
+
+    pages = [
+        BookFilePage(
+            book_file_id=book_file.id, page_number=page.page_number, text=page.text,
+            label=page.label, start_offset=page.start_offset, end_offset=page.end_offset
+        )
+        for page in source.pages.all()
+    ]
+    with transaction.atomic():
+        BookFilePage.objects.filter(book_file_id=book_file.id).delete()
+        BookFilePage.objects.bulk_create(pages, batch_size=500)
+        BookFile.objects.filter(id=book_file.id).update(
+            extracted_text=Subquery(BookFile.objects.filter(id=source.id).values('extracted_text')[:1]),
+            text_extracted=source.text_extracted,
+            page_count=source.page_count,
+            extraction_status=BookFile.EXTRACTION_DONE,
+            extraction_progress=100,
+            extraction_error='',
+            extraction_finished_at=timezone.now()
+        )
+    book_file.refresh_from_db()
+    logger.info(f"Reused extraction of file {source.id} for identical file {book_file.id}")
+    return True
+
+
+def _claim(book_file_id: int, force: bool = False) -> bool:
+    """Move a file to running unless another extraction already is (and has not gone stale), or ``force``."""
+    files = BookFile.objects.filter(id=book_file_id)
+    if not force:
+        files = files.filter(_claimable([BookFile.EXTRACTION_RUNNING]))
+    return bool(files.update(
+        extraction_status=BookFile.EXTRACTION_RUNNING,
+        extraction_progress=0,
+        extraction_error='',
+        extraction_started_at=timezone.now()
+    ))
+
+
+def _set_progress(book_file_id: int, progress: int):
+    BookFile.objects.filter(id=book_file_id).update(extraction_progress=progress)
+
+
+def page_rows(book_file_id: int, pages: List[Tuple[str, str]]) -> Tuple[str, List[BookFilePage]]:
+    """Join ``(label, text)`` sections into the file's text and build a row per section with its offsets in it.
+
+    Empty sections keep their row (with an empty span) so page numbers match the file.
+    """
+    parts = []
+    rows = []
+    offset = 0
+    for number, (label, text) in enumerate(pages, 1):
+        if text:
+            if parts:
+                offset += len(PAGE_SEPARATOR)
+            start = offset
+            parts.append(text)
+            offset += len(text)
+        else:
+            start = offset
+        rows.append(BookFilePage(
+            book_file_id=book_file_id, page_number=number, label=label, text=text, start_offset=start, end_offset=offset
+        ))
+    return PAGE_SEPARATOR.join(parts), rows
+
+
+def _finish(book_file_id: int, pages: List[Tuple[str, str]]) -> str:
+    extracted_text, rows = page_rows(book_file_id, pages)
+    with transaction.atomic():
+        BookFilePage.objects.filter(book_file_id=book_file_id).delete()
+        BookFilePage.objects.bulk_create(rows, batch_size=500)
+        BookFile.objects.filter(id=book_file_id).update(
+            extracted_text=extracted_text,
+            text_extracted=bool(extracted_text),
+            page_count=len(pages),
+            extraction_status=BookFile.EXTRACTION_DONE,
+            extraction_progress=100,
+            extraction_finished_at=timezone.now()
+        )
+    return extracted_text
+
+
+def _fail(book_file_id: int, error: Exception):
+    BookFile.objects.filter(id=book_file_id).update(
+        extraction_status=BookFile.EXTRACTION_FAILED,
+        extraction_error=str(error)[:1000],
+        text_extracted=False,
+        extraction_finished_at=timezone.now()
+    )
+
+
+def extract_book_file(book_file_id: int) -> bool:
+    """Extract the text of one PDF or EPUB, recording status and progress on its row.
+
+    Pages that fail to extract are left empty; a file that cannot be read at
+    all is marked failed with the error. Returns True when the file was extracted.
+    """
+    if not _claim(book_file_id):
+        return False
+    book_file = BookFile.objects.only('id', 'file_path', 'file_type').get(id=book_file_id)
+
+    try:
+        count, iterate, _ = EXTRACTORS[book_file.file_type]
+        path = default_storage.path(book_file.file_path)
+        total = count(path)
+        pages = []
+        reported = 0
+        for section in iterate(path):
+            pages.append(section)
+            # One write per percent, not per page
+            progress = len(pages) * 100 // total
+            if progress > reported and progress < 100:
+                _set_progress(book_file_id, progress)
+                reported = progress
+    except Exception as e:
+        logger.error(f"Failed to extract text from {book_file.file_path}: {e}")
+        _fail(book_file_id, e)
+        return False
+
+    extracted_text = _finish(book_file_id, pages)
+    logger.info(f"Extracted {len(extracted_text)} characters from {total} pages of {book_file.file_path}")
+    return True
+
+
+class ParallelExtractor:
+    """Extract many PDFs (and EPUBs) across worker processes.
+
+    Files with more than ``chunk_pages`` pages are split into page ranges so
+    one large scan keeps every worker busy; smaller files are one task each.
+    Range results are reassembled in page order and each file is saved as
+    soon as its last range arrives. Worker processes only parse files; every
+    database write happens in the calling process. With ``force``, files
+    another extraction has claimed are taken over.
+    """
+
+    def __init__(self, workers: Optional[int] = None, chunk_pages: int = 50, force: bool = False):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_pages = max(chunk_pages, 1)
+        self.force = force
+        self.counts = {'files': 0, 'failed': 0, 'pages': 0}
+        self.elapsed = 0.0
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.counts['pages'] / self.elapsed if self.elapsed > 0 else 0.0
+
+    def _ranges(self, pages: int) -> List[Tuple[int, int]]:
+        return [(start, min(start + self.chunk_pages, pages)) for start in range(0, pages, self.chunk_pages)]
+
+    def run(self, book_files: Iterable[BookFile]) -> Iterator[Tuple[BookFile, Optional[str], int]]:
+        """Extract each file, yielding ``(book_file, error, pages)`` as files finish.
+
+        ``error`` is None for files that were extracted.
+        """
+        started = time.monotonic()
+        plans: Dict[int, Tuple[BookFile, str, List[Tuple[int, int]]]] = {}
+        for book_file in book_files:
+            if not _claim(book_file.id, self.force):
+                self.counts['failed'] += 1
+                yield book_file, 'extraction already running', 0
+                continue
+            path = default_storage.path(book_file.file_path)
+            try:
+                ranges = self._ranges(EXTRACTORS[book_file.file_type][0](path))
+            except Exception as e:
+                _fail(book_file.id, e)
+                self.counts['failed'] += 1
+                yield book_file, str(e), 0
+                continue
+            if not ranges:
+                _finish(book_file.id, [])
+                self.counts['files'] += 1
+                yield book_file, None, 0
+                continue
+            plans[book_file.id] = (book_file, path, ranges)
+
+        if self.workers <= 1:
+            for book_file, path, ranges in plans.values():
+                try:
+                    extract = EXTRACTORS[book_file.file_type][2]
+                    pages = [section for start, stop in ranges for section in extract(path, start, stop)]
+                except Exception as e:
+                    yield self._failed(book_file, e)
+                    continue
+                yield self._finished(book_file, pages)
+        else:
+            yield from self._run_pool(plans)
+        self.elapsed = time.monotonic() - started
+
+    def _run_pool(self, plans) -> Iterator[Tuple[BookFile, Optional[str], int]]:
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {
+                pool.submit(EXTRACTORS[book_file.file_type][2], path, start, stop): (book_file_id, index)
+                for book_file_id, (book_file, path, ranges) in plans.items()
+                for index, (start, stop) in enumerate(ranges)
+            }
+            results = {book_file_id: [None] * len(ranges) for book_file_id, (_, _, ranges) in plans.items()}
+            failed = set()
+            for future in as_completed(futures):
+                book_file_id, index = futures[future]
+                if book_file_id in failed:
+                    continue
+                book_file = plans[book_file_id][0]
+                try:
+                    results[book_file_id][index] = future.result()
+                except Exception as e:
+                    failed.add(book_file_id)
+                    yield self._failed(book_file, e)
+                    continue
+
+                chunks = results[book_file_id]
+                done = sum(1 for chunk in chunks if chunk is not None)
+                if done < len(chunks):
+                    _set_progress(book_file_id, done * 100 // len(chunks))
+                    continue
+                yield self._finished(book_file, [section for chunk in chunks for section in chunk])
+
+    def _finished(self, book_file: BookFile, pages: List[Tuple[str, str]]):
+        _finish(book_file.id, pages)
+        self.counts['files'] += 1
+        self.counts['pages'] += len(pages)
+        return book_file, None, len(pages)
+
+    def _failed(self, book_file: BookFile, error: Exception):
+        logger.error(f"Failed to extract text from {book_file.file_path}: {error}")
+        _fail(book_file.id, error)
+        self.counts['failed'] += 1
+        return book_file, str(error), 0
@@ -1,6 +1,9 @@
+import os
 from django.core.management.base import BaseCommand
+from files.extraction import EXTRACTORS, ParallelExtractor
 from files.models import BookFile
 from django.core.files.storage import default_storage
+from django.db.models import Q
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,131 +16,103 @@ class Command(BaseCommand):
         parser.add_argument(
             '--force',
             action='store_true',
-            help='Re-extract text from all PDF files, even if already extracted',
+            help='Re-extract text from all PDF files, even if already extracted or marked as running',
+        )
+        parser.add_argument(
+            '--missing-pages',
+            action='store_true',
+            help='Also re-extract files extracted before text was stored per page',
+        )
+        parser.add_argument(
+            '--epub',
+            action='store_true',
+            help='Also extract text from EPUB files',
         )
         parser.add_argument(
             '--file-id',
             type=int,
             help='Extract text from a specific file ID',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            nargs='?',
+            const=os.cpu_count() or 1,
+            default=1,
+            help='Worker processes to extract with (default: 1; --workers alone uses every core)',
+        )
+        parser.add_argument(
+            '--chunk-pages',
+            type=int,
+            default=50,
+            help='Split PDFs with more pages than this into page ranges across workers (default: 50)',
+        )
 
     def handle(self, *args, **options):
         force = options['force']
         file_id = options['file_id']
-        
+
         if file_id:
             # Process specific file
             try:
                 book_file = BookFile.objects.get(id=file_id)
-                if book_file.file_type != 'pdf':
+                if book_file.file_type not in EXTRACTORS:
                     self.stdout.write(
-                        self.style.ERROR(f'File {file_id} is not a PDF file')
+                        self.style.ERROR(f'File {file_id} is not a PDF or EPUB file')
                     )
                     return
-                
-                self.process_file(book_file, force)
+                book_files = [book_file]
             except BookFile.DoesNotExist:
                 self.stdout.write(
                     self.style.ERROR(f'File with ID {file_id} not found')
                 )
+                return
         else:
-            # Process all PDF files
-            queryset = BookFile.objects.filter(file_type='pdf')
-            
-            if not force:
+            # Process all PDF (and optionally EPUB) files
+            file_types = ['pdf', 'epub'] if options['epub'] else ['pdf']
+            queryset = BookFile.objects.filter(file_type__in=file_types).defer('extracted_text')
+
+            if options['missing_pages'] and not force:
+                queryset = queryset.filter(Q(text_extracted=False) | Q(page_count__isnull=True))
+            elif not force:
                 queryset = queryset.filter(text_extracted=False)
-            
-            total_files = queryset.count()
-            self.stdout.write(f"Found {total_files} PDF files to process")
-            
-            if total_files == 0:
-                self.stdout.write(self.style.WARNING("No PDF files to process"))
+
+            book_files = list(queryset)
+            self.stdout.write(f"Found {len(book_files)} files to process")
+
+            if not book_files:
+                self.stdout.write(self.style.WARNING("No files to process"))
                 return
-            
-            processed = 0
-            failed = 0
-            
-            for book_file in queryset:
-                try:
-                    success = self.process_file(book_file, force)
-                    if success:
-                        processed += 1
-                    else:
-                        failed += 1
-                except Exception as e:
-                    self.stdout.write(
-                        self.style.ERROR(f"Error processing file {book_file.id}: {str(e)}")
-                    )
-                    failed += 1
-            
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f"Processing complete: {processed} successful, {failed} failed"
-                )
-            )
-    
-    def process_file(self, book_file, force=False):
-        """Process a single PDF file."""
-        if not force and book_file.text_extracted:
-            self.stdout.write(f"File {book_file.id} already has text extracted, skipping")
-            return True
-        
-        self.stdout.write(f"Processing file {book_file.id}: {book_file.file_path}")
-        
-        try:
-            from pypdf import PdfReader
-            
-            # Check if file exists
-            if not default_storage.exists(book_file.file_path):
+
+        pending = []
+        failed = 0
+        for book_file in book_files:
+            if not force and book_file.text_extracted and not (options['missing_pages'] and book_file.page_count is None):
+                self.stdout.write(f"File {book_file.id} already has text extracted, skipping")
+            elif not default_storage.exists(book_file.file_path):
                 self.stdout.write(
                     self.style.ERROR(f"File not found: {book_file.file_path}")
                 )
-                return False
-            
-            # Get the full file path
-            file_path = default_storage.path(book_file.file_path)
-            
-            # Read PDF and extract text
-            reader = PdfReader(file_path)
-            text_content = []
-            
-            for i, page in enumerate(reader.pages):
-                try:
-                    text = page.extract_text()
-                    if text:
-                        text_content.append(text)
-                except Exception as e:
-                    self.stdout.write(
-                        self.style.WARNING(f"Error extracting text from page {i+1}: {str(e)}")
-                    )
-            
-            if not text_content:
+                failed += 1
+            else:
+                pending.append(book_file)
+
+        extractor = ParallelExtractor(workers=options['workers'], chunk_pages=options['chunk_pages'], force=force)
+        processed = 0
+        for book_file, error, pages in extractor.run(pending):
+            if error:
                 self.stdout.write(
-                    self.style.WARNING(f"No text extracted from file {book_file.id}")
-                )
-                book_file.text_extracted = False
-                book_file.save()
-                return False
-            
-            # Join all text content
-            extracted_text = '\n\n'.join(text_content)
-            
-            # Update the book file record
-            book_file.extracted_text = extracted_text
-            book_file.text_extracted = True
-            book_file.save()
-            
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f"Successfully extracted {len(extracted_text)} characters from file {book_file.id}"
+                    self.style.ERROR(f"Failed to extract text from file {book_file.id}: {error}")
                 )
+                failed += 1
+            else:
+                self.stdout.write(f"Extracted {pages} pages from file {book_file.id}: {book_file.file_path}")
+                processed += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processing complete: {processed} successful, {failed} failed, "
+                f"{extractor.counts['pages']} pages in {extractor.elapsed:.2f}s "
+                f"({extractor.pages_per_second:.1f} pages/s, {extractor.workers} workers)"
             )
-            return True
-            
-        except Exception as e:
-            self.stdout.write(
-                self.style.ERROR(f"Failed to extract text from file {book_file.id}: {str(e)}")
-            )
-            book_file.text_extracted = False
-            book_file.save()
-            return False
+        )
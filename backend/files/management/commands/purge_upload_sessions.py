@@ -0,0 +1,27 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from files.chunked import discard
+from files.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = 'Delete upload sessions, and their stored chunks, that have not been touched for a while'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=24,
+            help='Delete sessions last updated more than this many hours ago (default: 24)',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        sessions = UploadSession.objects.filter(updated_at__lt=cutoff)
+        deleted = 0
+        for session in sessions:
+            discard(session)
+            deleted += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} upload sessions'))
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.2 on 2026-10-19 10:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0002_bookfile_extraction_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bookfile",
+            name="page_count",
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="BookFilePage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("page_number", models.PositiveIntegerField()),
+                ("text", models.TextField(blank=True)),
+                ("start_offset", models.PositiveIntegerField()),
+                ("end_offset", models.PositiveIntegerField()),
+                (
+                    "book_file",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="pages",
+                        to="files.bookfile",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["book_file", "page_number"],
+                "unique_together": {("book_file", "page_number")},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.2 on 2026-10-19 10:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0003_bookfile_pages"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FileBlob",
+            fields=[
+                (
+                    "checksum",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("file_path", models.CharField(max_length=500)),
+                ("bytes", models.BigIntegerField()),
+                ("ref_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="bookfile",
+            name="blob",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="book_files",
+                to="files.fileblob",
+            ),
+        ),
+    ]
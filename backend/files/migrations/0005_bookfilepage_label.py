@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-19 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0004_file_blob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bookfilepage",
+            name="label",
+            field=models.CharField(blank=True, max_length=500),
+        ),
+    ]
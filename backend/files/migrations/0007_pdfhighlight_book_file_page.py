@@ -0,0 +1,19 @@
+# Generated by Django 5.0.2 on 2026-10-19 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0006_upload_session"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="pdfhighlight",
+            index=models.Index(
+                fields=["book_file", "page"], name="files_pdfhi_book_fi_83ef25_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-19 10:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0007_pdfhighlight_book_file_page"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bookfile",
+            name="extraction_started_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-19 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("files", "0008_bookfile_extraction_started_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bookfile",
+            name="original_name",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+    ]
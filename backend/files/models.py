@@ -1,26 +1,60 @@
 import hashlib
 import os
+import uuid
 from django.db import models
 from django.core.validators import FileExtensionValidator
 from libraries.models import LibraryBook
 
 
+class FileBlob(models.Model):
+    """Stored file contents, shared by every BookFile with the same SHA-256."""
+    checksum = models.CharField(max_length=64, primary_key=True)
+    file_path = models.CharField(max_length=500)  # Path in default storage
+    bytes = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)  # BookFiles using this blob
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.checksum[:12]} ({self.ref_count} refs)"
+
+
 class BookFile(models.Model):
     """BookFile model for uploaded book files."""
     FILE_TYPE_CHOICES = [
         ('pdf', 'PDF'),
         ('epub', 'EPUB'),
     ]
+    EXTRACTION_QUEUED = 'queued'
+    EXTRACTION_RUNNING = 'running'
+    EXTRACTION_DONE = 'done'
+    EXTRACTION_FAILED = 'failed'
+    EXTRACTION_STATUS_CHOICES = [
+        (EXTRACTION_QUEUED, 'Queued'),
+        (EXTRACTION_RUNNING, 'Running'),
+        (EXTRACTION_DONE, 'Done'),
+        (EXTRACTION_FAILED, 'Failed'),
+    ]
 
     library_book = models.ForeignKey(LibraryBook, on_delete=models.CASCADE, related_name='files')
     file_type = models.CharField(max_length=10, choices=FILE_TYPE_CHOICES)
     file_path = models.CharField(max_length=500)  # Path to file on disk
+    original_name = models.CharField(max_length=255, blank=True, default='')  # Name the file was uploaded under
     object_key = models.CharField(max_length=500, null=True, blank=True)  # For object storage
+    # Null for files stored per library book before storage was content-addressed
+    blob = models.ForeignKey(FileBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='book_files')
     bytes = models.BigIntegerField()  # File size in bytes
     checksum = models.CharField(max_length=64)  # SHA-256 hash
     uploaded_at = models.DateTimeField(auto_now_add=True)
     text_extracted = models.BooleanField(default=False)
     extracted_text = models.TextField(null=True, blank=True)  # Extracted text content
+    # Blank until extraction is first scheduled
+    extraction_status = models.CharField(max_length=10, choices=EXTRACTION_STATUS_CHOICES, blank=True, default='')
+    extraction_progress = models.PositiveSmallIntegerField(default=0)  # Percent of pages processed
+    extraction_error = models.TextField(blank=True, default='')
+    # When the current extraction was queued or claimed; active rows older than EXTRACTION_STALE_SECONDS are reclaimed
+    extraction_started_at = models.DateTimeField(null=True, blank=True)
+    extraction_finished_at = models.DateTimeField(null=True, blank=True)
+    page_count = models.PositiveIntegerField(null=True, blank=True)  # Set by extraction
 
     class Meta:
         ordering = ['-uploaded_at']
@@ -44,8 +78,8 @@ class BookFile(models.Model):
 
     @property
     def filename(self):
-        """Get the filename from the file path."""
-        return os.path.basename(self.file_path)
+        """Get the name the file was uploaded under, or the last part of its path for older files."""
+        return self.original_name or os.path.basename(self.file_path)
 
     @property
     def size_mb(self):
@@ -53,6 +87,24 @@ class BookFile(models.Model):
         return round(self.bytes / (1024 * 1024), 2)
 
 
+class BookFilePage(models.Model):
+    """Extracted text of one page of a PDF, or one chapter of an EPUB."""
+    book_file = models.ForeignKey(BookFile, on_delete=models.CASCADE, related_name='pages')
+    page_number = models.PositiveIntegerField()  # 1-based; for EPUBs, the chapter's position in the spine
+    label = models.CharField(max_length=500, blank=True)  # EPUB chapter title
+    text = models.TextField(blank=True)
+    # Position of the page within BookFile.extracted_text
+    start_offset = models.PositiveIntegerField()
+    end_offset = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['book_file', 'page_number']
+        unique_together = ['book_file', 'page_number']
+
+    def __str__(self):
+        return f"{self.book_file} - page {self.page_number}"
+
+
 class PDFHighlight(models.Model):
     """Model for storing PDF highlights."""
     book_file = models.ForeignKey(BookFile, on_delete=models.CASCADE, related_name='highlights')
@@ -68,6 +120,53 @@ class PDFHighlight(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Page-window reads of a file's highlights
+            models.Index(fields=['book_file', 'page']),
+        ]
 
     def __str__(self):
         return f"Highlight on page {self.page} - {self.text[:50]}..."
+
+
+class UploadSession(models.Model):
+    """A resumable upload, received in chunks and assembled into a BookFile."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    library_book = models.ForeignKey(LibraryBook, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    file_type = models.CharField(max_length=10, choices=BookFile.FILE_TYPE_CHOICES)
+    size = models.BigIntegerField()  # Declared total size in bytes
+    offset = models.BigIntegerField(default=0)  # Bytes received so far
+    checksum = models.CharField(max_length=64, blank=True)  # Expected SHA-256 of the whole file, if given
+    # Set once the chunks have been assembled
+    book_file = models.ForeignKey(
+        BookFile, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_sessions'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size} bytes)"
+
+    @property
+    def is_complete(self):
+        return self.book_file_id is not None
+
+
+class UploadChunk(models.Model):
+    """One received chunk of an upload session, stored as its own file until assembly."""
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='chunks')
+    offset = models.BigIntegerField()  # Position of the chunk's first byte in the file
+    bytes = models.BigIntegerField()
+    checksum = models.CharField(max_length=64)  # SHA-256 of the chunk
+    file_path = models.CharField(max_length=500)  # Path in default storage
+
+    class Meta:
+        ordering = ['session', 'offset']
+        unique_together = ['session', 'offset']
+
+    def __str__(self):
+        return f"{self.session_id} @ {self.offset} ({self.bytes} bytes)"
@@ -0,0 +1,42 @@
+"""
+Page-level PDF text extraction with pypdf.
+
+Kept free of Django imports so the functions can run in worker processes
+started with any multiprocessing start method.
+"""
+import logging
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _reader(path: str):
+    from pypdf import PdfReader
+
+    return PdfReader(path)
+
+
+def page_count(path: str) -> int:
+    return len(_reader(path).pages)
+
+
+def iter_pages(path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+    """Yield ``(label, text)`` for pages ``start`` to ``stop`` (0-based, exclusive) in order.
+
+    PDF pages have no label. A page that fails to extract yields empty text so
+    page numbers stay aligned; a file that cannot be opened raises.
+    """
+    reader = _reader(path)
+    total = len(reader.pages)
+    stop = total if stop is None else min(stop, total)
+    for index in range(start, stop):
+        try:
+            yield '', reader.pages[index].extract_text() or ''
+        except Exception as e:
+            logger.warning(f"Error extracting text from page {index + 1} of {path}: {e}")
+            yield '', ''
+
+
+def extract_page_range(path: str, start: int, stop: int) -> List[Tuple[str, str]]:
+    """Pages ``start`` to ``stop``; the unit of work for worker processes."""
+    return list(iter_pages(path, start, stop))
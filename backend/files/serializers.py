@@ -1,5 +1,8 @@
 from rest_framework import serializers
-from .models import BookFile, PDFHighlight
+import re
+from .chunked import max_chunk_size, max_resumable_upload_size
+from .models import BookFile, BookFilePage, PDFHighlight, UploadSession
+from .uploads import max_upload_size
 
 
 class BookFileSerializer(serializers.ModelSerializer):
@@ -11,11 +14,13 @@ class BookFileSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'library_book', 'file_type', 'file_path', 'object_key',
             'bytes', 'checksum', 'uploaded_at', 'text_extracted', 'extracted_text',
-            'filename', 'size_mb'
+            'extraction_status', 'extraction_progress', 'extraction_error', 'extraction_finished_at',
+            'page_count', 'filename', 'size_mb'
         ]
         read_only_fields = [
             'id', 'file_path', 'object_key', 'bytes', 'checksum', 'uploaded_at',
-            'text_extracted', 'filename', 'size_mb'
+            'text_extracted', 'extraction_status', 'extraction_progress', 'extraction_error',
+            'extraction_finished_at', 'page_count', 'filename', 'size_mb'
         ]
 
 
@@ -28,8 +33,8 @@ class BookFileUploadSerializer(serializers.ModelSerializer):
 
     def validate_file(self, value):
         # Validate file size
-        if value.size > 50 * 1024 * 1024:  # 50MB
-            raise serializers.ValidationError("File size must be less than 50MB")
+        if value.size > max_upload_size():
+            raise serializers.ValidationError(f"File size must be less than {max_upload_size() // (1024 * 1024)}MB")
         
         # Validate file type
         allowed_types = ['application/pdf', 'application/epub+zip']
@@ -39,6 +44,67 @@ class BookFileUploadSerializer(serializers.ModelSerializer):
         return value
 
 
+class UploadSessionSerializer(serializers.ModelSerializer):
+    max_chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'library_book', 'filename', 'file_type', 'size', 'offset', 'checksum',
+            'book_file', 'max_chunk_size', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['id', 'file_type', 'offset', 'book_file', 'created_at', 'updated_at']
+
+    def get_max_chunk_size(self, obj):
+        return max_chunk_size()
+
+    def validate_filename(self, value):
+        if value.rsplit('.', 1)[-1].lower() not in ['pdf', 'epub']:
+            raise serializers.ValidationError("Only PDF and EPUB files are supported")
+        return value
+
+    def validate_size(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("File is empty")
+        if value > max_resumable_upload_size():
+            raise serializers.ValidationError(
+                f"File size must be less than {max_resumable_upload_size() // (1024 * 1024)}MB"
+            )
+        return value
+
+    def validate_checksum(self, value):
+        if value and not re.fullmatch(r'[0-9a-fA-F]{64}', value):
+            raise serializers.ValidationError("Checksum must be a hex SHA-256 digest")
+        return value.lower()
+
+    def create(self, validated_data):
+        validated_data['file_type'] = validated_data['filename'].rsplit('.', 1)[-1].lower()
+        return super().create(validated_data)
+
+
+class BookFilePageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = BookFilePage
+        fields = ['page_number', 'label', 'text', 'start_offset', 'end_offset']
+
+
+class PageRangeSerializer(serializers.Serializer):
+    """Validate the page window requested from a book file."""
+    MAX_PAGES = 50
+
+    start = serializers.IntegerField(min_value=1, default=1)
+    end = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, attrs):
+        end = attrs.get('end', attrs['start'] + self.MAX_PAGES - 1)
+        if end < attrs['start']:
+            raise serializers.ValidationError("end must not be before start")
+        if end - attrs['start'] >= self.MAX_PAGES:
+            raise serializers.ValidationError(f"At most {self.MAX_PAGES} pages can be requested at once")
+        attrs['end'] = end
+        return attrs
+
+
 class PDFHighlightSerializer(serializers.ModelSerializer):
     class Meta:
         model = PDFHighlight
@@ -49,3 +115,57 @@ class PDFHighlightCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = PDFHighlight
         fields = ['book_file', 'text', 'page', 'x', 'y', 'width', 'height', 'color']
+
+
+class HighlightWindowSerializer(PageRangeSerializer):
+    """Validate a request for the highlights on a window of a file's pages."""
+    MAX_PAGES = 100
+
+    book_file = serializers.PrimaryKeyRelatedField(queryset=BookFile.objects.defer('extracted_text'))
+    text = serializers.BooleanField(default=False)  # Include each highlight's text
+
+
+class PDFHighlightBulkSerializer(serializers.Serializer):
+    """Validate a batch of highlight creates, updates (each with its ``id``) and deletes."""
+    MAX_ITEMS = 500
+
+    create = serializers.ListField(child=serializers.DictField(), default=list)
+    update = serializers.ListField(child=serializers.DictField(), default=list)
+    delete = serializers.ListField(child=serializers.IntegerField(), default=list)
+
+    def validate_create(self, value):
+        return self._validate_items([PDFHighlightCreateSerializer(data=item) for item in value])
+
+    def validate_update(self, value):
+        ids = [item.get('id') for item in value if isinstance(item.get('id'), int)]
+        highlights = PDFHighlight.objects.in_bulk(ids)
+        item_serializers = []
+        for item in value:
+            instance = highlights.get(item['id']) if isinstance(item.get('id'), int) else None
+            item_serializers.append(
+                PDFHighlightCreateSerializer(instance, data=item, partial=True) if instance else None
+            )
+        validated = self._validate_items(item_serializers)
+        return [(serializer.instance, data) for serializer, data in zip(item_serializers, validated)]
+
+    def validate(self, attrs):
+        total = len(attrs['create']) + len(attrs['update']) + len(attrs['delete'])
+        if not total:
+            raise serializers.ValidationError("Nothing to create, update or delete")
+        if total > self.MAX_ITEMS:
+            raise serializers.ValidationError(f"At most {self.MAX_ITEMS} highlights can be changed at once")
+        return attrs
+
+    def _validate_items(self, item_serializers):
+        """Validated data per item, or one error per item (empty for valid ones)."""
+        errors = []
+        for serializer in item_serializers:
+            if serializer is None:
+                errors.append({'id': ["Highlight not found"]})
+            elif serializer.is_valid():
+                errors.append({})
+            else:
+                errors.append(serializer.errors)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return [serializer.validated_data for serializer in item_serializers]
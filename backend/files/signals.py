@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .blobs import release_blob
+from .models import BookFile
+
+
+@receiver(post_delete, sender=BookFile)
+def release_book_file_blob(sender, instance, **kwargs):
+    if instance.blob_id:
+        release_blob(instance.blob_id)
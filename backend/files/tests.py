@@ -1,3 +1,655 @@
-from django.test import TestCase
+import hashlib
+import io
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from books.models import Book
+from libraries.models import Library, LibraryBook
+from .extraction import ParallelExtractor, extract_book_file, queue_extraction
+from .models import BookFile, BookFilePage, FileBlob, PDFHighlight, UploadSession
 
-# Create your tests here.
+
+def make_pdf(pages):
+    """A minimal PDF with one line of Helvetica text per page."""
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for text in pages:
+        stream = f'BT /F1 12 Tf 72 720 Td ({text}) Tj ET'.encode()
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (len(objects))
+        )
+        kids.append(len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % kid for kid in kids), len(kids)
+    )
+
+    pdf = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf.extend(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+    xref = len(pdf)
+    pdf.extend(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for offset in offsets:
+        pdf.extend(b'%010d 00000 n \n' % offset)
+    pdf.extend(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+    return bytes(pdf)
+
+
+def make_epub(chapters):
+    """An EPUB whose spine lists one XHTML document per ``(title, body)`` chapter."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as epub:
+        epub.writestr('mimetype', 'application/epub+zip')
+        epub.writestr('META-INF/container.xml', (
+            '<?xml version="1.0"?><container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+            '<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>'
+            '</container>'
+        ))
+        items = ''.join(
+            f'<item id="c{number}" href="text/chapter%20{number}.xhtml" media-type="application/xhtml+xml"/>'
+            for number in range(len(chapters))
+        )
+        spine = ''.join(f'<itemref idref="c{number}"/>' for number in range(len(chapters)))
+        epub.writestr('OEBPS/content.opf', (
+            '<?xml version="1.0"?><package xmlns="http://www.idpf.org/2007/opf" version="3.0">'
+            f'<manifest><item id="css" href="style.css" media-type="text/css"/>{items}</manifest>'
+            f'<spine>{spine}</spine></package>'
+        ))
+        for number, (title, body) in enumerate(chapters):
+            epub.writestr(f'OEBPS/text/chapter {number}.xhtml', (
+                '<?xml version="1.0" encoding="utf-8"?><html xmlns="http://www.w3.org/1999/xhtml">'
+                f'<head><title>Book</title><style>p {{ margin: 0 }}</style></head><body>{title}{body}</body></html>'
+            ))
+    return buffer.getvalue()
+
+
+class FileTestCase(APITestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.library = Library.objects.create(name="Reading Room")
+        self.library_book = LibraryBook.objects.create(
+            library=self.library, book=Book.objects.create(title="The Art of War")
+        )
+
+    def _store(self, content, name='book.pdf'):
+        path = default_storage.save(f"books/{self.library_book.id}/{name}", SimpleUploadedFile(name, content))
+        return BookFile.objects.create(
+            library_book=self.library_book, file_type='pdf', file_path=path, bytes=len(content), checksum='0' * 64
+        )
+
+
+class PDFExtractionTest(FileTestCase):
+    def test_upload_queues_extraction(self):
+        """Test that uploading a PDF stores it and extracts its text through the background job"""
+        upload = SimpleUploadedFile('war.pdf', make_pdf(['Laying Plans', 'Waging War']), content_type='application/pdf')
+        response = self.client.post(
+            reverse('bookfile-list'), {'library_book': self.library_book.id, 'file': upload}, format='multipart'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # Jobs run eagerly in tests, so the job has finished by now
+        response = self.client.get(reverse('bookfile-extraction-status', args=[response.data['id']]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['extraction_status'], BookFile.EXTRACTION_DONE)
+        self.assertEqual(response.data['extraction_progress'], 100)
+        self.assertTrue(response.data['text_extracted'])
+        book_file = BookFile.objects.get(id=response.data['id'])
+        self.assertIn('Laying Plans', book_file.extracted_text)
+        self.assertIn('Waging War', book_file.extracted_text)
+
+    def test_unreadable_file_marked_failed(self):
+        """Test that a file pypdf cannot read ends in the failed state with its error"""
+        book_file = self._store(b'not a pdf')
+        self.assertTrue(queue_extraction(book_file))
+        book_file.refresh_from_db()
+        self.assertEqual(book_file.extraction_status, BookFile.EXTRACTION_FAILED)
+        self.assertTrue(book_file.extraction_error)
+        self.assertFalse(book_file.text_extracted)
+        self.assertIsNotNone(book_file.extraction_finished_at)
+
+    def test_active_extraction_not_scheduled_twice(self):
+        """Test that queued or running files are not scheduled or claimed again"""
+        book_file = self._store(make_pdf(['Terrain']))
+        BookFile.objects.filter(id=book_file.id).update(
+            extraction_status=BookFile.EXTRACTION_RUNNING, extraction_started_at=timezone.now()
+        )
+        self.assertFalse(queue_extraction(book_file))
+        self.assertFalse(extract_book_file(book_file.id))
+        response = self.client.post(reverse('bookfile-extract-text', args=[book_file.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['extraction_status'], BookFile.EXTRACTION_RUNNING)
+
+        BookFile.objects.filter(id=book_file.id).update(extraction_status=BookFile.EXTRACTION_FAILED)
+        response = self.client.post(reverse('bookfile-extract-text', args=[book_file.id]))
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['extraction_status'], BookFile.EXTRACTION_DONE)
+
+    def test_stale_extraction_is_requeued(self):
+        """Test that a file left queued or running by a dead worker can be extracted again"""
+        book_file = self._store(make_pdf(['Terrain']))
+        for stale_status in (BookFile.EXTRACTION_QUEUED, BookFile.EXTRACTION_RUNNING):
+            BookFile.objects.filter(id=book_file.id).update(
+                extraction_status=stale_status,
+                extraction_started_at=timezone.now() - timedelta(hours=2),
+                text_extracted=False
+            )
+            response = self.client.post(reverse('bookfile-extract-text', args=[book_file.id]))
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertEqual(response.data['extraction_status'], BookFile.EXTRACTION_DONE)
+
+    def test_force_takes_over_running_extraction(self):
+        """Test that --force extracts files still marked as running"""
+        book_file = self._store(make_pdf(['Terrain']))
+        BookFile.objects.filter(id=book_file.id).update(
+            extraction_status=BookFile.EXTRACTION_RUNNING, extraction_started_at=timezone.now()
+        )
+        out = StringIO()
+        call_command('extract_pdf_text', '--file-id', str(book_file.id), stdout=out)
+        self.assertIn('extraction already running', out.getvalue())
+        call_command('extract_pdf_text', '--file-id', str(book_file.id), '--force', stdout=out)
+        book_file.refresh_from_db()
+        self.assertEqual(book_file.extraction_status, BookFile.EXTRACTION_DONE)
+
+
+class ParallelExtractionTest(FileTestCase):
+    def test_page_ranges_reassembled_in_order(self):
+        """Test that large PDFs are split into page ranges across processes and rejoined in page order"""
+        large = self._store(make_pdf([f'Chapter {number}' for number in range(1, 8)]), 'large.pdf')
+        small = self._store(make_pdf(['Epilogue']), 'small.pdf')
+
+        extractor = ParallelExtractor(workers=2, chunk_pages=3)
+        self.assertEqual(extractor._ranges(7), [(0, 3), (3, 6), (6, 7)])
+        results = {book_file.id: (error, pages) for book_file, error, pages in extractor.run([large, small])}
+        self.assertEqual(results, {large.id: (None, 7), small.id: (None, 1)})
+        self.assertEqual(extractor.counts, {'files': 2, 'failed': 0, 'pages': 8})
+
+        large.refresh_from_db()
+        self.assertEqual(large.extraction_status, BookFile.EXTRACTION_DONE)
+        self.assertEqual(large.extracted_text.split('\n\n'), [f'Chapter {number}' for number in range(1, 8)])
+
+    def test_command_reports_pages_per_second(self):
+        """Test that the command extracts pending files with workers and reports throughput"""
+        book_file = self._store(make_pdf(['Laying Plans', 'Waging War']))
+        self._store(b'not a pdf', 'broken.pdf')
+        out = StringIO()
+        call_command('extract_pdf_text', '--workers', '2', '--chunk-pages', '1', stdout=out)
+        self.assertIn('1 successful, 1 failed, 2 pages in', out.getvalue())
+        self.assertIn('pages/s, 2 workers', out.getvalue())
+        book_file.refresh_from_db()
+        self.assertTrue(book_file.text_extracted)
+
+
+class BookFilePageTest(FileTestCase):
+    def setUp(self):
+        super().setUp()
+        self.book_file = self._store(make_pdf(['Laying Plans', '', 'Attack by Stratagem', 'Tactical Dispositions']))
+        extract_book_file(self.book_file.id)
+        self.book_file.refresh_from_db()
+
+    def test_pages_stored_with_offsets(self):
+        """Test that extraction stores every page, including blank ones, with its span in the joined text"""
+        self.assertEqual(self.book_file.page_count, 4)
+        pages = list(self.book_file.pages.all())
+        self.assertEqual([page.page_number for page in pages], [1, 2, 3, 4])
+        self.assertEqual(pages[1].text, '')
+        for page in pages:
+            self.assertEqual(self.book_file.extracted_text[page.start_offset:page.end_offset], page.text)
+
+    def test_pages_endpoint_returns_window(self):
+        """Test that the pages endpoint returns only the requested window"""
+        url = reverse('bookfile-pages', args=[self.book_file.id])
+        response = self.client.get(url, {'start': 3, 'end': 4})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['page_count'], 4)
+        self.assertEqual([page['page_number'] for page in response.data['pages']], [3, 4])
+        self.assertEqual(response.data['pages'][0]['text'], 'Attack by Stratagem')
+
+        self.assertEqual(self.client.get(url, {'start': 3, 'end': 2}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'start': 1, 'end': 500}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_reports_matching_pages(self):
+        """Test that basic search reports the pages of a file that match"""
+        response = self.client.get(reverse('search-basic'), {'q': 'stratagem'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        hits = [result for result in response.data['results'] if result['type'] == 'file_text']
+        self.assertEqual(len(hits), 1)
+        self.assertEqual(hits[0]['page'], 3)
+        self.assertEqual(hits[0]['pages'], [3])
+        self.assertEqual(hits[0]['snippet'], 'Attack by Stratagem')
+
+        # Pages from before per-page storage are still found through the joined text
+        BookFilePage.objects.all().delete()
+        BookFile.objects.filter(id=self.book_file.id).update(page_count=None)
+        response = self.client.get(reverse('search-basic'), {'q': 'stratagem'})
+        hits = [result for result in response.data['results'] if result['type'] == 'file_text']
+        self.assertEqual(len(hits), 1)
+        self.assertIsNone(hits[0]['page'])
+
+    def test_search_bounds_file_and_page_hits(self):
+        """Test that search lists a bounded number of files, and of pages per file, however many match"""
+        files = BookFile.objects.bulk_create([
+            BookFile(
+                library_book=self.library_book, file_type='pdf', file_path=f'books/{number}.pdf',
+                bytes=1, checksum='0' * 64, text_extracted=True, page_count=3
+            )
+            for number in range(1200)
+        ])
+        files = BookFile.objects.filter(file_path__in=[book_file.file_path for book_file in files])
+        BookFilePage.objects.bulk_create([
+            BookFilePage(
+                book_file=book_file, page_number=number, text=f'Stratagem {number}', start_offset=0, end_offset=11
+            )
+            for book_file in files for number in (1, 2, 3)
+        ])
+
+        with mock.patch('search.views.MAX_PAGES_PER_FILE', 2):
+            response = self.client.get(reverse('search-basic'), {'q': 'stratagem'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        hits = [result for result in response.data['results'] if result['type'] == 'file_text']
+        self.assertEqual(len(hits), 100)
+        hit = next(hit for hit in hits if hit['id'] != str(self.book_file.id))
+        self.assertEqual((hit['page'], hit['pages'], hit['page_matches']), (1, [1, 2], 3))
+        self.assertEqual(hit['snippet'], 'Stratagem 1')
+
+
+class UploadTest(FileTestCase):
+    def _upload(self, content, name='war.pdf'):
+        upload = SimpleUploadedFile(name, content, content_type='application/pdf')
+        return self.client.post(
+            reverse('bookfile-list'), {'library_book': self.library_book.id, 'file': upload}, format='multipart'
+        )
+
+    def test_checksum_computed_while_uploading(self):
+        """Test that the checksum and size come from the upload stream, for memory and temporary file uploads"""
+        content = make_pdf(['Laying Plans'])
+        for memory_size in (10 * 1024 * 1024, 0):
+            with self.settings(FILE_UPLOAD_MAX_MEMORY_SIZE=memory_size):
+                response = self._upload(content)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(response.data['checksum'], hashlib.sha256(content).hexdigest())
+            self.assertEqual(response.data['bytes'], len(content))
+            self.assertEqual(response.data['filename'], 'war.pdf')
+            with default_storage.open(response.data['file_path']) as stored:
+                self.assertEqual(stored.read(), content)
+
+    def test_oversize_upload_rejected_early(self):
+        """Test that uploads over MAX_UPLOAD_SIZE are stopped while streaming or from the declared length"""
+        with self.settings(MAX_UPLOAD_SIZE=1000):
+            # Within the multipart allowance: stopped once the file passes the limit
+            response = self._upload(b'%PDF' + b'x' * 5000)
+            self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            # Far over the limit: refused from Content-Length without parsing the body
+            response = self._upload(b'%PDF' + b'x' * 200 * 1024)
+            self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertFalse(BookFile.objects.exists())
+
+
+class ResumableUploadTest(FileTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = make_pdf(['Laying Plans', 'Waging War'])
+
+    def _open(self, **extra):
+        data = {'library_book': self.library_book.id, 'filename': 'war.pdf', 'size': len(self.content), **extra}
+        return self.client.post(reverse('uploadsession-list'), data, format='json')
+
+    def _put(self, session_id, offset, data, checksum=None):
+        return self.client.put(
+            reverse('uploadsession-chunk', args=[session_id, offset]), data,
+            content_type='application/octet-stream',
+            HTTP_UPLOAD_CHECKSUM=checksum or hashlib.sha256(data).hexdigest()
+        )
+
+    def test_chunked_upload_assembled(self):
+        """Test that chunks sent one after another are assembled into a stored, extracted book file"""
+        response = self._open(checksum=hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        session_id = response.data['id']
+        self.assertEqual(response.data['file_type'], 'pdf')
+
+        middle = len(self.content) // 2
+        self.assertEqual(self._put(session_id, 0, self.content[:middle]).data['offset'], middle)
+        # A client resuming after a dropped connection asks where to continue
+        self.assertEqual(self.client.get(reverse('uploadsession-detail', args=[session_id])).data['offset'], middle)
+        self.assertEqual(self._put(session_id, middle, self.content[middle:]).data['offset'], len(self.content))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('uploadsession-complete', args=[session_id]))
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['checksum'], hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(response.data['filename'], 'war.pdf')
+        with default_storage.open(response.data['file_path']) as stored:
+            self.assertEqual(stored.read(), self.content)
+        self.assertEqual(BookFile.objects.get(id=response.data['id']).extraction_status, BookFile.EXTRACTION_DONE)
+        self.assertEqual(default_storage.listdir(f'uploads/{session_id}'), ([], []))
+
+        # Completing again returns the same file
+        response_again = self.client.post(reverse('uploadsession-complete', args=[session_id]))
+        self.assertEqual(response_again.data['id'], response.data['id'])
+
+    def test_chunks_rejected(self):
+        """Test that chunks at the wrong offset, with a bad checksum or too large are not stored"""
+        session_id = self._open().data['id']
+
+        response = self._put(session_id, 10, self.content[10:20])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['offset'], 0)
+
+        response = self._put(session_id, 0, self.content[:10], checksum='0' * 64)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with self.settings(UPLOAD_CHUNK_SIZE=5):
+            response = self._put(session_id, 0, self.content[:10])
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        self.assertEqual(UploadSession.objects.get(id=session_id).offset, 0)
+        self.assertEqual(default_storage.listdir(f'uploads/{session_id}'), ([], []))
+
+        response = self.client.post(reverse('uploadsession-complete', args=[session_id]))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_session_limits_and_discard(self):
+        """Test the resumable size limit and that cancelling a session deletes its chunks"""
+        with self.settings(MAX_RESUMABLE_UPLOAD_SIZE=100):
+            self.assertEqual(self._open().status_code, status.HTTP_400_BAD_REQUEST)
+
+        session_id = self._open().data['id']
+        self._put(session_id, 0, self.content[:100])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse('uploadsession-detail', args=[session_id]))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(default_storage.listdir(f'uploads/{session_id}'), ([], []))
+
+
+class FileBlobTest(FileTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other_library_book = LibraryBook.objects.create(
+            library=Library.objects.create(name="Study"), book=self.library_book.book
+        )
+        self.content = make_pdf(['Laying Plans', 'Waging War'])
+
+    def _upload(self, library_book):
+        upload = SimpleUploadedFile('war.pdf', self.content, content_type='application/pdf')
+        response = self.client.post(
+            reverse('bookfile-list'), {'library_book': library_book.id, 'file': upload}, format='multipart'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return BookFile.objects.get(id=response.data['id'])
+
+    def test_duplicate_upload_shares_blob_and_extraction(self):
+        """Test that identical uploads share one stored file and the second reuses the first's extraction"""
+        first = self._upload(self.library_book)
+        with self.assertLogs('files.extraction', 'INFO') as logs:
+            second = self._upload(self.other_library_book)
+        self.assertIn(f'Reused extraction of file {first.id}', logs.output[0])
+
+        blob = FileBlob.objects.get()
+        self.assertEqual(blob.checksum, hashlib.sha256(self.content).hexdigest())
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(first.file_path, second.file_path)
+        self.assertEqual(first.file_path, f'blobs/{blob.checksum[:2]}/{blob.checksum}.pdf')
+        self.assertEqual(second.extraction_status, BookFile.EXTRACTION_DONE)
+        self.assertEqual(second.extracted_text, first.extracted_text)
+        self.assertEqual(list(second.pages.values_list('page_number', 'text')), [(1, 'Laying Plans'), (2, 'Waging War')])
+
+    def test_blob_deleted_with_last_reference(self):
+        """Test that the stored file outlives every BookFile but the last"""
+        first = self._upload(self.library_book)
+        self._upload(self.other_library_book)
+        path = first.file_path
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertEqual(FileBlob.objects.get().ref_count, 1)
+        self.assertTrue(default_storage.exists(path))
+
+        # Deleting the library book cascades to its file and the last reference
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_library_book.delete()
+        self.assertFalse(FileBlob.objects.exists())
+        self.assertFalse(default_storage.exists(path))
+
+    def test_failed_upload_leaves_no_stored_file(self):
+        """Test that contents stored for an upload whose transaction rolls back are deleted again"""
+        upload = SimpleUploadedFile('war.pdf', self.content, content_type='application/pdf')
+        with mock.patch.object(BookFile.objects, 'create', side_effect=DatabaseError('gone')):
+            response = self.client.post(
+                reverse('bookfile-list'), {'library_book': self.library_book.id, 'file': upload}, format='multipart'
+            )
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertFalse(FileBlob.objects.exists())
+        checksum = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual(default_storage.listdir(f'blobs/{checksum[:2]}')[1], [])
+
+    def test_embedding_reused_for_identical_contents(self):
+        """Test that a file text embedding is copied to files with the same checksum"""
+        from search.models import SearchEmbedding
+        from search.services import semantic_search_service
+
+        first = self._upload(self.library_book)
+        second = self._upload(self.other_library_book)
+        SearchEmbedding.objects.create(
+            owner_type='file_text', owner_id=first.id, vector=b'\x00\x00\x80\x3f', model=semantic_search_service.ai_provider
+        )
+        self.assertEqual(semantic_search_service._get_or_create_file_embedding(second), [1.0])
+        self.assertTrue(SearchEmbedding.objects.filter(owner_type='file_text', owner_id=second.id).exists())
+
+
+class EpubExtractionTest(FileTestCase):
+    def test_upload_extracts_chapters(self):
+        """Test that an uploaded EPUB is extracted chapter by chapter in spine order"""
+        content = make_epub([
+            ('<h1>Laying\n  Plans</h1>', '<p>Sun Tzu said:</p><p>The art of war is of <em>vital</em> importance.</p>'),
+            ('', '<script>var ignored = 1;</script><p>Waging war &amp; its cost.</p>'),
+        ])
+        upload = SimpleUploadedFile('war.epub', content, content_type='application/epub+zip')
+        response = self.client.post(
+            reverse('bookfile-list'), {'library_book': self.library_book.id, 'file': upload}, format='multipart'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        book_file = BookFile.objects.get(id=response.data['id'])
+        self.assertEqual(book_file.extraction_status, BookFile.EXTRACTION_DONE)
+        self.assertEqual(book_file.page_count, 2)
+        pages = list(book_file.pages.all())
+        self.assertEqual(pages[0].label, 'Laying Plans')
+        self.assertEqual(pages[0].text, 'Laying Plans\nSun Tzu said:\nThe art of war is of vital importance.')
+        # Without a heading the document title labels the chapter
+        self.assertEqual(pages[1].label, 'Book')
+        self.assertEqual(pages[1].text, 'Waging war & its cost.')
+        self.assertEqual(book_file.extracted_text[pages[1].start_offset:pages[1].end_offset], pages[1].text)
+
+    def test_invalid_epub_marked_failed(self):
+        """Test that a file without an EPUB package document fails extraction"""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('mimetype', 'application/epub+zip')
+        book_file = self._store(buffer.getvalue(), 'broken.epub')
+        BookFile.objects.filter(id=book_file.id).update(file_type='epub')
+
+        self.assertFalse(extract_book_file(book_file.id))
+        book_file.refresh_from_db()
+        self.assertEqual(book_file.extraction_status, BookFile.EXTRACTION_FAILED)
+        self.assertIn('package document', book_file.extraction_error)
+
+
+class DownloadTest(FileTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = bytes(range(256)) * 4
+        self.book_file = self._store(self.content)
+        self.url = reverse('bookfile-download', args=[self.book_file.id])
+
+    def test_full_download(self):
+        """Test that a plain GET returns the whole file with validators and Accept-Ranges"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['ETag'], f'"{"0" * 64}"')
+        self.assertIn('The Art of War.pdf', response['Content-Disposition'])
+
+        # Files uploaded under a name are downloaded under it
+        BookFile.objects.filter(id=self.book_file.id).update(original_name='sun-tzu.pdf')
+        response = self.client.get(self.url)
+        b''.join(response.streaming_content)
+        self.assertIn('sun-tzu.pdf', response['Content-Disposition'])
+
+    def test_byte_ranges(self):
+        """Test that single byte ranges, including suffix ranges, return 206 with the slice"""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-10')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b''.join(response.streaming_content), self.content[-10:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_conditional_requests(self):
+        """Test that a matching If-None-Match gets 304 and a stale If-Range gets the whole file"""
+        etag = f'"{"0" * 64}"'
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+
+    def test_missing_file_is_not_found(self):
+        """Test that a file missing from storage is a 404 for full, range and HEAD requests"""
+        default_storage.delete(self.book_file.file_path)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(self.url, HTTP_RANGE='bytes=0-9').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.head(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_head(self):
+        """Test that HEAD reports the size without a body"""
+        response = self.client.head(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response.content, b'')
+
+    def test_offload(self):
+        """Test that offloading names the file for the web server instead of sending it"""
+        with self.settings(FILE_DOWNLOAD_OFFLOAD='x-accel-redirect', FILE_DOWNLOAD_OFFLOAD_PREFIX='/protected-media/'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.book_file.file_path}')
+        self.assertEqual(response.content, b'')
+
+        with self.settings(FILE_DOWNLOAD_OFFLOAD='x-sendfile'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Sendfile'], default_storage.path(self.book_file.file_path))
+
+
+class PDFHighlightBatchTest(FileTestCase):
+    def setUp(self):
+        super().setUp()
+        self.book_file = self._store(make_pdf(['Laying Plans']))
+
+    def _highlight(self, page, color='#ffeb3b', **fields):
+        return PDFHighlight.objects.create(
+            book_file=self.book_file, text=f'Page {page}', page=page, x=1.0, y=2.0, width=3.0, height=4.0,
+            color=color, **fields
+        )
+
+    def test_window_returns_columns(self):
+        """Test that a page window returns parallel arrays with colors as palette indexes"""
+        first = self._highlight(3)
+        second = self._highlight(5, color='#ff0000')
+        third = self._highlight(3, color='#ff0000')
+        self._highlight(9)
+
+        response = self.client.get(
+            reverse('pdfhighlight-window'), {'book_file': self.book_file.id, 'start': 2, 'end': 5}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual(response.data['id'], [first.id, third.id, second.id])
+        self.assertEqual(response.data['page'], [3, 3, 5])
+        self.assertEqual(response.data['colors'], ['#ffeb3b', '#ff0000'])
+        self.assertEqual(response.data['color'], [0, 1, 1])
+        self.assertEqual(response.data['width'], [3.0, 3.0, 3.0])
+        self.assertNotIn('text', response.data)
+
+        response = self.client.get(
+            reverse('pdfhighlight-window'), {'book_file': self.book_file.id, 'start': 9, 'text': 1}
+        )
+        self.assertEqual(response.data['text'], ['Page 9'])
+
+        response = self.client.get(
+            reverse('pdfhighlight-window'), {'book_file': self.book_file.id, 'start': 1, 'end': 500}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_changes(self):
+        """Test that creates, updates and deletes are applied together"""
+        kept = self._highlight(1)
+        removed = self._highlight(2)
+        new = {'book_file': self.book_file.id, 'text': 'New', 'page': 4, 'x': 0, 'y': 0, 'width': 1, 'height': 1}
+
+        response = self.client.post(reverse('pdfhighlight-bulk'), {
+            'create': [new, {**new, 'page': 5}],
+            'update': [{'id': kept.id, 'color': '#00ff00'}],
+            'delete': [removed.id]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['page'] for item in response.data['created']], [4, 5])
+        self.assertTrue(all(item['id'] for item in response.data['created']))
+        self.assertEqual(response.data['deleted'], [removed.id])
+        kept.refresh_from_db()
+        self.assertEqual(kept.color, '#00ff00')
+        self.assertEqual(sorted(PDFHighlight.objects.values_list('page', flat=True)), [1, 4, 5])
+
+    def test_bulk_create_returns_ids_without_returning_rows(self):
+        """Test that created highlights get their ids on backends that cannot return bulk-inserted rows"""
+        new = {'book_file': self.book_file.id, 'text': 'New', 'page': 4, 'x': 0, 'y': 0, 'width': 1, 'height': 1}
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            response = self.client.post(reverse('pdfhighlight-bulk'), {
+                'create': [new, {**new, 'page': 5}], 'update': [], 'delete': []
+            }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['id'] for item in response.data['created']],
+            list(PDFHighlight.objects.order_by('page').values_list('id', flat=True))
+        )
+
+    def test_bulk_invalid_item_changes_nothing(self):
+        """Test that one invalid item rejects the whole batch"""
+        kept = self._highlight(1)
+        response = self.client.post(reverse('pdfhighlight-bulk'), {
+            'create': [{'book_file': self.book_file.id, 'text': 'No position', 'page': 4}],
+            'update': [{'id': 999999, 'color': '#00ff00'}],
+            'delete': [kept.id]
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('x', response.data['create'][0])
+        self.assertIn('id', response.data['update'][0])
+        self.assertTrue(PDFHighlight.objects.filter(id=kept.id).exists())
@@ -0,0 +1,89 @@
+"""
+Single-pass handling of book file uploads.
+
+``HashingUploadHandler`` runs ahead of Django's memory and temporary file
+handlers. It updates a SHA-256 digest and byte count as each chunk of the
+request body is parsed. The checksum is therefore ready the moment the file
+has been written once. A large upload's temporary file is then moved into
+storage rather than copied. Uploads over ``MAX_UPLOAD_SIZE`` are stopped as
+soon as they are known to be too large. A declared Content-Length over the
+limit rejects the request before any of the body is read.
+"""
+import hashlib
+from typing import Optional, Tuple
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload, load_handler
+from django.http import QueryDict
+from django.utils.datastructures import MultiValueDict
+
+# Room for multipart boundaries, headers and form fields around the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+def max_upload_size() -> int:
+    return getattr(settings, 'MAX_UPLOAD_SIZE', 50 * 1024 * 1024)
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """Digest and size uploaded files while they stream in, stopping oversize uploads."""
+
+    def __init__(self, request=None, max_bytes: Optional[int] = None):
+        super().__init__(request)
+        self.max_bytes = max_bytes or max_upload_size()
+        self.too_large = False
+        self.digests = {}  # Field name -> (SHA-256 hex digest, size in bytes)
+        self._sha256 = None
+        self._size = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > self.max_bytes + MULTIPART_OVERHEAD:
+            # Parse nothing, leaving the body unread
+            self.too_large = True
+            return QueryDict(encoding=encoding), MultiValueDict()
+        return None
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        if self.content_length and self.content_length > self.max_bytes:
+            self.too_large = True
+            raise StopUpload(connection_reset=True)
+        self._sha256 = hashlib.sha256()
+        self._size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self._size += len(raw_data)
+        if self._size > self.max_bytes:
+            self.too_large = True
+            raise StopUpload(connection_reset=True)
+        self._sha256.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        self.digests[self.field_name] = (self._sha256.hexdigest(), self._size)
+        # The next handler builds the uploaded file object
+        return None
+
+
+def hashing_upload_handlers(request, max_bytes: Optional[int] = None):
+    """The configured upload handlers with a ``HashingUploadHandler`` in front."""
+    return [HashingUploadHandler(request, max_bytes)] + [
+        load_handler(path, request) for path in settings.FILE_UPLOAD_HANDLERS
+    ]
+
+
+def hashing_handler(request) -> Optional[HashingUploadHandler]:
+    for handler in request.upload_handlers:
+        if isinstance(handler, HashingUploadHandler):
+            return handler
+    return None
+
+
+def upload_digest(request, field_name: str) -> Optional[Tuple[str, int]]:
+    """``(checksum, size)`` of an uploaded file, if it was hashed on the way in."""
+    handler = hashing_handler(request)
+    return handler.digests.get(field_name) if handler else None
+
+
+def upload_too_large(request) -> bool:
+    handler = hashing_handler(request)
+    return bool(handler and handler.too_large)
@@ -1,25 +1,50 @@
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_http_methods
 from django.core.files.storage import default_storage
 from django.core.files.base import ContentFile
 from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
 import os
 import hashlib
 import logging
-from .models import BookFile, PDFHighlight
-from .serializers import BookFileSerializer, BookFileUploadSerializer, PDFHighlightSerializer, PDFHighlightCreateSerializer
+from .blobs import acquire_blob, blob_transaction
+from .chunked import ChecksumMismatch, ChunkError, OffsetMismatch, assemble, discard, max_chunk_size, write_chunk
+from .delivery import serve_book_file
+from .extraction import EXTRACTORS, queue_extraction, reuse_extraction
+from .uploads import hashing_upload_handlers, max_upload_size, upload_digest, upload_too_large
+from .models import BookFile, PDFHighlight, UploadSession
+from .serializers import (
+    BookFileSerializer, BookFileUploadSerializer, BookFilePageSerializer, PageRangeSerializer,
+    PDFHighlightSerializer, PDFHighlightCreateSerializer, UploadSessionSerializer,
+    HighlightWindowSerializer, PDFHighlightBulkSerializer
+)
 from libraries.models import LibraryBook
 
 
+@require_http_methods(['GET', 'HEAD'])
+def download_book_file(request, pk):
+    """Serve a book file with Range, conditional request and sendfile offload support."""
+    book_file = get_object_or_404(
+        BookFile.objects.select_related('library_book__book').defer('extracted_text'), pk=pk
+    )
+    try:
+        return serve_book_file(request, book_file, as_attachment=request.GET.get('download') == '1')
+    except FileNotFoundError:
+        raise Http404('File missing from storage')
+
+
 class BookFileViewSet(viewsets.ModelViewSet):
     queryset = BookFile.objects.all()
     serializer_class = BookFileSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = ['library_book', 'file_type', 'text_extracted']
+    filterset_fields = ['library_book', 'file_type', 'text_extracted', 'extraction_status']
     ordering_fields = ['uploaded_at', 'bytes']
     ordering = ['-uploaded_at']
 
@@ -28,6 +53,9 @@ class BookFileViewSet(viewsets.ModelViewSet):
         library_book_id = self.request.query_params.get('library_book_id')
         if library_book_id:
             queryset = queryset.filter(library_book_id=library_book_id)
+        # Actions that never return the full text should not load it
+        if self.action in ['extraction_status', 'pages']:
+            queryset = queryset.defer('extracted_text')
         return queryset
 
     def get_serializer_class(self):
@@ -35,10 +63,22 @@ class BookFileViewSet(viewsets.ModelViewSet):
             return BookFileUploadSerializer
         return BookFileSerializer
 
+    def initialize_request(self, request, *args, **kwargs):
+        drf_request = super().initialize_request(request, *args, **kwargs)
+        # Hash uploads as they are parsed; the body has not been read yet
+        if self.action == 'create':
+            request.upload_handlers = hashing_upload_handlers(request)
+        return drf_request
+
     def create(self, request, *args, **kwargs):
         """Handle file upload."""
         # Get the uploaded file first
         uploaded_file = request.FILES.get('file')
+        if upload_too_large(request):
+            return Response(
+                {'error': f'File size must be less than {max_upload_size() // (1024 * 1024)}MB'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
         if not uploaded_file:
             return Response(
                 {'error': 'No file provided'}, 
@@ -70,28 +110,33 @@ class BookFileViewSet(viewsets.ModelViewSet):
             # Get library book
             library_book = get_object_or_404(LibraryBook, id=serializer.validated_data['library_book'].id)
             
-            # Generate file path
-            file_name = f"books/{library_book.id}/{uploaded_file.name}"
-            
-            # Save file to storage
-            file_path = default_storage.save(file_name, uploaded_file)
-            
-            # Calculate file size and checksum
-            file_size = uploaded_file.size
-            checksum = self._calculate_checksum(uploaded_file)
-            
-            # Create BookFile record
-            book_file = BookFile.objects.create(
-                library_book=library_book,
-                file_type=serializer.validated_data['file_type'],
-                file_path=file_path,
-                bytes=file_size,
-                checksum=checksum
+            # Checksum and size were computed while the upload was written; hash
+            # again only if the request was parsed without the hashing handler
+            checksum, file_size = upload_digest(request, 'file') or (
+                self._calculate_checksum(uploaded_file), uploaded_file.size
             )
             
-            # Extract text if it's a PDF
-            if serializer.validated_data['file_type'] == 'pdf':
-                self._extract_pdf_text(book_file)
+            with blob_transaction() as stored_paths:
+                # Contents already stored only gain a reference (temporary uploads are moved, not copied)
+                blob, _ = acquire_blob(
+                    uploaded_file, checksum, file_size, serializer.validated_data['file_type'], stored_paths
+                )
+                
+                # Create BookFile record
+                book_file = BookFile.objects.create(
+                    library_book=library_book,
+                    file_type=serializer.validated_data['file_type'],
+                    file_path=blob.file_path,
+                    original_name=uploaded_file.name[:255],
+                    blob=blob,
+                    bytes=file_size,
+                    checksum=checksum
+                )
+            
+            # Extract text in the background so the upload returns once the file is stored,
+            # unless the same contents have been extracted before
+            if not reuse_extraction(book_file):
+                queue_extraction(book_file)
             
             response_serializer = BookFileSerializer(book_file)
             return Response(response_serializer.data, status=status.HTTP_201_CREATED)
@@ -112,12 +157,12 @@ class BookFileViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post'])
     def extract_text(self, request, pk=None):
-        """Extract text from a PDF file."""
+        """Schedule text extraction for a PDF or EPUB file."""
         book_file = self.get_object()
         
-        if book_file.file_type != 'pdf':
+        if book_file.file_type not in EXTRACTORS:
             return Response(
-                {'error': 'Text extraction is only supported for PDF files'}, 
+                {'error': 'Text extraction is only supported for PDF and EPUB files'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
@@ -127,48 +172,105 @@ class BookFileViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_200_OK
             )
         
+        # An extraction already under way is reported as is rather than accepted again
+        queued = queue_extraction(book_file)
+        if not queued:
+            book_file.refresh_from_db()
+        return Response(
+            self._extraction_status(book_file), status=status.HTTP_202_ACCEPTED if queued else status.HTTP_200_OK
+        )
+
+    @action(detail=True, methods=['get'], url_path='status')
+    def extraction_status(self, request, pk=None):
+        """Report the progress of a file's text extraction."""
+        book_file = self.get_object()
+        return Response(self._extraction_status(book_file))
+
+    @action(detail=True, methods=['get'])
+    def pages(self, request, pk=None):
+        """Extracted text of a window of pages (``start`` to ``end``, 1-based, inclusive)."""
+        book_file = self.get_object()
+        serializer = PageRangeSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        start, end = serializer.validated_data['start'], serializer.validated_data['end']
+
+        pages = book_file.pages.filter(page_number__gte=start, page_number__lte=end)
+        return Response({
+            'id': book_file.id,
+            'page_count': book_file.page_count,
+            'start': start,
+            'end': end,
+            'pages': BookFilePageSerializer(pages, many=True).data
+        })
+
+    def _extraction_status(self, book_file):
+        return {
+            'id': book_file.id,
+            'extraction_status': book_file.extraction_status,
+            'extraction_progress': book_file.extraction_progress,
+            'extraction_error': book_file.extraction_error,
+            'extraction_finished_at': book_file.extraction_finished_at,
+            'page_count': book_file.page_count,
+            'text_extracted': book_file.text_extracted,
+        }
+
+
+class UploadSessionViewSet(
+    mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet
+):
+    """Resumable uploads: open a session, PUT raw chunks at its offset, then complete it."""
+    queryset = UploadSession.objects.all()
+    serializer_class = UploadSessionSerializer
+
+    @action(detail=True, methods=['put'], url_path=r'chunks/(?P<offset>[0-9]+)', url_name='chunk')
+    def chunk(self, request, pk=None, offset=None):
+        """Store the request body as the chunk at ``offset``; ``Upload-Checksum`` is its SHA-256."""
+        session = self.get_object()
+        if session.is_complete:
+            return Response({'error': 'Upload is already complete'}, status=status.HTTP_409_CONFLICT)
         try:
-            self._extract_pdf_text(book_file)
-            response_serializer = BookFileSerializer(book_file)
-            return Response(response_serializer.data, status=status.HTTP_200_OK)
-        except Exception as e:
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            length = 0
+        if length <= 0:
             return Response(
-                {'error': 'Text extraction failed'}, 
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': 'Chunk body and Content-Length are required'}, status=status.HTTP_411_LENGTH_REQUIRED
             )
-    
-    def _extract_pdf_text(self, book_file):
-        """Extract text from PDF file."""
+        if length > max_chunk_size():
+            return Response(
+                {'error': f'Chunks must be at most {max_chunk_size()} bytes'},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+
         try:
-            from pypdf import PdfReader
-            
-            # Get the full file path
-            file_path = default_storage.path(book_file.file_path)
-            
-            # Read PDF and extract text
-            reader = PdfReader(file_path)
-            text_content = []
-            
-            for page in reader.pages:
-                text = page.extract_text()
-                if text:
-                    text_content.append(text)
-            
-            # Join all text content
-            extracted_text = '\n\n'.join(text_content)
-            
-            # Update the book file record
-            book_file.extracted_text = extracted_text
-            book_file.text_extracted = True
-            book_file.save()
-            
-            logging.info(f"Successfully extracted text from PDF: {book_file.file_path}")
-            
-        except Exception as e:
-            logging.error(f"Failed to extract text from PDF {book_file.file_path}: {str(e)}")
-            # Don't fail the upload, just mark as not extracted
-            book_file.text_extracted = False
-            book_file.save()
+            # The body is read straight from the request stream, never parsed into memory
+            write_chunk(session, int(offset), request.stream, length, request.headers.get('Upload-Checksum', ''))
+        except OffsetMismatch as e:
+            return Response({'error': str(e), 'offset': e.offset}, status=status.HTTP_409_CONFLICT)
+        except ChunkError as e:
+            return Response({'error': str(e), 'offset': session.offset}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(session).data)
+
+    @action(detail=True, methods=['post'])
+    def complete(self, request, pk=None):
+        """Assemble the received chunks into a BookFile and schedule its extraction."""
+        session = self.get_object()
+        if session.is_complete:
+            # A retried request after the first one succeeded
+            return Response(BookFileSerializer(session.book_file).data)
+        try:
+            book_file = assemble(session)
+        except ChecksumMismatch as e:
+            return Response({'error': str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        except ChunkError as e:
+            return Response({'error': str(e), 'offset': session.offset}, status=status.HTTP_409_CONFLICT)
+
+        if not reuse_extraction(book_file):
+            queue_extraction(book_file)
+        return Response(BookFileSerializer(book_file).data, status=status.HTTP_201_CREATED)
+
+    def perform_destroy(self, instance):
+        discard(instance)
 
 
 class PDFHighlightViewSet(viewsets.ModelViewSet):
@@ -190,3 +292,81 @@ class PDFHighlightViewSet(viewsets.ModelViewSet):
         if self.action in ['create']:
             return PDFHighlightCreateSerializer
         return PDFHighlightSerializer
+
+    @action(detail=False, methods=['get'])
+    def window(self, request):
+        """Highlights on pages ``start`` to ``end`` of ``book_file`` as parallel arrays.
+
+        ``color`` holds indexes into ``colors``. Pass ``text=1`` to include each
+        highlight's text.
+        """
+        serializer = HighlightWindowSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        book_file = serializer.validated_data['book_file']
+        start, end = serializer.validated_data['start'], serializer.validated_data['end']
+
+        columns = ['id', 'page', 'x', 'y', 'width', 'height', 'color']
+        if serializer.validated_data['text']:
+            columns.append('text')
+        # Served by the (book_file, page) index
+        rows = PDFHighlight.objects.filter(
+            book_file=book_file, page__gte=start, page__lte=end
+        ).order_by('page', 'id').values_list(*columns)
+
+        data = {column: [] for column in columns}
+        colors = {}
+        for row in rows:
+            for column, value in zip(columns, row):
+                if column == 'color':
+                    value = colors.setdefault(value, len(colors))
+                data[column].append(value)
+        return Response({
+            'book_file': book_file.id,
+            'start': start,
+            'end': end,
+            'count': len(data['id']),
+            'colors': list(colors),
+            **data
+        })
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Create, update and delete many highlights in one transaction.
+
+        Takes ``{"create": [...], "update": [{"id": ..., ...}], "delete": [ids]}``;
+        if any item is invalid nothing is changed.
+        """
+        serializer = PDFHighlightBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        created, updated, deleted = self._apply_bulk(serializer.validated_data)
+        return Response({
+            'created': PDFHighlightSerializer(created, many=True).data,
+            'updated': PDFHighlightSerializer(updated, many=True).data,
+            'deleted': deleted
+        })
+
+    def _apply_bulk(self, changes):
+        with transaction.atomic():
+            created = [PDFHighlight(**item) for item in changes['create']]
+            if connection.features.can_return_rows_from_bulk_insert:
+                PDFHighlight.objects.bulk_create(created)
+            else:
+                # Backends without INSERT ... RETURNING (MySQL) leave bulk-created pks unset
+                for highlight in created:
+                    highlight.save(force_insert=True)
+
+            updated, fields = [], {'updated_at'}
+            now = timezone.now()
+            for highlight, item in changes['update']:
+                for field, value in item.items():
+                    setattr(highlight, field, value)
+                highlight.updated_at = now
+                fields.update(item)
+                updated.append(highlight)
+            if updated:
+                PDFHighlight.objects.bulk_update(updated, fields)
+
+            to_delete = PDFHighlight.objects.filter(id__in=changes['delete'])
+            deleted = list(to_delete.values_list('id', flat=True))
+            to_delete.delete()
+        return created, updated, deleted
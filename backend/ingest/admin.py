@@ -1,3 +1,28 @@
 from django.contrib import admin
+from .models import MetadataLookup, OpenLibraryAuthor, OpenLibraryEdition
 
-# Register your models here.
+
+@admin.register(MetadataLookup)
+class MetadataLookupAdmin(admin.ModelAdmin):
+    list_display = ['isbn', 'provider', 'found', 'fetched_at', 'expires_at']
+    list_filter = ['provider', 'found']
+    search_fields = ['isbn']
+    readonly_fields = ['fetched_at']
+    ordering = ['-fetched_at']
+
+
+@admin.register(OpenLibraryAuthor)
+class OpenLibraryAuthorAdmin(admin.ModelAdmin):
+    list_display = ['name', 'key', 'imported', 'fetched_at']
+    list_filter = ['imported']
+    search_fields = ['name', 'key']
+    readonly_fields = ['fetched_at']
+    ordering = ['name']
+
+
+@admin.register(OpenLibraryEdition)
+class OpenLibraryEditionAdmin(admin.ModelAdmin):
+    list_display = ['title', 'isbn', 'publisher', 'publish_date', 'imported_at']
+    search_fields = ['isbn', 'isbn_10', 'title', 'edition_key']
+    readonly_fields = ['imported_at']
+    ordering = ['isbn']
@@ -0,0 +1,128 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+import requests
+from django.conf import settings
+from django.db import DatabaseError
+from .http_client import http_client
+from .models import OpenLibraryAuthor
+
+logger = logging.getLogger(__name__)
+
+OPEN_LIBRARY_URL = "https://openlibrary.org"
+
+
+class AuthorNameCache:
+    """Open Library author key to name cache, in memory and in the database.
+
+    ``resolve`` only uses memory and the network, so it is safe to call from
+    provider worker threads. The database is read by ``warm`` and written by
+    ``flush``, both of which run on the calling (request or command) thread.
+    """
+
+    def __init__(self):
+        self.workers = getattr(settings, 'OPEN_LIBRARY_AUTHOR_WORKERS', 8)
+        self._names: Dict[str, str] = {}
+        self._unsaved: Dict[str, str] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='author-lookup')
+            return self._executor
+
+    def warm(self):
+        """Load names fetched on demand into memory once per process.
+
+        Names imported from a dump can run to millions of rows; they are read
+        per lookup by the local dump provider instead.
+        """
+        if self._loaded:
+            return
+        try:
+            names = dict(OpenLibraryAuthor.objects.filter(imported=False).values_list('key', 'name').iterator())
+        except DatabaseError as e:
+            logger.warning(f"Could not load Open Library author cache: {e}")
+            return
+        with self._lock:
+            names.update(self._names)
+            self._names = names
+            self._loaded = True
+
+    def flush(self) -> int:
+        """Persist names fetched since the last flush."""
+        with self._lock:
+            unsaved, self._unsaved = self._unsaved, {}
+        if not unsaved:
+            return 0
+        try:
+            OpenLibraryAuthor.objects.bulk_create(
+                [OpenLibraryAuthor(key=key, name=name) for key, name in unsaved.items()],
+                batch_size=500,
+                ignore_conflicts=True
+            )
+        except DatabaseError as e:
+            logger.warning(f"Could not persist {len(unsaved)} Open Library authors: {e}")
+            return 0
+        return len(unsaved)
+
+    def remember(self, names: Dict[str, str]):
+        """Record names that arrived embedded in another response."""
+        with self._lock:
+            for key, name in names.items():
+                if self._names.get(key) != name:
+                    self._names[key] = name
+                    self._unsaved[key] = name
+
+    def clear(self):
+        """Forget in-memory names; the next ``warm`` reloads them from the database."""
+        with self._lock:
+            self._names = {}
+            self._unsaved = {}
+            self._loaded = False
+
+    def _fetch(self, key: str, deadline: Optional[float] = None) -> Optional[str]:
+        try:
+            response = http_client.get(
+                f"{OPEN_LIBRARY_URL}{key}.json", timeout=5, provider='open_library', deadline=deadline
+            )
+            if response.status_code != 200:
+                logger.info(f"Open Library author {key} returned {response.status_code}")
+                return None
+            return response.json().get('name') or None
+        except (requests.RequestException, ValueError) as e:
+            logger.warning(f"Open Library author request failed for {key}: {e}")
+            return None
+
+    def resolve(self, keys: Iterable[str], deadline: Optional[float] = None) -> Dict[str, str]:
+        """Return names for author keys, fetching unknown keys concurrently before ``deadline``."""
+        keys = list(dict.fromkeys(key for key in keys if key))
+        names = {key: self._names[key] for key in keys if key in self._names}
+        missing = [key for key in keys if key not in names]
+        if len(missing) == 1:
+            fetched = [self._fetch(missing[0], deadline)]
+        elif missing:
+            fetched = list(self._get_executor().map(lambda key: self._fetch(key, deadline), missing))
+        else:
+            fetched = []
+
+        with self._lock:
+            for key, name in zip(missing, fetched):
+                if name:
+                    self._names[key] = name
+                    self._unsaved[key] = name
+                    names[key] = name
+        return names
+
+    def names_for(self, keys: List[str], deadline: Optional[float] = None) -> List[str]:
+        """Resolve keys and return the known names in the given order."""
+        names = self.resolve(keys, deadline)
+        return [names[key] for key in keys if key in names]
+
+
+# Global instance
+author_names = AuthorNameCache()
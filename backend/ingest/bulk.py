@@ -0,0 +1,230 @@
+import logging
+import time
+from typing import Dict, Iterable, Iterator, List
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models.signals import post_save
+from django.utils.dateparse import parse_date
+from books.isbn import clean_isbn, normalize_isbn
+from books.models import Author, Book
+from .clients import BookMetadataClient
+
+logger = logging.getLogger(__name__)
+
+CREATE_BATCH_SIZE = 25  # Fetched books are written and reported in batches of this size
+
+
+def book_fields_from_metadata(metadata: Dict) -> Dict:
+    """Book model fields from normalized provider metadata, dropping unusable values."""
+    publication_date = metadata.get('publication_date')
+    try:
+        publication_date = parse_date(publication_date) if publication_date else None
+    except ValueError:
+        publication_date = None
+
+    book_data = {
+        'primary_isbn_13': metadata.get('primary_isbn_13'),
+        'isbn_10': metadata.get('isbn_10'),
+        'title': (metadata.get('title') or '')[:500],
+        'subtitle': (metadata.get('subtitle') or '')[:500] or None,
+        'description': metadata.get('description'),
+        'publisher': (metadata.get('publisher') or '')[:255] or None,
+        'publication_date': publication_date,
+        'page_count': metadata.get('page_count'),
+        'language': (metadata.get('language') or 'en')[:10],
+        'cover_url': metadata.get('cover_url'),
+        'source': metadata.get('source', 'manual')
+    }
+    return {k: v for k, v in book_data.items() if v is not None}
+
+
+def _send_created(model, instances):
+    """bulk_create skips post_save; send it so search indexes and other listeners stay current."""
+    for instance in instances:
+        post_save.send(sender=model, instance=instance, created=True, raw=False, using='default', update_fields=None)
+
+
+def _author_key(name: str) -> str:
+    return name.casefold().strip()
+
+
+def _book_event(isbn: str, status: str, book: Book = None, **extra) -> Dict:
+    event = {'isbn': isbn, 'status': status}
+    if book is not None:
+        event['book'] = {
+            'id': str(book.id),
+            'title': book.title,
+            'cover_url': book.cover_url,
+        }
+    event.update(extra)
+    return event
+
+
+class BulkIngest:
+    """Create books for many ISBNs, yielding one progress event per input ISBN.
+
+    Existing books are found with one query, metadata is fetched on a bounded
+    worker pool, and new authors and books are written with bulk inserts in
+    batches as lookups complete.
+    """
+
+    def __init__(self, workers: int = None, library=None):
+        self.workers = workers or getattr(settings, 'BULK_INGEST_WORKERS', 8)
+        self.library = library
+        self.client = BookMetadataClient()
+        self.counts = {'created': 0, 'exists': 0, 'not_found': 0, 'invalid': 0, 'error': 0}
+
+    def run(self, isbns: Iterable[str]) -> Iterator[Dict]:
+        started = time.monotonic()
+        # Several inputs (e.g. ISBN-10 and ISBN-13 of one book) can share a canonical ISBN
+        inputs_by_canonical: Dict[str, List[str]] = {}
+        for isbn in isbns:
+            canonical = normalize_isbn(isbn)
+            if canonical is None:
+                yield self._count(_book_event(isbn, 'invalid', error='Not a valid ISBN'))
+                continue
+            inputs_by_canonical.setdefault(canonical, []).append(isbn)
+
+        existing = Book.find_by_isbns(inputs_by_canonical)
+        for canonical, book in existing.items():
+            yield from self._report(inputs_by_canonical.pop(canonical), 'exists', book)
+        self._add_to_library(existing.values())
+
+        lookup_keys = {clean_isbn(inputs[0]): canonical for canonical, inputs in inputs_by_canonical.items()}
+        pending = []
+        for isbn, metadata in self.client.iter_lookups(list(lookup_keys), workers=self.workers):
+            canonical = lookup_keys[isbn]
+            if not metadata or not metadata.get('title'):
+                yield from self._report(inputs_by_canonical[canonical], 'not_found', error='Book not found in external APIs')
+                continue
+            pending.append((canonical, metadata))
+            if len(pending) >= CREATE_BATCH_SIZE:
+                yield from self._create_batch(pending, inputs_by_canonical)
+                pending = []
+        if pending:
+            yield from self._create_batch(pending, inputs_by_canonical)
+
+        yield {'done': True, 'elapsed': round(time.monotonic() - started, 2), **self.counts}
+
+    def _count(self, event: Dict) -> Dict:
+        self.counts[event['status']] += 1
+        return event
+
+    def _report(self, inputs: List[str], status: str, book: Book = None, **extra) -> Iterator[Dict]:
+        for isbn in inputs:
+            yield self._count(_book_event(isbn, status, book, **extra))
+
+    def _create_batch(self, pending, inputs_by_canonical) -> Iterator[Dict]:
+        """Write one batch, reporting its unreported inputs as errors if it fails, so the stream goes on."""
+        reported = set()
+        try:
+            for event in self._write_batch(pending, inputs_by_canonical):
+                reported.add(event['isbn'])
+                yield event
+        except Exception as e:
+            logger.exception("Bulk ingest batch failed")
+            for canonical, _ in pending:
+                unreported = [isbn for isbn in inputs_by_canonical[canonical] if isbn not in reported]
+                yield from self._report(unreported, 'error', error=f'Failed to create book: {e}')
+
+    def _write_batch(self, pending, inputs_by_canonical) -> Iterator[Dict]:
+        # The provider may report ISBNs we already hold under another book record
+        reported = {}
+        for canonical, metadata in pending:
+            for isbn in (metadata.get('primary_isbn_13'), metadata.get('isbn_10'), canonical):
+                if normalize_isbn(isbn):
+                    reported.setdefault(canonical, []).append(normalize_isbn(isbn))
+        existing = Book.find_by_isbns({isbn for isbns in reported.values() for isbn in isbns})
+
+        new_books = {}
+        matched = {}
+        claimed = {}
+        for canonical, metadata in pending:
+            book = next((existing[isbn] for isbn in reported[canonical] if isbn in existing), None)
+            if book is not None:
+                matched[canonical] = book
+                continue
+            book = Book(**book_fields_from_metadata(metadata))
+            book.canonical_isbn = normalize_isbn(book.primary_isbn_13) or normalize_isbn(book.isbn_10)
+            if book.canonical_isbn and book.canonical_isbn in claimed:
+                # Two inputs resolved to the same edition within this batch
+                matched[canonical] = claimed[book.canonical_isbn]
+                continue
+            claimed[book.canonical_isbn] = book
+            new_books[canonical] = (book, [name.strip() for name in metadata.get('authors') or [] if name.strip()])
+
+        errors = {}
+        if new_books:
+            try:
+                self._bulk_create(new_books)
+            except DatabaseError as e:
+                logger.warning(f"Bulk book insert failed, retrying one by one: {e}")
+                errors = self._create_individually(new_books)
+
+        for canonical, book in matched.items():
+            yield from self._report(inputs_by_canonical[canonical], 'exists', book)
+        for canonical, (book, _) in new_books.items():
+            if canonical in errors:
+                yield from self._report(inputs_by_canonical[canonical], 'error', error=errors[canonical])
+            else:
+                yield from self._report(inputs_by_canonical[canonical], 'created', book)
+        self._add_to_library(
+            list(matched.values()) + [book for canonical, (book, _) in new_books.items() if canonical not in errors]
+        )
+
+    def _authors_by_name(self, names) -> Dict[str, Author]:
+        """Get or create authors by name with one insert and one select.
+
+        The result is keyed by ``_author_key``: under a case-insensitive
+        collation (MySQL) the unique name may come back as an existing
+        "j. smith" for "J. Smith".
+        """
+        names = set(names)
+        existing = set(Author.objects.filter(name__in=names).values_list('name', flat=True))
+        created = [Author(name=name) for name in names - existing]
+        Author.objects.bulk_create(created, ignore_conflicts=True)
+        # Re-read: not every database returns primary keys from bulk inserts
+        found = list(Author.objects.filter(name__in=names))
+        authors = {_author_key(author.name): author for author in found}
+        # An exact spelling wins over another case of the same name
+        authors.update({_author_key(author.name): author for author in found if author.name in names})
+        for name in names:
+            if _author_key(name) not in authors:
+                authors[_author_key(name)] = Author.objects.get_or_create(name__iexact=name, defaults={'name': name})[0]
+        exact = {author.name: author for author in found}
+        _send_created(Author, [exact[author.name] for author in created if author.name in exact])
+        return authors
+
+    def _bulk_create(self, new_books):
+        with transaction.atomic():
+            authors = self._authors_by_name(name for _, names in new_books.values() for name in names)
+            books = [book for book, _ in new_books.values()]
+            Book.objects.bulk_create(books)
+            Book.authors.through.objects.bulk_create([
+                Book.authors.through(book_id=book.id, author_id=authors[_author_key(name)].id)
+                for book, names in new_books.values()
+                for name in dict.fromkeys(names)
+            ], ignore_conflicts=True)
+        _send_created(Book, books)
+
+    def _create_individually(self, new_books) -> Dict[str, str]:
+        errors = {}
+        for canonical, (book, names) in new_books.items():
+            try:
+                with transaction.atomic():
+                    book.save(force_insert=True)
+                    book.authors.set(Author.objects.get_or_create(name=name)[0] for name in names)
+            except DatabaseError as e:
+                errors[canonical] = f'Failed to create book: {e}'
+        return errors
+
+    def _add_to_library(self, books):
+        if self.library is None or not books:
+            return
+        from libraries.models import LibraryBook
+
+        book_ids = {book.id for book in books}
+        present = set(LibraryBook.objects.filter(library=self.library, book_id__in=book_ids).values_list('book_id', flat=True))
+        added = [LibraryBook(library=self.library, book_id=book_id) for book_id in book_ids - present]
+        LibraryBook.objects.bulk_create(added, ignore_conflicts=True)
+        _send_created(LibraryBook, added)
@@ -0,0 +1,77 @@
+import logging
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+from books.isbn import clean_isbn, normalize_isbn
+from .models import MetadataLookup
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(isbn: str) -> str:
+    """ISBN-10 and ISBN-13 forms of a book share one cache row."""
+    return normalize_isbn(isbn) or clean_isbn(isbn)
+
+
+class MetadataCache:
+    """Persistent per-provider cache of ISBN lookups, including "not found" answers."""
+
+    def __init__(self):
+        self.ttl = timedelta(seconds=getattr(settings, 'METADATA_CACHE_TTL_SECONDS', 30 * 24 * 3600))
+        self.negative_ttl = timedelta(seconds=getattr(settings, 'METADATA_CACHE_NEGATIVE_TTL_SECONDS', 24 * 3600))
+
+    def get(self, provider: str, isbn: str) -> Tuple[bool, Optional[Dict]]:
+        """Return ``(hit, normalized)``; a hit with ``None`` means the provider has no such book."""
+        try:
+            entry = MetadataLookup.objects.filter(
+                isbn=cache_key(isbn), provider=provider, expires_at__gt=timezone.now()
+            ).values_list('found', 'normalized').first()
+        except DatabaseError as e:
+            logger.warning(f"Metadata cache read failed for {provider}:{isbn}: {e}")
+            return False, None
+        if entry is None:
+            return False, None
+        found, normalized = entry
+        return True, normalized if found else None
+
+    def get_many(self, provider: str, isbns) -> Dict[str, Optional[Dict]]:
+        """Return cached answers for the ISBNs that have one, keyed by the given ISBN."""
+        keys = {isbn: cache_key(isbn) for isbn in isbns}
+        try:
+            rows = {
+                key: normalized if found else None
+                for key, found, normalized in MetadataLookup.objects.filter(
+                    isbn__in=set(keys.values()), provider=provider, expires_at__gt=timezone.now()
+                ).values_list('isbn', 'found', 'normalized')
+            }
+        except DatabaseError as e:
+            logger.warning(f"Metadata cache read failed for {provider} ({len(keys)} ISBNs): {e}")
+            return {}
+        return {isbn: rows[key] for isbn, key in keys.items() if key in rows}
+
+    def store(self, provider: str, isbn: str, raw=None, normalized: Optional[Dict] = None):
+        """Cache a provider answer; a missing ``normalized`` result is cached as "not found"."""
+        found = normalized is not None
+        try:
+            MetadataLookup.objects.update_or_create(
+                isbn=cache_key(isbn),
+                provider=provider,
+                defaults={
+                    'found': found,
+                    'raw': raw,
+                    'normalized': normalized,
+                    'expires_at': timezone.now() + (self.ttl if found else self.negative_ttl),
+                }
+            )
+        except DatabaseError as e:
+            logger.warning(f"Metadata cache write failed for {provider}:{isbn}: {e}")
+
+    def purge_expired(self) -> int:
+        deleted, _ = MetadataLookup.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+# Global instance
+metadata_cache = MetadataCache()
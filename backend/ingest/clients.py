@@ -1,49 +1,126 @@
 import requests
 import logging
-from typing import Dict, Optional, List
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from typing import Dict, Iterator, Optional, List, Tuple
 from datetime import datetime
 from django.conf import settings
+from django.db import DatabaseError
+from books.isbn import clean_isbn, normalize_isbn
+from .http_client import http_client
+from .cache import metadata_cache
+from .authors import author_names
+from .models import OpenLibraryAuthor, OpenLibraryEdition
 
 logger = logging.getLogger(__name__)
 
 
-class GoogleBooksClient:
+class MetadataProviderClient:
+    """Cached ISBN lookups shared by the provider clients.
+    
+    Subclasses implement the network-only ``fetch`` (one ISBN) and
+    ``fetch_batch`` (up to ``BATCH_SIZE`` ISBNs in one request).
+    """
+    
+    PROVIDER = None
+    NAME = None
+    BATCH_SIZE = 1
+    LOCAL = False  # Local providers answer from the database without network I/O
+    
+    def lookup_by_isbn(self, isbn: str) -> Optional[Dict]:
+        """Lookup book by ISBN, answering from the metadata cache when possible."""
+        if not self.enabled:
+            logger.info(f"{self.NAME} API is disabled")
+            return None
+        
+        # Clean ISBN (remove hyphens and spaces)
+        isbn = clean_isbn(isbn)
+        
+        hit, cached = metadata_cache.get(self.PROVIDER, isbn)
+        if hit:
+            return cached
+        
+        author_names.warm()
+        fetched = self.fetch(isbn)
+        author_names.flush()
+        if fetched is None:
+            return None
+        raw, result = fetched
+        metadata_cache.store(self.PROVIDER, isbn, raw=raw, normalized=result)
+        return result
+    
+    def lookup_many(self, isbns: List[str]) -> Dict[str, Optional[Dict]]:
+        """Lookup many ISBNs, packing ``BATCH_SIZE`` of them into each request.
+        
+        Returns results keyed by cleaned ISBN; ISBNs whose request failed are omitted.
+        """
+        if not self.enabled:
+            return {}
+        
+        isbns = list(dict.fromkeys(clean_isbn(isbn) for isbn in isbns if clean_isbn(isbn)))
+        results = metadata_cache.get_many(self.PROVIDER, isbns)
+        missing = [isbn for isbn in isbns if isbn not in results]
+        if not missing:
+            return results
+        
+        author_names.warm()
+        chunks = [missing[i:i + self.BATCH_SIZE] for i in range(0, len(missing), self.BATCH_SIZE)]
+        for fetched in _get_lookup_executor().map(self.fetch_batch, chunks):
+            for isbn, (raw, result) in (fetched or {}).items():
+                metadata_cache.store(self.PROVIDER, isbn, raw=raw, normalized=result)
+                results[isbn] = result
+        author_names.flush()
+        return results
+    
+    def fetch(self, isbn: str, deadline: Optional[float] = None) -> Optional[Tuple[Dict, Optional[Dict]]]:
+        raise NotImplementedError
+    
+    def fetch_batch(self, isbns: List[str]) -> Optional[Dict[str, Tuple[Dict, Optional[Dict]]]]:
+        raise NotImplementedError
+
+
+class GoogleBooksClient(MetadataProviderClient):
     """Client for Google Books API."""
     
     BASE_URL = "https://www.googleapis.com/books/v1/volumes"
+    PROVIDER = 'google_books'
+    NAME = 'Google Books'
+    BATCH_SIZE = 20  # ISBNs OR-ed into one query
+    PAGE_SIZE = 40  # Largest maxResults Google Books allows
     
     def __init__(self):
         self.enabled = getattr(settings, 'GOOGLE_BOOKS_ENABLED', True)
     
-    def lookup_by_isbn(self, isbn: str) -> Optional[Dict]:
-        """Lookup book by ISBN using Google Books API."""
-        if not self.enabled:
-            logger.info("Google Books API is disabled")
-            return None
+    def fetch(self, isbn: str, deadline: Optional[float] = None) -> Optional[Tuple[Dict, Optional[Dict]]]:
+        """Request an ISBN without touching the cache or database.
         
+        Returns ``(raw, normalized)``, with ``normalized`` None when Google Books
+        has no such book, or None when the request failed or ran past ``deadline``.
+        """
         try:
-            # Clean ISBN (remove hyphens and spaces)
-            clean_isbn = isbn.replace('-', '').replace(' ', '')
-            
             # Search by ISBN
             params = {
-                'q': f'isbn:{clean_isbn}',
+                'q': f'isbn:{isbn}',
                 'key': getattr(settings, 'GOOGLE_BOOKS_API_KEY', None)
             }
             
-            response = requests.get(self.BASE_URL, params=params, timeout=10)
+            response = http_client.get(
+                self.BASE_URL, params=params, timeout=10, provider=self.PROVIDER, deadline=deadline
+            )
             response.raise_for_status()
             
             data = response.json()
             
             if data.get('totalItems', 0) == 0:
                 logger.info(f"No book found for ISBN {isbn} in Google Books")
-                return None
+                return data, None
             
             # Get the first result
             volume_info = data['items'][0]['volumeInfo']
             
-            return self._normalize_volume_info(volume_info, isbn)
+            return data['items'][0], self._normalize_volume_info(volume_info, isbn)
             
         except requests.RequestException as e:
             logger.error(f"Google Books API request failed for ISBN {isbn}: {e}")
@@ -52,6 +129,47 @@ class GoogleBooksClient:
             logger.error(f"Error processing Google Books response for ISBN {isbn}: {e}")
             return None
     
+    def fetch_batch(self, isbns: List[str]) -> Optional[Dict[str, Tuple[Dict, Optional[Dict]]]]:
+        """Request several ISBNs with one OR-ed query and match volumes back by identifier.
+        
+        Returns ``{isbn: (raw, normalized)}``, or None when the request failed.
+        """
+        try:
+            params = {
+                'q': ' OR '.join(f'isbn:{isbn}' for isbn in isbns),
+                'maxResults': self.PAGE_SIZE,
+                'key': getattr(settings, 'GOOGLE_BOOKS_API_KEY', None)
+            }
+            response = http_client.get(self.BASE_URL, params=params, timeout=10, provider=self.PROVIDER)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"Google Books batch request failed for {len(isbns)} ISBNs: {e}")
+            return None
+        
+        items = data.get('items') or []
+        volumes = {}
+        for item in items:
+            for identifier in item.get('volumeInfo', {}).get('industryIdentifiers', []):
+                canonical = normalize_isbn(identifier.get('identifier'))
+                if canonical:
+                    volumes.setdefault(canonical, item)
+        # A truncated page cannot prove that the ISBNs missing from it do not exist
+        complete = data.get('totalItems', 0) <= len(items)
+        
+        results = {}
+        for isbn in isbns:
+            item = volumes.get(normalize_isbn(isbn))
+            if item is None:
+                if complete:
+                    results[isbn] = ({'totalItems': 0}, None)
+                continue
+            try:
+                results[isbn] = (item, self._normalize_volume_info(item['volumeInfo'], isbn))
+            except Exception as e:
+                logger.error(f"Error processing Google Books response for ISBN {isbn}: {e}")
+        return results
+    
     def _normalize_volume_info(self, volume_info: Dict, original_isbn: str) -> Dict:
         """Normalize Google Books volume info to our format."""
         # Extract ISBNs
@@ -114,37 +232,28 @@ class GoogleBooksClient:
         }
 
 
-class OpenLibraryClient:
+class OpenLibraryClient(MetadataProviderClient):
     """Client for Open Library API."""
     
     BASE_URL = "https://openlibrary.org"
+    PROVIDER = 'open_library'
+    NAME = 'Open Library'
+    BATCH_SIZE = 50  # bibkeys per /api/books request
     
     def __init__(self):
         self.enabled = getattr(settings, 'OPEN_LIBRARY_ENABLED', True)
     
-    def lookup_by_isbn(self, isbn: str) -> Optional[Dict]:
-        """Lookup book by ISBN using Open Library API."""
-        if not self.enabled:
-            logger.info("Open Library API is disabled")
-            return None
+    def fetch(self, isbn: str, deadline: Optional[float] = None) -> Optional[Tuple[Dict, Optional[Dict]]]:
+        """Request an ISBN without touching the cache or database.
         
+        Returns ``(raw, normalized)``, with ``normalized`` None when Open Library
+        has no such book, or None when the request failed or ran past ``deadline``.
+        """
         try:
-            # Clean ISBN (remove hyphens and spaces)
-            clean_isbn = isbn.replace('-', '').replace(' ', '')
-            
-            # Search by ISBN
-            url = f"{self.BASE_URL}/isbn/{clean_isbn}.json"
-            response = requests.get(url, timeout=10)
-            
-            if response.status_code == 404:
-                logger.info(f"No book found for ISBN {isbn} in Open Library")
-                return None
-            
-            response.raise_for_status()
-            data = response.json()
-            
-            return self._normalize_work_data(data, isbn)
-            
+            data = self._fetch_record(isbn, deadline)
+            if data is None:
+                return None, None
+            return data, self._normalize_work_data(data, isbn, deadline)
         except requests.RequestException as e:
             logger.error(f"Open Library API request failed for ISBN {isbn}: {e}")
             return None
@@ -152,7 +261,60 @@ class OpenLibraryClient:
             logger.error(f"Error processing Open Library response for ISBN {isbn}: {e}")
             return None
     
-    def _normalize_work_data(self, work_data: Dict, original_isbn: str) -> Dict:
+    def _fetch_record(self, isbn: str, deadline: Optional[float] = None) -> Optional[Dict]:
+        """Return the raw edition record, or None when Open Library has no such ISBN."""
+        url = f"{self.BASE_URL}/isbn/{isbn}.json"
+        response = http_client.get(url, timeout=10, provider=self.PROVIDER, deadline=deadline)
+        
+        if response.status_code == 404:
+            logger.info(f"No book found for ISBN {isbn} in Open Library")
+            return None
+        
+        response.raise_for_status()
+        return response.json()
+    
+    def fetch_batch(self, isbns: List[str]) -> Optional[Dict[str, Tuple[Dict, Optional[Dict]]]]:
+        """Request several ISBNs from /api/books with jscmd=details.
+        
+        The details view embeds the edition record, including author names, so
+        only authors it leaves unnamed are resolved separately. Returns
+        ``{isbn: (raw, normalized)}``, or None when the request failed.
+        """
+        try:
+            params = {
+                'bibkeys': ','.join(f'ISBN:{isbn}' for isbn in isbns),
+                'format': 'json',
+                'jscmd': 'details'
+            }
+            response = http_client.get(f"{self.BASE_URL}/api/books", params=params, timeout=10, provider=self.PROVIDER)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError) as e:
+            logger.error(f"Open Library batch request failed for {len(isbns)} ISBNs: {e}")
+            return None
+        
+        records = {isbn: (data.get(f'ISBN:{isbn}') or {}).get('details') for isbn in isbns}
+        author_names.remember({
+            ref['key']: ref['name']
+            for record in records.values() if record
+            for ref in record.get('authors') or []
+            if isinstance(ref, dict) and ref.get('key') and ref.get('name')
+        })
+        author_names.resolve(key for record in records.values() if record for key in self._author_keys(record))
+        
+        results = {}
+        for isbn, record in records.items():
+            try:
+                results[isbn] = (record, self._normalize_work_data(record, isbn) if record else None)
+            except Exception as e:
+                logger.error(f"Error processing Open Library response for ISBN {isbn}: {e}")
+        return results
+    
+    @staticmethod
+    def _author_keys(work_data: Dict) -> List[str]:
+        return [ref['key'] for ref in work_data.get('authors') or [] if isinstance(ref, dict) and ref.get('key')]
+    
+    def _normalize_work_data(self, work_data: Dict, original_isbn: str, deadline: Optional[float] = None) -> Dict:
         """Normalize Open Library work data to our format."""
         # Extract ISBNs
         isbn_13 = None
@@ -170,18 +332,8 @@ class OpenLibraryClient:
             elif len(original_isbn) == 10:
                 isbn_10 = original_isbn
         
-        # Extract authors
-        authors = []
-        if 'authors' in work_data:
-            for author_ref in work_data['authors']:
-                try:
-                    author_url = f"{self.BASE_URL}{author_ref['key']}.json"
-                    author_response = requests.get(author_url, timeout=5)
-                    if author_response.status_code == 200:
-                        author_data = author_response.json()
-                        authors.append(author_data.get('name', ''))
-                except:
-                    continue
+        # Extract authors (cached names, unknown keys fetched concurrently)
+        authors = author_names.names_for(self._author_keys(work_data), deadline)
         
         # Extract publication date
         published_date = None
@@ -199,6 +351,13 @@ class OpenLibraryClient:
         # Extract page count
         page_count = work_data.get('number_of_pages_median')
         
+        # Edition records list publishers as names; the data API wraps them in objects
+        publisher = None
+        if work_data.get('publishers'):
+            publisher = work_data['publishers'][0]
+            if isinstance(publisher, dict):
+                publisher = publisher.get('name')
+        
         # Extract cover image
         cover_url = None
         if 'covers' in work_data and work_data['covers']:
@@ -211,7 +370,7 @@ class OpenLibraryClient:
             'title': work_data.get('title', ''),
             'subtitle': None,  # Open Library doesn't have subtitle field
             'description': work_data.get('description', {}).get('value') if isinstance(work_data.get('description'), dict) else work_data.get('description'),
-            'publisher': work_data.get('publishers', [{}])[0].get('name') if work_data.get('publishers') else None,
+            'publisher': publisher,
             'publication_date': published_date,
             'page_count': page_count,
             'language': work_data.get('languages', [{}])[0].get('key', 'en').split('/')[-1] if work_data.get('languages') else 'en',
@@ -221,35 +380,238 @@ class OpenLibraryClient:
         }
 
 
+class OpenLibraryDumpClient(MetadataProviderClient):
+    """Local provider answering from an imported Open Library dump.
+    
+    Rows are loaded by the ``import_openlibrary_dump`` command. Lookups are
+    indexed reads with no network I/O, so they run on the calling thread and
+    bypass the metadata cache.
+    """
+    
+    PROVIDER = 'open_library_dump'
+    NAME = 'Open Library dump'
+    LOCAL = True
+    
+    def __init__(self):
+        self.enabled = getattr(settings, 'OPEN_LIBRARY_DUMP_ENABLED', True)
+    
+    def lookup_by_isbn(self, isbn: str) -> Optional[Dict]:
+        return self.lookup_many([isbn]).get(clean_isbn(isbn))
+    
+    def lookup_many(self, isbns: List[str]) -> Dict[str, Optional[Dict]]:
+        """Return results for the imported ISBNs, keyed by cleaned ISBN; others are omitted."""
+        if not self.enabled:
+            return {}
+        
+        keys = {clean_isbn(isbn): normalize_isbn(isbn) for isbn in isbns if normalize_isbn(isbn)}
+        if not keys:
+            return {}
+        try:
+            editions = {edition.isbn: edition for edition in OpenLibraryEdition.objects.filter(isbn__in=set(keys.values()))}
+            names = dict(OpenLibraryAuthor.objects.filter(
+                key__in={key for edition in editions.values() for key in edition.author_keys}
+            ).values_list('key', 'name')) if editions else {}
+        except DatabaseError as e:
+            logger.warning(f"Open Library dump lookup failed: {e}")
+            return {}
+        return {isbn: self._normalize_edition(editions[key], names) for isbn, key in keys.items() if key in editions}
+    
+    def _normalize_edition(self, edition: OpenLibraryEdition, names: Dict[str, str]) -> Dict:
+        """Normalize an imported edition row to our format."""
+        published_date = edition.publish_date or None
+        if published_date and len(published_date) == 4:  # Just year
+            published_date = f"{published_date}-01-01"
+        elif published_date and len(published_date) == 7:  # Year-Month
+            published_date = f"{published_date}-01"
+        
+        return {
+            'primary_isbn_13': edition.isbn,
+            'isbn_10': edition.isbn_10 or None,
+            'title': edition.title,
+            'subtitle': edition.subtitle or None,
+            'description': edition.description or None,
+            'publisher': edition.publisher or None,
+            'publication_date': published_date,
+            'page_count': edition.page_count,
+            'language': edition.language or 'en',
+            'cover_url': f"https://covers.openlibrary.org/b/id/{edition.cover_id}-L.jpg" if edition.cover_id else None,
+            'authors': [names[key] for key in edition.author_keys if key in names],
+            'source': 'open_library_dump'
+        }
+
+
+_lookup_executor = None
+_lookup_executor_lock = threading.Lock()
+
+
+def _get_lookup_executor() -> ThreadPoolExecutor:
+    global _lookup_executor
+    if _lookup_executor is None:
+        with _lookup_executor_lock:
+            if _lookup_executor is None:
+                _lookup_executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'METADATA_LOOKUP_WORKERS', 8),
+                    thread_name_prefix='metadata-lookup'
+                )
+    return _lookup_executor
+
+
 class BookMetadataClient:
     """Main client for book metadata enrichment."""
     
     def __init__(self):
+        self.dump_client = OpenLibraryDumpClient()
         self.google_client = GoogleBooksClient()
         self.open_library_client = OpenLibraryClient()
+        self.deadline = getattr(settings, 'METADATA_LOOKUP_DEADLINE_SECONDS', 12)
+    
+    @property
+    def providers(self) -> List:
+        """Enabled provider clients, most preferred first."""
+        return [
+            client for client in (self.dump_client, self.google_client, self.open_library_client) if client.enabled
+        ]
+    
+    @property
+    def remote_providers(self) -> List:
+        """Enabled providers that are queried over the network."""
+        return [client for client in self.providers if not client.LOCAL]
     
     def lookup_by_isbn(self, isbn: str) -> Optional[Dict]:
-        """Lookup book by ISBN with fallback logic."""
+        """Lookup book by ISBN, querying all providers concurrently and merging their fields.
+        
+        The local dump and cached answers are read first; the remaining
+        providers are fetched in parallel and whatever returns before the
+        deadline is merged, so latency is bounded by the slowest provider
+        rather than their sum.
+        """
         logger.info(f"Looking up book metadata for ISBN: {isbn}")
+        isbn = clean_isbn(isbn)
+        
+        results = {}
+        local = self.dump_client.lookup_by_isbn(isbn)
+        if local:
+            results[self.dump_client.PROVIDER] = local
+        # A complete answer from the local dump needs no network round trip
+        remote = [] if local and self._is_complete_result(local) else self.remote_providers
+        pending = []
+        for client in remote:
+            hit, cached = metadata_cache.get(client.PROVIDER, isbn)
+            if hit:
+                results[client.PROVIDER] = cached
+            else:
+                pending.append(client)
         
-        # Try Google Books first
-        if self.google_client.enabled:
-            result = self.google_client.lookup_by_isbn(isbn)
-            if result and self._is_complete_result(result):
-                logger.info(f"Found complete book data from Google Books for ISBN {isbn}")
-                return result
-            elif result:
-                logger.info(f"Found partial book data from Google Books for ISBN {isbn}")
-        
-        # Try Open Library as fallback
-        if self.open_library_client.enabled:
-            result = self.open_library_client.lookup_by_isbn(isbn)
-            if result:
-                logger.info(f"Found book data from Open Library for ISBN {isbn}")
-                return result
-        
-        logger.warning(f"No book data found for ISBN {isbn}")
-        return None
+        if pending:
+            author_names.warm()
+            executor = _get_lookup_executor()
+            # Provider requests share the deadline, so late fetches give up instead of holding pool threads
+            deadline = time.monotonic() + self.deadline
+            futures = {executor.submit(client.fetch, isbn, deadline): client for client in pending}
+            done, not_done = wait(futures, timeout=self.deadline)
+            for future in not_done:
+                # Fetches still queued behind other lookups never start
+                future.cancel()
+                logger.warning(f"{futures[future].PROVIDER} missed the {self.deadline}s deadline for ISBN {isbn}")
+            # Cache writes stay on this thread; provider threads only do network I/O
+            for future in done:
+                client = futures[future]
+                fetched = future.result()
+                if fetched is None:
+                    continue
+                raw, result = fetched
+                metadata_cache.store(client.PROVIDER, isbn, raw=raw, normalized=result)
+                results[client.PROVIDER] = result
+            author_names.flush()
+        
+        merged = self._merge_provider_results(results)
+        if merged:
+            logger.info(f"Found book data from {', '.join(merged['sources'])} for ISBN {isbn}")
+        else:
+            logger.warning(f"No book data found for ISBN {isbn}")
+        return merged
+    
+    def iter_lookups(self, isbns: List[str], workers: int = None) -> Iterator[Tuple[str, Optional[Dict]]]:
+        """Yield ``(isbn, metadata)`` for many ISBNs as each one completes.
+        
+        Answers completed by the local dump or the cache are yielded first. The remaining ISBNs are packed into
+        multi-ISBN provider requests (``BATCH_SIZE`` per request) that run on a
+        pool of at most ``workers`` threads; cache writes happen here, on the
+        consuming thread. ISBNs are yielded in their cleaned form.
+        """
+        isbns = list(dict.fromkeys(clean_isbn(isbn) for isbn in isbns if clean_isbn(isbn)))
+        results = {isbn: {} for isbn in isbns}
+        local = self.dump_client.lookup_many(isbns)
+        for isbn, result in local.items():
+            results[isbn][self.dump_client.PROVIDER] = result
+        remote_isbns = [isbn for isbn in isbns if not (local.get(isbn) and self._is_complete_result(local[isbn]))]
+        
+        jobs = []
+        outstanding = Counter()
+        for client in self.remote_providers:
+            cached = metadata_cache.get_many(client.PROVIDER, remote_isbns)
+            for isbn, result in cached.items():
+                results[isbn][client.PROVIDER] = result
+            missing = [isbn for isbn in remote_isbns if isbn not in cached]
+            outstanding.update(missing)
+            jobs.extend(
+                (client, missing[i:i + client.BATCH_SIZE]) for i in range(0, len(missing), client.BATCH_SIZE)
+            )
+        
+        for isbn in isbns:
+            if not outstanding[isbn]:
+                yield isbn, self._merge_provider_results(results[isbn])
+        if not jobs:
+            return
+        
+        author_names.warm()
+        workers = workers or getattr(settings, 'METADATA_LOOKUP_WORKERS', 8)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bulk-lookup') as executor:
+            futures = {executor.submit(client.fetch_batch, chunk): (client, chunk) for client, chunk in jobs}
+            for future in as_completed(futures):
+                client, chunk = futures[future]
+                fetched = future.result() or {}
+                for isbn in chunk:
+                    if isbn in fetched:
+                        raw, result = fetched[isbn]
+                        metadata_cache.store(client.PROVIDER, isbn, raw=raw, normalized=result)
+                        results[isbn][client.PROVIDER] = result
+                    outstanding[isbn] -= 1
+                    if not outstanding[isbn]:
+                        yield isbn, self._merge_provider_results(results[isbn])
+        author_names.flush()
+    
+    def lookup_many(self, isbns: List[str], workers: int = None) -> Dict[str, Optional[Dict]]:
+        """Lookup many ISBNs with batched provider requests, keyed by cleaned ISBN."""
+        return dict(self.iter_lookups(isbns, workers=workers))
+    
+    def _merge_provider_results(self, results: Dict[str, Optional[Dict]]) -> Optional[Dict]:
+        ordered = [results.get(client.PROVIDER) for client in self.providers]
+        return self._merge_results([result for result in ordered if result])
+    
+    def _merge_results(self, results: List[Dict]) -> Optional[Dict]:
+        """Merge provider results field by field.
+        
+        The first complete result (in provider preference order) is the base
+        and keeps its ``source``; empty fields are filled from the others.
+        """
+        if not results:
+            return None
+        primary = next((result for result in results if self._is_complete_result(result)), results[0])
+        merged = primary.copy()
+        sources = [primary.get('source')]
+        for result in results:
+            if result is primary:
+                continue
+            filled = False
+            for key, value in result.items():
+                if key != 'source' and value and not merged.get(key):
+                    merged[key] = value
+                    filled = True
+            if filled:
+                sources.append(result.get('source'))
+        merged['sources'] = sources
+        return merged
     
     def _is_complete_result(self, result: Dict) -> bool:
         """Check if the result has essential fields."""
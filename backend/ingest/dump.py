@@ -0,0 +1,179 @@
+import gzip
+import json
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+from django.db import connection, transaction
+from books.isbn import normalize_isbn
+from .models import OpenLibraryAuthor, OpenLibraryEdition
+
+EDITION_UPDATE_FIELDS = [
+    'edition_key', 'isbn_10', 'title', 'subtitle', 'description', 'publisher',
+    'publish_date', 'page_count', 'language', 'cover_id', 'author_keys', 'imported_at',
+]
+
+
+def iter_dump_records(path: str) -> Iterator[Optional[Dict]]:
+    """Stream records from an Open Library dump, one line at a time.
+
+    Accepts gzipped or plain files, either JSON Lines or the official
+    tab-separated layout whose last column is the JSON record. Lines that
+    cannot be parsed yield None so callers can count them.
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as dump:
+        for line in dump:
+            line = line.strip()
+            if not line:
+                continue
+            if not line.startswith('{'):
+                line = line.rsplit('\t', 1)[-1]
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield None
+                continue
+            yield record if isinstance(record, dict) else None
+
+
+def _record_type(record: Dict) -> str:
+    record_type = record.get('type')
+    if isinstance(record_type, dict):
+        record_type = record_type.get('key')
+    return (record_type or '').rsplit('/', 1)[-1]
+
+
+def _conflict_target(unique_fields: List[str]) -> Dict:
+    """Upsert arguments naming the conflicting columns, where the backend accepts them.
+
+    MySQL's ``ON DUPLICATE KEY UPDATE`` fires on any unique key and Django
+    rejects ``unique_fields`` there, so the target is left implicit.
+    """
+    if connection.features.supports_update_conflicts_with_target:
+        return {'unique_fields': unique_fields}
+    return {}
+
+
+def _text(value, max_length: int = None) -> str:
+    if isinstance(value, dict):
+        value = value.get('value')
+    if not isinstance(value, str):
+        return ''
+    value = value.strip()
+    return value[:max_length] if max_length else value
+
+
+def edition_rows(record: Dict) -> List[OpenLibraryEdition]:
+    """Rows for an edition record, one per distinct canonical ISBN it lists."""
+    title = _text(record.get('title'), 500)
+    if not title:
+        return []
+    canonical = {}
+    for isbn in (record.get('isbn_13') or []) + (record.get('isbn_10') or []):
+        if isinstance(isbn, str) and normalize_isbn(isbn):
+            canonical.setdefault(normalize_isbn(isbn), '')
+    if not canonical:
+        return []
+    for isbn in record.get('isbn_10') or []:
+        if isinstance(isbn, str) and normalize_isbn(isbn) in canonical:
+            canonical[normalize_isbn(isbn)] = canonical[normalize_isbn(isbn)] or isbn.replace('-', '').strip()[:10]
+
+    publishers = record.get('publishers') or []
+    languages = record.get('languages') or []
+    covers = [cover for cover in record.get('covers') or [] if isinstance(cover, int) and cover > 0]
+    page_count = record.get('number_of_pages')
+    language = (languages[0].get('key') or '') if languages and isinstance(languages[0], dict) else ''
+    fields = {
+        'edition_key': _text(record.get('key'), 64),
+        'title': title,
+        'subtitle': _text(record.get('subtitle'), 500),
+        'description': _text(record.get('description')),
+        'publisher': _text(publishers[0], 255) if publishers else '',
+        'publish_date': _text(record.get('publish_date'), 50),
+        'page_count': page_count if isinstance(page_count, int) and page_count > 0 else None,
+        'language': language.rsplit('/', 1)[-1][:10],
+        'cover_id': covers[0] if covers else None,
+        'author_keys': [ref['key'] for ref in record.get('authors') or [] if isinstance(ref, dict) and ref.get('key')],
+    }
+    return [OpenLibraryEdition(isbn=isbn, isbn_10=isbn_10, **fields) for isbn, isbn_10 in canonical.items()]
+
+
+class DumpImporter:
+    """Load an Open Library editions and/or authors dump into the local lookup tables.
+
+    Records are streamed and written in batches of ``batch_size`` with
+    upserting bulk inserts, so memory stays bounded by one batch whatever the
+    size of the dump, and re-importing a newer dump updates rows in place.
+    """
+
+    def __init__(self, batch_size: int = 2000):
+        self.batch_size = batch_size
+        self.counts = {'records': 0, 'editions': 0, 'authors': 0, 'skipped': 0}
+        self._editions: Dict[str, OpenLibraryEdition] = {}
+        self._authors: Dict[str, OpenLibraryAuthor] = {}
+
+    def run(self, path: str, progress: Callable[[Dict], None] = None, progress_every: int = 100000) -> Dict:
+        started = time.monotonic()
+        for record in iter_dump_records(path):
+            self.counts['records'] += 1
+            self._add(record)
+            if len(self._editions) >= self.batch_size:
+                self._flush_editions()
+            if len(self._authors) >= self.batch_size:
+                self._flush_authors()
+            if progress and self.counts['records'] % progress_every == 0:
+                progress(self._stats(started))
+        self._flush_editions()
+        self._flush_authors()
+        return self._stats(started)
+
+    def _stats(self, started: float) -> Dict:
+        elapsed = time.monotonic() - started
+        return {
+            **self.counts,
+            'elapsed': round(elapsed, 2),
+            'rows_per_second': round(self.counts['records'] / elapsed) if elapsed > 0 else 0,
+        }
+
+    def _add(self, record: Optional[Dict]):
+        record_type = _record_type(record) if record else ''
+        if record_type == 'edition':
+            rows = edition_rows(record)
+            for row in rows:
+                self._editions[row.isbn] = row
+            if rows:
+                return
+        elif record_type == 'author':
+            key, name = _text(record.get('key'), 64), _text(record.get('name'), 255)
+            if key and name:
+                self._authors[key] = OpenLibraryAuthor(key=key, name=name, imported=True)
+                return
+        self.counts['skipped'] += 1
+
+    def _flush_editions(self):
+        if not self._editions:
+            return
+        with transaction.atomic():
+            OpenLibraryEdition.objects.bulk_create(
+                self._editions.values(),
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                **_conflict_target(['isbn']),
+                update_fields=EDITION_UPDATE_FIELDS
+            )
+        self.counts['editions'] += len(self._editions)
+        self._editions = {}
+
+    def _flush_authors(self):
+        if not self._authors:
+            return
+        # Names fetched on demand keep their flag so they stay in the warm cache
+        with transaction.atomic():
+            OpenLibraryAuthor.objects.bulk_create(
+                self._authors.values(),
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                **_conflict_target(['key']),
+                update_fields=['name', 'fetched_at']
+            )
+        self.counts['authors'] += len(self._authors)
+        self._authors = {}
@@ -0,0 +1,202 @@
+"""
+Per-provider circuit breakers and token-bucket rate limiters.
+
+State lives in the Django cache (Redis, see ``CACHES``) so every worker
+process shares one breaker and one bucket per provider. When the cache
+backend is not shared between processes (the dummy and local-memory
+backends) or raises, the guard falls back to an in-process store with the
+same semantics, and ``/health/providers`` reports ``shared: False``.
+
+A breaker opens after ``PROVIDER_BREAKER_FAILURE_THRESHOLD`` consecutive
+failures and rejects requests immediately for
+``PROVIDER_BREAKER_COOLDOWN_SECONDS``. It then lets a single probe through
+(half-open): success closes it, failure reopens it.
+"""
+import logging
+import threading
+import time
+from typing import Dict, Optional
+import requests
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class ProviderUnavailable(requests.RequestException):
+    """Raised instead of sending a request the provider's guard rejected."""
+
+    def __init__(self, provider: str, reason: str):
+        super().__init__(f"{provider} request rejected: {reason}")
+        self.provider = provider
+        self.reason = reason
+
+
+class ProviderGuard:
+    """Circuit breaker and token bucket for one provider."""
+
+    LOCK_ATTEMPTS = 50
+
+    def __init__(self, provider: str, local_store: LocMemCache):
+        self.provider = provider
+        self.rate = (getattr(settings, 'PROVIDER_RATE_LIMITS', {}) or {}).get(provider)
+        self.burst = max(getattr(settings, 'PROVIDER_RATE_BURST', 10), 1)
+        self.max_wait = getattr(settings, 'PROVIDER_RATE_MAX_WAIT_SECONDS', 2.0)
+        self.failure_threshold = getattr(settings, 'PROVIDER_BREAKER_FAILURE_THRESHOLD', 5)
+        self.cooldown = getattr(settings, 'PROVIDER_BREAKER_COOLDOWN_SECONDS', 30)
+        self._local = local_store
+
+    def _key(self, name: str) -> str:
+        return f'provider-guard:{self.provider}:{name}'
+
+    def _run(self, operation, *args):
+        """Run an operation against the shared cache, or the local store if it is unusable."""
+        shared = caches['default']
+        # A dummy or per-process cache shares nothing between workers, so it gains nothing over local state
+        if not isinstance(shared, (DummyCache, LocMemCache)):
+            try:
+                return operation(shared, *args)
+            except Exception as e:
+                logger.warning(f"Provider guard cache unavailable, using local state for {self.provider}: {e}")
+        return operation(self._local, *args)
+
+    # Circuit breaker
+
+    def check(self):
+        """Raise ``ProviderUnavailable`` if the breaker is open or another probe is in flight."""
+        if not self._run(self._allow):
+            self._run(self._count_reject, 'circuit_open')
+            raise ProviderUnavailable(self.provider, 'circuit open')
+
+    def _allow(self, store) -> bool:
+        if store.get(self._key('open')):
+            return False
+        if (store.get(self._key('failures')) or 0) < self.failure_threshold:
+            return True
+        # Cooldown over: exactly one caller gets to probe
+        return store.add(self._key('probe'), 1, timeout=self.cooldown)
+
+    def record_success(self):
+        self._run(lambda store: store.delete_many([self._key('failures'), self._key('probe')]))
+
+    def record_failure(self):
+        self._run(self._record_failure)
+
+    def _record_failure(self, store):
+        store.add(self._key('failures'), 0, timeout=None)
+        failures = store.incr(self._key('failures'))
+        if failures >= self.failure_threshold:
+            if failures == self.failure_threshold:
+                logger.warning(f"Opening {self.provider} circuit for {self.cooldown}s after {failures} failures")
+            store.set(self._key('open'), time.time() + self.cooldown, timeout=self.cooldown)
+            store.delete(self._key('probe'))
+
+    def _count_reject(self, store, reason: str):
+        store.add(self._key(f'rejected:{reason}'), 0, timeout=None)
+        store.incr(self._key(f'rejected:{reason}'))
+
+    # Token bucket
+
+    def acquire(self, deadline: Optional[float] = None):
+        """Take a token, waiting up to ``max_wait`` for one; raise ``ProviderUnavailable`` otherwise.
+
+        The wait is also cut short at ``deadline``, a ``time.monotonic()`` value.
+        """
+        if not self.rate:
+            return
+        max_wait = self.max_wait
+        if deadline is not None:
+            max_wait = min(max_wait, deadline - time.monotonic())
+        waited = 0.0
+        while True:
+            wait = self._run(self._take_token)
+            if wait <= 0:
+                return
+            if waited + wait > max_wait:
+                self._run(self._count_reject, 'rate_limited')
+                raise ProviderUnavailable(self.provider, 'rate limit exceeded')
+            time.sleep(wait)
+            waited += wait
+
+    def _take_token(self, store) -> float:
+        """Take a token if one is available; return 0, or the seconds until one will be."""
+        lock_key = self._key('bucket-lock')
+        for _ in range(self.LOCK_ATTEMPTS):
+            if store.add(lock_key, 1, timeout=1):
+                break
+            time.sleep(0.001)
+        else:
+            return 0.01
+        try:
+            now = time.time()
+            tokens, updated = store.get(self._key('bucket')) or (self.burst, now)
+            tokens = min(self.burst, tokens + max(now - updated, 0) * self.rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+            store.set(self._key('bucket'), (tokens - 1 if tokens >= 1 else tokens, now), timeout=3600)
+            return wait
+        finally:
+            store.delete(lock_key)
+
+    # Metrics
+
+    def metrics(self) -> Dict:
+        return self._run(self._metrics)
+
+    def _metrics(self, store) -> Dict:
+        failures = store.get(self._key('failures')) or 0
+        opened_until = store.get(self._key('open'))
+        if opened_until:
+            state = OPEN
+        elif failures >= self.failure_threshold:
+            state = HALF_OPEN
+        else:
+            state = CLOSED
+        return {
+            'state': state,
+            'consecutive_failures': failures,
+            'retry_in': round(max(opened_until - time.time(), 0), 1) if opened_until else None,
+            'rejected': {
+                reason: store.get(self._key(f'rejected:{reason}')) or 0
+                for reason in ('circuit_open', 'rate_limited')
+            },
+            'rate_limit': self.rate,
+            'burst': self.burst,
+            'shared': store is not self._local,
+        }
+
+
+class ProviderGuards:
+    """Registry of guards, one per provider name."""
+
+    PROVIDERS = ['google_books', 'open_library']
+
+    def __init__(self):
+        self._guards: Dict[str, ProviderGuard] = {}
+        self._lock = threading.Lock()
+        self._local = LocMemCache('provider-guards', {'TIMEOUT': None, 'OPTIONS': {'MAX_ENTRIES': 10000}})
+
+    def get(self, provider: str) -> ProviderGuard:
+        guard = self._guards.get(provider)
+        if guard is None:
+            with self._lock:
+                guard = self._guards.setdefault(provider, ProviderGuard(provider, self._local))
+        return guard
+
+    def metrics(self) -> Dict[str, Dict]:
+        return {provider: self.get(provider).metrics() for provider in dict.fromkeys(self.PROVIDERS + list(self._guards))}
+
+    def reset(self):
+        """Forget guards and local state so settings are re-read."""
+        with self._lock:
+            self._guards = {}
+            self._local.clear()
+
+
+# Global instance
+provider_guards = ProviderGuards()
@@ -0,0 +1,164 @@
+"""
+Shared HTTP session for outbound metadata requests.
+
+All calls to Google Books, Open Library and cover services go through one
+pooled ``requests.Session`` so connections are kept alive between requests
+instead of paying a TCP and TLS handshake each time. Transient failures
+(connection errors, timeouts, 429 and 5xx responses) are retried with
+exponential backoff and full jitter, and a per-host semaphore bounds how many
+requests run against one host at once. Requests made on behalf of a
+metadata provider also pass through that provider's circuit breaker and rate
+limiter (see ``ingest.guards``). Each call has an overall time budget:
+attempt timeouts are cut to the time left and no retry starts once its
+backoff would run past it, so synchronous callers are bounded.
+"""
+import logging
+import random
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from .guards import ProviderUnavailable, provider_guards
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HttpClient:
+    """Pooled session with bounded retries and per-host concurrency limits."""
+
+    def __init__(self):
+        self.pool_size = getattr(settings, 'HTTP_POOL_MAXSIZE', 10)
+        self.max_per_host = getattr(settings, 'HTTP_MAX_PER_HOST', 4)
+        self.max_retries = getattr(settings, 'HTTP_MAX_RETRIES', 3)
+        self.backoff_base = getattr(settings, 'HTTP_BACKOFF_BASE', 0.5)
+        self.backoff_max = getattr(settings, 'HTTP_BACKOFF_MAX', 8.0)
+        self.timeout = getattr(settings, 'HTTP_TIMEOUT', 10)
+        self.budget = getattr(settings, 'HTTP_REQUEST_BUDGET', 20.0)
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._host_limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = self._build_session()
+        return self._session
+
+    def _build_session(self) -> requests.Session:
+        session = requests.Session()
+        # Retries are handled here so backoff can be jittered and slots released while waiting
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers['User-Agent'] = 'Preposition/1.0 (book metadata)'
+        return session
+
+    def mount(self, prefix: str, adapter):
+        """Route requests for a URL prefix through a custom transport adapter."""
+        self.session.mount(prefix, adapter)
+
+    def _host_limit(self, host: str) -> threading.BoundedSemaphore:
+        limit = self._host_limits.get(host)
+        if limit is None:
+            with self._host_lock:
+                limit = self._host_limits.setdefault(host, threading.BoundedSemaphore(self.max_per_host))
+        return limit
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        """Full-jitter exponential backoff, honouring a numeric Retry-After header."""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(float(retry_after), self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def request(self, method: str, url: str, provider: Optional[str] = None,
+                deadline: Optional[float] = None, **kwargs) -> requests.Response:
+        """Send a request, retrying transient failures.
+
+        Returns the last response once retries are exhausted, so callers keep
+        using ``raise_for_status``; re-raises the last connection error. With
+        a ``provider``, the call first checks that provider's breaker and each
+        attempt takes a rate-limit token, raising ``ProviderUnavailable`` (a
+        ``RequestException``) without sending when either refuses. The
+        breaker counts the call's outcome once, however many attempts it took.
+
+        ``deadline`` is a ``time.monotonic()`` value the whole call, retries
+        and rate-limit waits included, must finish by; it defaults to
+        ``HTTP_REQUEST_BUDGET`` seconds from now. Running out of time ends the
+        call the same way as running out of retries, or raises
+        ``requests.Timeout`` if there is no time left for a first attempt.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.budget
+        guard = provider_guards.get(provider) if provider else None
+        if guard is None:
+            return self._send(method, url, None, deadline, **kwargs)
+
+        guard.check()
+        try:
+            response = self._send(method, url, guard, deadline, **kwargs)
+        except ProviderUnavailable:
+            raise
+        except requests.RequestException:
+            guard.record_failure()
+            raise
+        if response.status_code in RETRY_STATUSES:
+            guard.record_failure()
+        else:
+            guard.record_success()
+        return response
+
+    def _send(self, method: str, url: str, guard, deadline: float, **kwargs) -> requests.Response:
+        """Retry loop of ``request``, taking a rate-limit token from ``guard`` before each attempt."""
+        timeout = kwargs.pop('timeout', self.timeout)
+        limit = self._host_limit(urlsplit(url).netloc)
+
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise requests.Timeout(f"{method} {url} ran out of time")
+            if guard is not None:
+                guard.acquire(deadline)
+                remaining = deadline - time.monotonic()
+            try:
+                with limit:
+                    response = self.session.request(method, url, timeout=self._cap(timeout, remaining), **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                delay = self._backoff(attempt)
+                if attempt == self.max_retries or time.monotonic() + delay >= deadline:
+                    raise
+                logger.info(f"{method} {url} failed ({e}), retrying")
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    return response
+                delay = self._backoff(attempt, response)
+                if attempt == self.max_retries or time.monotonic() + delay >= deadline:
+                    return response
+                logger.info(f"{method} {url} returned {response.status_code}, retrying")
+                response.close()
+            time.sleep(delay)
+
+    @staticmethod
+    def _cap(timeout, remaining: float):
+        """Cut a request timeout (a number or a ``(connect, read)`` pair) to the time left."""
+        if timeout is None:
+            return remaining
+        if isinstance(timeout, tuple):
+            return tuple(remaining if part is None else min(part, remaining) for part in timeout)
+        return min(timeout, remaining)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+
+# Global instance
+http_client = HttpClient()
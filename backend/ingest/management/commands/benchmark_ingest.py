@@ -0,0 +1,137 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from books.isbn import normalize_isbn
+from ingest.authors import author_names
+from ingest.bulk import BulkIngest
+from ingest.clients import BookMetadataClient
+from ingest.guards import ProviderGuards, provider_guards
+from ingest.http_client import http_client
+from ingest.models import MetadataLookup
+from ingest.replay import ProviderCorpus, RecordingAdapter, ReplayAdapter, mount
+
+MODES = ['single', 'batched', 'bulk']
+
+
+class Command(BaseCommand):
+    help = 'Measure ISBN ingest throughput against recorded (or live, recording) provider responses'
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--replay', type=str, help='Corpus file to replay provider responses from')
+        source.add_argument('--record', type=str, help='Query live providers and save their responses to this corpus file')
+        parser.add_argument('--isbns-file', type=str, help='ISBNs to ingest, one per line (default: every ISBN in the corpus)')
+        parser.add_argument(
+            '--modes',
+            type=str,
+            default=','.join(MODES),
+            help=f"Comma-separated ingest paths to time: {', '.join(MODES)} (default: all)",
+        )
+        parser.add_argument('--workers', type=int, default=None, help='Worker threads for the batched and bulk paths')
+        parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every replayed response')
+        parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra seconds per replayed response')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of replayed requests that fail')
+        parser.add_argument('--error', choices=ReplayAdapter.ERRORS, default='status', help='How injected failures fail')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for jitter and error injection')
+        parser.add_argument('--warm-cache', action='store_true', help='Time each path with the metadata cache already filled')
+        parser.add_argument('--ignore-rate-limits', action='store_true', help='Disable the per-provider token buckets')
+
+    def handle(self, *args, **options):
+        modes = [mode.strip() for mode in options['modes'].split(',') if mode.strip()]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Unknown modes: {', '.join(sorted(unknown))}")
+
+        if options['replay']:
+            if not os.path.exists(options['replay']):
+                raise CommandError(f"File not found: {options['replay']}")
+            corpus = ProviderCorpus.load(options['replay'])
+            adapter = ReplayAdapter(
+                corpus,
+                latency=options['latency'],
+                jitter=options['jitter'],
+                error_rate=options['error_rate'],
+                error=options['error'],
+                seed=options['seed']
+            )
+        else:
+            if not options['isbns_file']:
+                raise CommandError('--record needs --isbns-file')
+            corpus = ProviderCorpus()
+            adapter = RecordingAdapter(corpus)
+
+        isbns = self._isbns(options['isbns_file'], corpus)
+        if not isbns:
+            raise CommandError('No ISBNs to ingest')
+
+        prefixes = mount(http_client, adapter)
+        try:
+            for mode in modes:
+                self._run(mode, isbns, adapter, options)
+        finally:
+            for prefix in prefixes:
+                http_client.session.adapters.pop(prefix, None)
+            provider_guards.reset()
+
+        if options['record']:
+            corpus.save(options['record'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Recorded {len(corpus.isbns)} ISBNs and {len(corpus.authors)} authors to {options['record']}"
+            ))
+
+    def _isbns(self, path, corpus):
+        if not path:
+            return corpus.isbns
+        if not os.path.exists(path):
+            raise CommandError(f'File not found: {path}')
+        with open(path, encoding='utf-8') as f:
+            return list(dict.fromkeys(line.strip() for line in f if line.strip()))
+
+    def _client(self, client=None):
+        """A metadata client using the network providers, whatever the local settings say."""
+        client = client or BookMetadataClient()
+        client.google_client.enabled = True
+        client.open_library_client.enabled = True
+        return client
+
+    def _run(self, mode, isbns, adapter, options):
+        provider_guards.reset()
+        if options['ignore_rate_limits']:
+            for provider in ProviderGuards.PROVIDERS:
+                provider_guards.get(provider).rate = None
+        author_names.clear()
+
+        # Each path starts from the same state; everything it writes is rolled back
+        with transaction.atomic():
+            MetadataLookup.objects.filter(isbn__in={normalize_isbn(isbn) or isbn for isbn in isbns}).delete()
+            if options['warm_cache']:
+                self._client().lookup_many(isbns, workers=options['workers'])
+            requests_before = sum(adapter.requests.values())
+
+            started = time.monotonic()
+            found = getattr(self, f'_run_{mode}')(isbns, options['workers'])
+            elapsed = time.monotonic() - started
+            transaction.set_rollback(True)
+        author_names.clear()
+
+        requests_made = sum(adapter.requests.values()) - requests_before
+        rate = len(isbns) / elapsed if elapsed > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"{mode}: {len(isbns)} ISBNs in {elapsed:.2f}s ({rate:.1f} ISBNs/s), "
+            f"{found} found, {requests_made} requests"
+        ))
+
+    def _run_single(self, isbns, workers):
+        client = self._client()
+        return sum(1 for isbn in isbns if client.lookup_by_isbn(isbn))
+
+    def _run_batched(self, isbns, workers):
+        return sum(1 for metadata in self._client().lookup_many(isbns, workers=workers).values() if metadata)
+
+    def _run_bulk(self, isbns, workers):
+        ingest = BulkIngest(workers=workers)
+        self._client(ingest.client)
+        for _ in ingest.run(isbns):
+            pass
+        return ingest.counts['created'] + ingest.counts['exists']
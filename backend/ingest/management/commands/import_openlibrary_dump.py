@@ -0,0 +1,53 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from ingest.dump import DumpImporter
+
+
+class Command(BaseCommand):
+    help = 'Import an Open Library editions/authors dump into the local ISBN lookup store'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='+',
+            type=str,
+            help='Dump files (.jsonl or Open Library .txt, optionally gzipped); authors first is fastest',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Rows written per bulk insert (default: 2000)',
+        )
+        parser.add_argument(
+            '--progress-every',
+            type=int,
+            default=100000,
+            help='Report throughput every N records (default: 100000)',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        for path in options['paths']:
+            if not os.path.exists(path):
+                raise CommandError(f'File not found: {path}')
+
+        for path in options['paths']:
+            self.stdout.write(f'Importing {path}...')
+            stats = DumpImporter(batch_size=options['batch_size']).run(
+                path,
+                progress=self._progress,
+                progress_every=max(options['progress_every'], 1)
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"Imported {stats['editions']} ISBNs and {stats['authors']} authors from "
+                f"{stats['records']} records in {stats['elapsed']}s "
+                f"({stats['rows_per_second']} rows/s, {stats['skipped']} skipped)"
+            ))
+
+    def _progress(self, stats):
+        self.stdout.write(
+            f"  {stats['records']} records, {stats['editions']} ISBNs, {stats['authors']} authors "
+            f"({stats['rows_per_second']} rows/s)"
+        )
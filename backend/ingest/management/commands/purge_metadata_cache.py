@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from ingest.cache import metadata_cache
+from ingest.models import MetadataLookup
+
+
+class Command(BaseCommand):
+    help = 'Delete expired ISBN metadata cache entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Delete every cache entry, not only expired ones',
+        )
+        parser.add_argument(
+            '--provider',
+            type=str,
+            choices=[choice for choice, _ in MetadataLookup.PROVIDER_CHOICES],
+            help='With --all, only clear this provider',
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            entries = MetadataLookup.objects.all()
+            if options['provider']:
+                entries = entries.filter(provider=options['provider'])
+            deleted, _ = entries.delete()
+        else:
+            deleted = metadata_cache.purge_expired()
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} metadata cache entries'))
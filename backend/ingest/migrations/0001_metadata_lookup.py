@@ -0,0 +1,52 @@
+# Generated by Django 5.0.2 on 2026-10-19 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="MetadataLookup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("isbn", models.CharField(max_length=13)),
+                (
+                    "provider",
+                    models.CharField(
+                        choices=[
+                            ("google_books", "Google Books"),
+                            ("open_library", "Open Library"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("found", models.BooleanField(default=True)),
+                ("raw", models.JSONField(blank=True, null=True)),
+                ("normalized", models.JSONField(blank=True, null=True)),
+                ("fetched_at", models.DateTimeField(auto_now=True)),
+                ("expires_at", models.DateTimeField()),
+            ],
+            options={
+                "ordering": ["-fetched_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["expires_at"], name="ingest_meta_expires_60244c_idx"
+                    )
+                ],
+                "unique_together": {("isbn", "provider")},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.2 on 2026-10-19 10:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ingest", "0001_metadata_lookup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OpenLibraryAuthor",
+            fields=[
+                (
+                    "key",
+                    models.CharField(max_length=64, primary_key=True, serialize=False),
+                ),
+                ("name", models.CharField(max_length=255)),
+                ("fetched_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["name"],
+            },
+        ),
+    ]
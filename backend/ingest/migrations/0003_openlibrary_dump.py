@@ -0,0 +1,42 @@
+# Generated by Django 5.0.2 on 2026-10-19 10:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ingest", "0002_openlibraryauthor"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OpenLibraryEdition",
+            fields=[
+                (
+                    "isbn",
+                    models.CharField(max_length=13, primary_key=True, serialize=False),
+                ),
+                ("edition_key", models.CharField(max_length=64)),
+                ("isbn_10", models.CharField(blank=True, max_length=10)),
+                ("title", models.CharField(max_length=500)),
+                ("subtitle", models.CharField(blank=True, max_length=500)),
+                ("description", models.TextField(blank=True)),
+                ("publisher", models.CharField(blank=True, max_length=255)),
+                ("publish_date", models.CharField(blank=True, max_length=50)),
+                ("page_count", models.PositiveIntegerField(blank=True, null=True)),
+                ("language", models.CharField(blank=True, max_length=10)),
+                ("cover_id", models.BigIntegerField(blank=True, null=True)),
+                ("author_keys", models.JSONField(blank=True, default=list)),
+                ("imported_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["isbn"],
+            },
+        ),
+        migrations.AddField(
+            model_name="openlibraryauthor",
+            name="imported",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,3 +1,66 @@
 from django.db import models
 
 # Create your models here.
+
+
+class MetadataLookup(models.Model):
+    """Cached response from a metadata provider for one ISBN."""
+    PROVIDER_CHOICES = [
+        ('google_books', 'Google Books'),
+        ('open_library', 'Open Library'),
+    ]
+
+    isbn = models.CharField(max_length=13)  # Canonical ISBN-13 where one exists
+    provider = models.CharField(max_length=20, choices=PROVIDER_CHOICES)
+    found = models.BooleanField(default=True)  # False caches a "not found" answer
+    raw = models.JSONField(null=True, blank=True)  # Provider response as received
+    normalized = models.JSONField(null=True, blank=True)  # Output of the client's normalizer
+    fetched_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-fetched_at']
+        unique_together = ['isbn', 'provider']
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.provider}:{self.isbn} ({'found' if self.found else 'not found'})"
+
+
+class OpenLibraryAuthor(models.Model):
+    """Name of an Open Library author, keyed by its ``/authors/OL...A`` key."""
+    key = models.CharField(max_length=64, primary_key=True)
+    name = models.CharField(max_length=255)
+    imported = models.BooleanField(default=False)  # Loaded from a dump rather than fetched on demand
+    fetched_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} ({self.key})"
+
+
+class OpenLibraryEdition(models.Model):
+    """Edition loaded from an Open Library dump, one row per canonical ISBN."""
+    isbn = models.CharField(max_length=13, primary_key=True)  # Canonical ISBN-13
+    edition_key = models.CharField(max_length=64)
+    isbn_10 = models.CharField(max_length=10, blank=True)
+    title = models.CharField(max_length=500)
+    subtitle = models.CharField(max_length=500, blank=True)
+    description = models.TextField(blank=True)
+    publisher = models.CharField(max_length=255, blank=True)
+    publish_date = models.CharField(max_length=50, blank=True)  # Free text, as in the dump
+    page_count = models.PositiveIntegerField(null=True, blank=True)
+    language = models.CharField(max_length=10, blank=True)
+    cover_id = models.BigIntegerField(null=True, blank=True)
+    author_keys = models.JSONField(default=list, blank=True)
+    imported_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['isbn']
+
+    def __str__(self):
+        return f"{self.title} ({self.isbn})"
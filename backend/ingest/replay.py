@@ -0,0 +1,230 @@
+"""
+Record/replay stand-in for the Google Books and Open Library APIs.
+
+A ``ProviderCorpus`` holds provider records per canonical ISBN plus Open
+Library author names. ``RecordingAdapter`` builds one from live traffic and
+``ReplayAdapter`` answers any request shape the clients make (single ISBN,
+OR-ed Google queries, Open Library ``bibkeys`` batches, author and cover
+lookups) from it, with optional latency and error injection. Mount either on
+the shared ``http_client`` to run ingest paths without touching live APIs.
+"""
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from books.isbn import normalize_isbn
+
+PROVIDER_PREFIXES = [
+    'https://www.googleapis.com/',
+    'https://openlibrary.org/',
+    'https://covers.openlibrary.org/',
+]
+
+ISBN_TERM = re.compile(r'isbn:([0-9Xx-]+)')
+PHRASE_TERM = re.compile(r'"([^"]+)"')
+
+
+class ProviderCorpus:
+    """Provider records keyed by canonical ISBN, saved as one JSON document."""
+
+    def __init__(self, google_books: Dict = None, open_library: Dict = None, authors: Dict = None):
+        self.google_books: Dict[str, Dict] = google_books or {}
+        self.open_library: Dict[str, Dict] = open_library or {}
+        self.authors: Dict[str, str] = authors or {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> 'ProviderCorpus':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data.get('google_books'), data.get('open_library'), data.get('authors'))
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'google_books': self.google_books,
+                'open_library': self.open_library,
+                'authors': self.authors,
+            }, f, indent=1, sort_keys=True)
+
+    @property
+    def isbns(self) -> List[str]:
+        return sorted(set(self.google_books) | set(self.open_library))
+
+    def learn(self, url: str, body):
+        """Add the records found in a live response body."""
+        parts = urlsplit(url)
+        query = parse_qs(parts.query)
+        with self._lock:
+            if parts.path == '/books/v1/volumes':
+                for item in (body or {}).get('items') or []:
+                    for identifier in item.get('volumeInfo', {}).get('industryIdentifiers', []):
+                        canonical = normalize_isbn(identifier.get('identifier'))
+                        if canonical:
+                            self.google_books.setdefault(canonical, item)
+            elif parts.path.startswith('/isbn/'):
+                canonical = normalize_isbn(parts.path[len('/isbn/'):].split('.')[0])
+                if canonical and isinstance(body, dict):
+                    self.open_library.setdefault(canonical, body)
+            elif parts.path.startswith('/authors/') and isinstance(body, dict) and body.get('name'):
+                self.authors[parts.path[:-len('.json')]] = body['name']
+            elif parts.path == '/api/books' and query.get('jscmd') == ['details']:
+                for bibkey, entry in (body or {}).items():
+                    canonical = normalize_isbn(bibkey.split(':', 1)[-1])
+                    record = (entry or {}).get('details')
+                    if not canonical or not record:
+                        continue
+                    self.open_library[canonical] = record
+                    for ref in record.get('authors') or []:
+                        if isinstance(ref, dict) and ref.get('key') and ref.get('name'):
+                            self.authors[ref['key']] = ref['name']
+
+    def respond(self, url: str):
+        """Return ``(status, body)`` for a provider request."""
+        parts = urlsplit(url)
+        query = parse_qs(parts.query)
+        if parts.path == '/books/v1/volumes':
+            return 200, self._google_volumes(query.get('q', [''])[0])
+        if parts.path.startswith('/isbn/'):
+            record = self.open_library.get(normalize_isbn(parts.path[len('/isbn/'):].split('.')[0]))
+            if record is None:
+                return 404, {'error': 'notfound'}
+            # The edition endpoint lists author keys without names
+            authors = [{'key': ref['key']} for ref in record.get('authors') or [] if isinstance(ref, dict) and ref.get('key')]
+            return 200, {**record, 'authors': authors}
+        if parts.path.startswith('/authors/'):
+            name = self.authors.get(parts.path[:-len('.json')])
+            return (200, {'name': name}) if name else (404, {'error': 'notfound'})
+        if parts.path == '/api/books':
+            return 200, self._open_library_books(query.get('bibkeys', [''])[0].split(','), query.get('jscmd', [''])[0])
+        return 404, {}
+
+    def _google_volumes(self, q: str) -> Dict:
+        isbns = ISBN_TERM.findall(q)
+        if isbns:
+            items = [self.google_books[key] for key in dict.fromkeys(map(normalize_isbn, isbns)) if key in self.google_books]
+        else:
+            phrases = [phrase.lower() for phrase in PHRASE_TERM.findall(q)]
+            items = [
+                item for item in self.google_books.values()
+                if phrases and all(
+                    phrase in ' '.join([item.get('volumeInfo', {}).get('title', '')] + item.get('volumeInfo', {}).get('authors', [])).lower()
+                    for phrase in phrases
+                )
+            ]
+        return {'totalItems': len(items), 'items': items} if items else {'totalItems': 0}
+
+    def _open_library_books(self, bibkeys: List[str], jscmd: str) -> Dict:
+        data = {}
+        for bibkey in bibkeys:
+            record = self.open_library.get(normalize_isbn(bibkey.split(':', 1)[-1]))
+            if record is None:
+                continue
+            authors = [
+                {'key': ref['key'], 'name': ref.get('name') or self.authors.get(ref['key'])}
+                for ref in record.get('authors') or [] if isinstance(ref, dict) and ref.get('key')
+            ]
+            if jscmd == 'details':
+                data[bibkey] = {'details': {**record, 'authors': [{k: v for k, v in ref.items() if v} for ref in authors]}}
+            else:
+                cover_id = (record.get('covers') or [None])[0]
+                entry = {'title': record.get('title', ''), 'authors': [{'name': ref['name']} for ref in authors if ref['name']]}
+                if cover_id:
+                    entry['cover'] = {
+                        size: f"https://covers.openlibrary.org/b/id/{cover_id}-{suffix}.jpg"
+                        for size, suffix in (('small', 'S'), ('medium', 'M'), ('large', 'L'))
+                    }
+                data[bibkey] = entry
+        return data
+
+
+def _response(request, status_code: int, body) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response.url = request.url
+    response.request = request
+    response.headers['Content-Type'] = 'application/json'
+    response._content = json.dumps(body).encode()
+    return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """Transport adapter answering provider requests from a corpus.
+
+    ``latency`` plus up to ``jitter`` seconds is slept per request. With
+    probability ``error_rate`` a request fails instead: ``error`` is
+    ``'status'`` (respond with ``error_status``), ``'timeout'`` or
+    ``'connection'`` (raise the matching requests exception).
+    """
+
+    ERRORS = ['status', 'timeout', 'connection']
+
+    def __init__(self, corpus: ProviderCorpus, latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, error: str = 'status', error_status: int = 503, seed: Optional[int] = None):
+        super().__init__()
+        if error not in self.ERRORS:
+            raise ValueError(f"error must be one of {', '.join(self.ERRORS)}")
+        self.corpus = corpus
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error = error
+        self.error_status = error_status
+        self.requests = Counter()
+        self.injected = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.requests[urlsplit(request.url).netloc] += 1
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+            fail = self.error_rate > 0 and self._random.random() < self.error_rate
+            if fail:
+                self.injected += 1
+        if delay:
+            time.sleep(delay)
+        if fail:
+            if self.error == 'timeout':
+                raise requests.Timeout(f"Injected timeout for {request.url}", request=request)
+            if self.error == 'connection':
+                raise requests.ConnectionError(f"Injected connection error for {request.url}", request=request)
+            return _response(request, self.error_status, {'error': 'injected'})
+        return _response(request, *self.corpus.respond(request.url))
+
+    def close(self):
+        pass
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Live transport that adds every successful provider response to a corpus."""
+
+    def __init__(self, corpus: ProviderCorpus, **kwargs):
+        super().__init__(**kwargs)
+        self.corpus = corpus
+        self.requests = Counter()
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            self.requests[urlsplit(request.url).netloc] += 1
+        response = super().send(request, **kwargs)
+        if response.status_code == 200:
+            try:
+                self.corpus.learn(request.url, response.json())
+            except ValueError:
+                pass
+        return response
+
+
+def mount(http_client, adapter) -> List[str]:
+    """Route every provider host through ``adapter``; returns the prefixes to unmount."""
+    for prefix in PROVIDER_PREFIXES:
+        http_client.mount(prefix, adapter)
+    return list(PROVIDER_PREFIXES)
@@ -1,3 +1,669 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+import requests
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from requests.adapters import BaseAdapter
+from books.models import Author, Book
+from libraries.models import Library, LibraryBook
+from .authors import author_names
+from .cache import metadata_cache
+from .clients import BookMetadataClient, GoogleBooksClient, OpenLibraryClient
+from .dump import _conflict_target
+from .guards import ProviderUnavailable, provider_guards
+from .http_client import HttpClient, http_client
+from .models import MetadataLookup, OpenLibraryAuthor, OpenLibraryEdition
+from .replay import ProviderCorpus, ReplayAdapter
 
-# Create your tests here.
+
+class ScriptedAdapter(BaseAdapter):
+    """Transport adapter that answers from a list of status codes, ``(status, body)`` pairs or exceptions."""
+
+    def __init__(self, script, delay=0):
+        super().__init__()
+        self.script = list(script)
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            step = self.script[min(self.calls, len(self.script) - 1)]
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            time.sleep(self.delay)
+            if isinstance(step, Exception):
+                raise step
+            status_code, body = step if isinstance(step, tuple) else (step, {})
+            response = requests.Response()
+            response.status_code = status_code
+            response.url = request.url
+            response.request = request
+            response._content = json.dumps(body).encode()
+            return response
+        finally:
+            with self._lock:
+                self.active -= 1
+
+    def close(self):
+        pass
+
+
+class RoutedAdapter(BaseAdapter):
+    """Transport adapter that answers by URL path and counts requests per path.
+
+    A route is a ``(status, body)`` pair or a callable taking the query parameters.
+    """
+
+    def __init__(self, routes, delay=0):
+        super().__init__()
+        self.routes = routes
+        self.delay = delay
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        path = urlsplit(request.url).path
+        with self._lock:
+            self.calls[path] += 1
+        time.sleep(self.delay)
+        route = self.routes.get(path, (404, {}))
+        status_code, body = route(parse_qs(urlsplit(request.url).query)) if callable(route) else route
+        response = requests.Response()
+        response.status_code = status_code
+        response.url = request.url
+        response.request = request
+        response._content = json.dumps(body).encode()
+        return response
+
+    def close(self):
+        pass
+
+
+def open_library_books_api(records):
+    """Route answering /api/books?bibkeys=... from ``{isbn: edition record}``."""
+    def respond(query):
+        bibkeys = query['bibkeys'][0].split(',')
+        return 200, {key: {'details': records[key[5:]]} for key in bibkeys if key[5:] in records}
+    return respond
+
+
+@override_settings(HTTP_BACKOFF_BASE=0.001, HTTP_BACKOFF_MAX=0.01, HTTP_MAX_RETRIES=2, HTTP_MAX_PER_HOST=2)
+class HttpClientTest(TestCase):
+    def _client(self, adapter):
+        client = HttpClient()
+        client.mount('https://books.example/', adapter)
+        return client
+
+    def test_retries_transient_failures(self):
+        """Test that 5xx responses and connection errors are retried"""
+        adapter = ScriptedAdapter([requests.ConnectionError('reset'), 503, 200])
+        response = self._client(adapter).get('https://books.example/isbn/1.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(adapter.calls, 3)
+
+    def test_gives_up_after_max_retries(self):
+        """Test that the last response is returned once retries are exhausted"""
+        adapter = ScriptedAdapter([502])
+        response = self._client(adapter).get('https://books.example/isbn/1.json')
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(adapter.calls, 3)
+
+        adapter = ScriptedAdapter([404])
+        self.assertEqual(self._client(adapter).get('https://books.example/isbn/1.json').status_code, 404)
+        self.assertEqual(adapter.calls, 1)
+
+    @override_settings(HTTP_BACKOFF_BASE=0.2, HTTP_BACKOFF_MAX=0.2)
+    def test_retries_stop_at_deadline(self):
+        """Test that no retry starts once its backoff would pass the call's deadline"""
+        adapter = ScriptedAdapter([503])
+        client = self._client(adapter)
+        with mock.patch('ingest.http_client.random.uniform', return_value=0.2):
+            started = time.monotonic()
+            response = client.get('https://books.example/isbn/1.json', deadline=time.monotonic() + 0.3)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(adapter.calls, 2)
+        self.assertLess(time.monotonic() - started, 0.3)
+
+        with self.assertRaises(requests.Timeout):
+            client.get('https://books.example/isbn/1.json', deadline=time.monotonic() - 1)
+
+    def test_limits_concurrency_per_host(self):
+        """Test that no more than HTTP_MAX_PER_HOST requests run against one host"""
+        adapter = ScriptedAdapter([200], delay=0.02)
+        client = self._client(adapter)
+        threads = [threading.Thread(target=client.get, args=('https://books.example/a',)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(adapter.calls, 6)
+        self.assertEqual(adapter.peak, 2)
+
+
+@override_settings(
+    GOOGLE_BOOKS_ENABLED=True, PROVIDER_BREAKER_FAILURE_THRESHOLD=2, PROVIDER_BREAKER_COOLDOWN_SECONDS=0.2
+)
+class ProviderGuardTest(TestCase):
+    def setUp(self):
+        provider_guards.reset()
+        self.addCleanup(provider_guards.reset)
+        # One attempt per request, so each failure is counted without backoff sleeps
+        self.addCleanup(setattr, http_client, 'max_retries', http_client.max_retries)
+        http_client.max_retries = 0
+
+    def _mount(self, adapter):
+        http_client.mount('https://www.googleapis.com/', adapter)
+        self.addCleanup(http_client.session.adapters.pop, 'https://www.googleapis.com/')
+
+    def test_open_circuit_skips_provider(self):
+        """Test that repeated failures open the breaker and a probe closes it again"""
+        adapter = ScriptedAdapter([503, 503, 200])
+        self._mount(adapter)
+        client = GoogleBooksClient()
+        self.assertIsNone(client.fetch('9781599869773'))
+        self.assertIsNone(client.fetch('9781599869773'))
+
+        started = time.monotonic()
+        self.assertIsNone(client.fetch('9781599869773'))
+        self.assertLess(time.monotonic() - started, 0.05)
+        self.assertEqual(adapter.calls, 2)
+
+        metrics = self.client.get(reverse('health-providers')).json()
+        self.assertEqual(metrics['status'], 'degraded')
+        self.assertEqual(metrics['providers']['google_books']['state'], 'open')
+        self.assertEqual(metrics['providers']['google_books']['rejected']['circuit_open'], 1)
+
+        # After the cooldown a single probe is let through; its success closes the breaker
+        time.sleep(0.25)
+        self.assertEqual(provider_guards.get('google_books').metrics()['state'], 'half_open')
+        client.fetch('9781599869773')
+        self.assertEqual(adapter.calls, 3)
+        self.assertEqual(provider_guards.get('google_books').metrics()['state'], 'closed')
+
+    @override_settings(PROVIDER_RATE_LIMITS={'google_books': 20}, PROVIDER_RATE_BURST=2, PROVIDER_RATE_MAX_WAIT_SECONDS=1)
+    def test_token_bucket_paces_requests(self):
+        """Test that requests beyond the burst wait for tokens, or are rejected past the wait limit"""
+        adapter = ScriptedAdapter([200])
+        self._mount(adapter)
+        started = time.monotonic()
+        for _ in range(4):
+            http_client.get('https://www.googleapis.com/books/v1/volumes', provider='google_books')
+        # Two requests from the burst, then two more at 20 per second
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+        with self.settings(PROVIDER_RATE_MAX_WAIT_SECONDS=0):
+            provider_guards.reset()
+            for _ in range(2):
+                http_client.get('https://www.googleapis.com/books/v1/volumes', provider='google_books')
+            with self.assertRaises(ProviderUnavailable):
+                http_client.get('https://www.googleapis.com/books/v1/volumes', provider='google_books')
+        self.assertEqual(adapter.calls, 6)
+        self.assertEqual(provider_guards.get('google_books').metrics()['rejected']['rate_limited'], 1)
+
+    def test_retried_request_counts_one_failure(self):
+        """Test that a request failing on every retry counts once toward the breaker"""
+        adapter = ScriptedAdapter([503])
+        self._mount(adapter)
+        with mock.patch.multiple(http_client, max_retries=3, backoff_base=0.001, backoff_max=0.001):
+            response = http_client.get('https://www.googleapis.com/books/v1/volumes', provider='google_books')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(adapter.calls, 4)
+        metrics = provider_guards.get('google_books').metrics()
+        self.assertEqual((metrics['state'], metrics['consecutive_failures']), ('closed', 1))
+
+    @override_settings(PROVIDER_RATE_LIMITS={'google_books': 1}, PROVIDER_RATE_BURST=1, PROVIDER_RATE_MAX_WAIT_SECONDS=5)
+    def test_rate_limit_wait_stops_at_deadline(self):
+        """Test that waiting for a token never runs past the request's deadline"""
+        self._mount(ScriptedAdapter([200]))
+        http_client.get('https://www.googleapis.com/books/v1/volumes', provider='google_books')
+        started = time.monotonic()
+        with self.assertRaises(ProviderUnavailable):
+            http_client.get(
+                'https://www.googleapis.com/books/v1/volumes', provider='google_books', deadline=started + 0.2
+            )
+        self.assertLess(time.monotonic() - started, 0.3)
+
+    def test_local_memory_cache_is_not_shared(self):
+        """Test that a per-process cache is reported as unshared state"""
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'guards'}}
+        with self.settings(CACHES=locmem):
+            self.assertFalse(provider_guards.get('google_books').metrics()['shared'])
+
+
+@override_settings(GOOGLE_BOOKS_ENABLED=True, OPEN_LIBRARY_ENABLED=True)
+class MetadataCacheTest(TestCase):
+    def setUp(self):
+        self.google = ScriptedAdapter([(200, {'totalItems': 0})])
+        self.open_library = ScriptedAdapter([(200, {'title': 'The Art of War', 'isbn_13': ['9781599869773']})])
+        for prefix, adapter in (('https://www.googleapis.com/', self.google), ('https://openlibrary.org/', self.open_library)):
+            http_client.mount(prefix, adapter)
+            self.addCleanup(http_client.session.adapters.pop, prefix)
+
+    def test_repeat_lookups_use_cache(self):
+        """Test that found and not-found answers are served from the cache"""
+        client = BookMetadataClient()
+        self.assertEqual(client.lookup_by_isbn('9781599869773')['title'], 'The Art of War')
+        self.assertEqual((self.google.calls, self.open_library.calls), (1, 1))
+
+        # The ISBN-10 form shares the cached rows
+        self.assertEqual(BookMetadataClient().lookup_by_isbn('1599869772')['title'], 'The Art of War')
+        self.assertEqual((self.google.calls, self.open_library.calls), (1, 1))
+
+        negative = MetadataLookup.objects.get(provider='google_books')
+        self.assertFalse(negative.found)
+        self.assertLess(negative.expires_at, MetadataLookup.objects.get(provider='open_library').expires_at)
+
+    def test_expired_entries_are_refetched(self):
+        """Test that entries past their TTL trigger a new request"""
+        client = BookMetadataClient()
+        client.lookup_by_isbn('9781599869773')
+        MetadataLookup.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        client.lookup_by_isbn('9781599869773')
+        self.assertEqual((self.google.calls, self.open_library.calls), (2, 2))
+        self.assertEqual(MetadataLookup.objects.count(), 2)
+
+    def test_batch_read_failure_is_a_miss(self):
+        """Test that a failing batch read is treated as a cache miss like single reads"""
+        metadata_cache.store('open_library', '9781599869773', normalized={'title': 'The Art of War'})
+        with mock.patch.object(MetadataLookup.objects, 'filter', side_effect=DatabaseError('gone')):
+            self.assertEqual(metadata_cache.get_many('open_library', ['9781599869773']), {})
+
+
+@override_settings(GOOGLE_BOOKS_ENABLED=True, OPEN_LIBRARY_ENABLED=True, METADATA_LOOKUP_DEADLINE_SECONDS=1)
+class ProviderFanOutTest(TestCase):
+    def _mount(self, google, open_library):
+        for prefix, adapter in (('https://www.googleapis.com/', google), ('https://openlibrary.org/', open_library)):
+            http_client.mount(prefix, adapter)
+            self.addCleanup(http_client.session.adapters.pop, prefix)
+
+    def test_providers_are_queried_concurrently_and_merged(self):
+        """Test that lookup latency tracks the slowest provider and fields are merged"""
+        volume = {'volumeInfo': {'title': 'The Art of War', 'authors': ['Sun Tzu']}}
+        self._mount(
+            ScriptedAdapter([(200, {'totalItems': 1, 'items': [volume]})], delay=0.2),
+            ScriptedAdapter([(200, {'title': 'Art of War', 'description': 'A classic treatise'})], delay=0.2),
+        )
+        started = time.monotonic()
+        result = BookMetadataClient().lookup_by_isbn('9781599869773')
+        self.assertLess(time.monotonic() - started, 0.35)
+
+        self.assertEqual(result['title'], 'The Art of War')
+        self.assertEqual(result['description'], 'A classic treatise')
+        self.assertEqual(result['source'], 'google_books')
+        self.assertEqual(result['sources'], ['google_books', 'open_library'])
+
+    def test_slow_provider_is_dropped_at_deadline(self):
+        """Test that a provider missing the deadline does not hold up the lookup"""
+        volume = {'volumeInfo': {'title': 'The Art of War', 'authors': ['Sun Tzu']}}
+        self._mount(
+            ScriptedAdapter([(200, {'totalItems': 1, 'items': [volume]})]),
+            ScriptedAdapter([(200, {'title': 'Art of War'})], delay=0.6),
+        )
+        started = time.monotonic()
+        with self.settings(METADATA_LOOKUP_DEADLINE_SECONDS=0.2):
+            result = BookMetadataClient().lookup_by_isbn('9781599869773')
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(result['sources'], ['google_books'])
+        self.assertFalse(MetadataLookup.objects.filter(provider='open_library').exists())
+
+    def test_abandoned_provider_stops_retrying_at_deadline(self):
+        """Test that a provider dropped at the deadline makes no further requests"""
+        volume = {'volumeInfo': {'title': 'The Art of War', 'authors': ['Sun Tzu']}}
+        open_library = ScriptedAdapter([503])
+        self._mount(ScriptedAdapter([(200, {'totalItems': 1, 'items': [volume]})]), open_library)
+        # Guards are rebuilt so the raised breaker threshold applies, and again afterwards
+        provider_guards.reset()
+        self.addCleanup(provider_guards.reset)
+        with mock.patch.multiple(http_client, max_retries=50, backoff_base=0.05, backoff_max=0.05):
+            with self.settings(METADATA_LOOKUP_DEADLINE_SECONDS=0.2, PROVIDER_BREAKER_FAILURE_THRESHOLD=100):
+                result = BookMetadataClient().lookup_by_isbn('9781599869773')
+            calls = open_library.calls
+            time.sleep(0.3)
+        self.assertEqual(result['sources'], ['google_books'])
+        self.assertLessEqual(open_library.calls, calls + 1)
+
+
+@override_settings(GOOGLE_BOOKS_ENABLED=True)
+class GoogleBooksBatchTest(TestCase):
+    def test_or_query_is_demultiplexed(self):
+        """Test that one OR-ed query answers several ISBNs, matched by identifier"""
+        volumes = [
+            {'volumeInfo': {'title': 'Meditations', 'industryIdentifiers': [{'type': 'ISBN_10', 'identifier': '0140449337'}]}},
+            {'volumeInfo': {'title': 'The Art of War', 'industryIdentifiers': [{'type': 'ISBN_13', 'identifier': '9781599869773'}]}},
+        ]
+        queries = []
+
+        def respond(query):
+            queries.append(query['q'][0])
+            return 200, {'totalItems': len(volumes), 'items': volumes}
+
+        adapter = RoutedAdapter({'/books/v1/volumes': respond})
+        http_client.mount('https://www.googleapis.com/', adapter)
+        self.addCleanup(http_client.session.adapters.pop, 'https://www.googleapis.com/')
+
+        client = GoogleBooksClient()
+        results = client.lookup_many(['1599869772', '9780140449334', '9780000000002'])
+        self.assertEqual(queries, ['isbn:1599869772 OR isbn:9780140449334 OR isbn:9780000000002'])
+        self.assertEqual(results['1599869772']['title'], 'The Art of War')
+        self.assertEqual(results['9780140449334']['title'], 'Meditations')
+        self.assertIsNone(results['9780000000002'])
+
+        # Answers are cached individually
+        self.assertEqual(client.lookup_by_isbn('9780140449334')['title'], 'Meditations')
+        self.assertEqual(len(queries), 1)
+
+
+@override_settings(OPEN_LIBRARY_ENABLED=True)
+class AuthorResolutionTest(TestCase):
+    def setUp(self):
+        author_names.clear()
+        self.addCleanup(author_names.clear)
+        authors = [{'key': f'/authors/OL{i}A'} for i in range(1, 4)]
+        self.adapter = RoutedAdapter({
+            '/isbn/9781599869773.json': (200, {'title': 'The Art of War', 'authors': authors}),
+            '/isbn/9780140449334.json': (200, {'title': 'Meditations', 'authors': authors[:1]}),
+            '/authors/OL1A.json': (200, {'name': 'Sun Tzu'}),
+            '/authors/OL2A.json': (200, {'name': 'Lionel Giles'}),
+            '/authors/OL3A.json': (200, {'name': 'Thomas Cleary'}),
+        }, delay=0.1)
+        http_client.mount('https://openlibrary.org/', self.adapter)
+        self.addCleanup(http_client.session.adapters.pop, 'https://openlibrary.org/')
+
+    def test_authors_resolved_concurrently_and_cached(self):
+        """Test that author keys are fetched in parallel and each only once"""
+        started = time.monotonic()
+        result = OpenLibraryClient().lookup_by_isbn('9781599869773')
+        # One edition request plus one round of parallel author requests
+        self.assertLess(time.monotonic() - started, 0.35)
+        self.assertEqual(result['authors'], ['Sun Tzu', 'Lionel Giles', 'Thomas Cleary'])
+        self.assertEqual(OpenLibraryAuthor.objects.count(), 3)
+
+        OpenLibraryClient().lookup_by_isbn('9780140449334')
+        self.assertEqual(self.adapter.calls['/authors/OL1A.json'], 1)
+
+        # A fresh process loads names from the database instead of the network
+        author_names.clear()
+        MetadataLookup.objects.all().delete()
+        OpenLibraryClient().lookup_by_isbn('9780140449334')
+        self.assertEqual(self.adapter.calls['/authors/OL1A.json'], 1)
+
+    def test_lookup_many_batches_isbns_and_authors(self):
+        """Test that the bulk path packs ISBNs into one request and fetches only unnamed authors"""
+        self.adapter.routes['/api/books'] = open_library_books_api({
+            '9781599869773': {
+                'title': 'The Art of War',
+                'publishers': ['Filiquarian'],
+                'authors': [{'key': '/authors/OL1A', 'name': 'Sun Tzu'}, {'key': '/authors/OL2A'}],
+            },
+            '9780140449334': {'title': 'Meditations', 'authors': [{'key': '/authors/OL1A', 'name': 'Sun Tzu'}]},
+        })
+        results = OpenLibraryClient().lookup_many(['9781599869773', '978-0-14-044933-4', '9780000000002'])
+        self.assertEqual(results['9781599869773']['authors'], ['Sun Tzu', 'Lionel Giles'])
+        self.assertEqual(results['9781599869773']['publisher'], 'Filiquarian')
+        self.assertEqual(results['9780140449334']['authors'], ['Sun Tzu'])
+        self.assertIsNone(results['9780000000002'])
+        self.assertEqual(self.adapter.calls['/api/books'], 1)
+        self.assertEqual(self.adapter.calls['/authors/OL1A.json'], 0)
+        self.assertEqual(self.adapter.calls['/authors/OL2A.json'], 1)
+        self.assertEqual(OpenLibraryAuthor.objects.count(), 2)
+
+
+@override_settings(OPEN_LIBRARY_ENABLED=True)
+class BulkIngestTest(TestCase):
+    def setUp(self):
+        author_names.clear()
+        self.addCleanup(author_names.clear)
+        self.adapter = RoutedAdapter({
+            '/api/books': open_library_books_api({
+                '9781599869773': {
+                    'title': 'The Art of War', 'isbn_13': ['9781599869773'],
+                    'authors': [{'key': '/authors/OL1A', 'name': 'Sun Tzu'}]
+                },
+                '9780140449334': {
+                    'title': 'Meditations', 'isbn_13': ['9780140449334'], 'publish_date': 'c2006',
+                    'authors': [{'key': '/authors/OL2A', 'name': 'Marcus Aurelius'}]
+                },
+            }),
+        })
+        http_client.mount('https://openlibrary.org/', self.adapter)
+        self.addCleanup(http_client.session.adapters.pop, 'https://openlibrary.org/')
+        self.existing = Book.objects.create(title="Existing Book", primary_isbn_13="9780306406157")
+        self.library = Library.objects.create(name="Scanned Shelf")
+
+    def _ingest(self, data):
+        response = self.client.post(reverse('book-bulk-ingest'), data, content_type='application/json')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_bulk_ingest_streams_progress(self):
+        """Test that each ISBN gets a progress line and new books are created in bulk"""
+        events = self._ingest({
+            'isbns': ['9781599869773', '0-306-40615-2', '9780140449334', '1599869772', 'not-an-isbn', '9780000000002'],
+            'library_id': self.library.id,
+        })
+        statuses = {event['isbn']: event['status'] for event in events if 'isbn' in event}
+        self.assertEqual(statuses, {
+            '9781599869773': 'created',
+            '1599869772': 'created',
+            '0-306-40615-2': 'exists',
+            '9780140449334': 'created',
+            'not-an-isbn': 'invalid',
+            '9780000000002': 'not_found',
+        })
+        self.assertEqual(events[-1]['created'], 3)
+        self.assertTrue(events[-1]['done'])
+
+        book = Book.find_by_isbn('9781599869773')
+        self.assertEqual([author.name for author in book.authors.all()], ['Sun Tzu'])
+        self.assertIsNone(Book.find_by_isbn('9780140449334').publication_date)
+        self.assertEqual(LibraryBook.objects.filter(library=self.library).count(), 3)
+        # All lookups went out in one batched request
+        self.assertEqual(sum(self.adapter.calls.values()), 1)
+
+        events = self._ingest({'isbns': ['9781599869773']})
+        self.assertEqual(events[0]['status'], 'exists')
+        self.assertEqual(Book.objects.count(), 3)
+
+    def test_author_names_match_across_case(self):
+        """Test that an author stored in another case is reused, as a case-insensitive collation returns it"""
+        existing = Author.objects.create(name='sun tzu')
+        # MySQL skips the insert as a duplicate of the existing row
+        with mock.patch.object(Author.objects, 'bulk_create'):
+            events = self._ingest({'isbns': ['9781599869773']})
+        self.assertEqual(events[0]['status'], 'created')
+        self.assertEqual(list(Book.find_by_isbn('9781599869773').authors.all()), [existing])
+
+    def test_failed_batch_reports_errors_and_finishes(self):
+        """Test that an unexpected error in a batch becomes error events and the stream still ends"""
+        with mock.patch('ingest.bulk.BulkIngest._bulk_create', side_effect=RuntimeError('boom')):
+            events = self._ingest({'isbns': ['9781599869773', '9780140449334', '0-306-40615-2']})
+        statuses = {event['isbn']: event['status'] for event in events if 'isbn' in event}
+        self.assertEqual(statuses, {'9781599869773': 'error', '9780140449334': 'error', '0-306-40615-2': 'exists'})
+        self.assertTrue(events[-1]['done'])
+        self.assertEqual(events[-1]['error'], 2)
+
+    def test_bulk_ingest_validates_input(self):
+        """Test that the ISBN list is required"""
+        response = self.client.post(reverse('book-bulk-ingest'), {'isbns': []}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(OPEN_LIBRARY_ENABLED=True)
+class BatchLookupCommandTest(TestCase):
+    def setUp(self):
+        author_names.clear()
+        self.addCleanup(author_names.clear)
+        self.adapter = RoutedAdapter({
+            '/api/books': open_library_books_api({
+                '9781599869773': {'title': 'The Art of War', 'authors': [{'key': '/authors/OL1A', 'name': 'Sun Tzu'}]},
+                '9780140449334': {'title': 'Meditations', 'publishers': ['Penguin'], 'number_of_pages': 254},
+            }),
+        })
+        http_client.mount('https://openlibrary.org/', self.adapter)
+        self.addCleanup(http_client.session.adapters.pop, 'https://openlibrary.org/')
+
+    def test_seed_books_uses_one_batch_request(self):
+        """Test that seed_books looks up all new ISBNs in one request"""
+        call_command('seed_books', '--isbns', '9781599869773', '9780140449334', stdout=StringIO())
+        self.assertEqual(self.adapter.calls['/api/books'], 1)
+        self.assertEqual(Book.find_by_isbn('9781599869773').authors.get().name, 'Sun Tzu')
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_import_library_enrich(self):
+        """Test that --enrich fills blank fields without overriding the file"""
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump({'name': 'Imported', 'library_books': [
+                {'title': 'Meditations (my copy)', 'primary_isbn_13': '9780140449334'},
+                {'title': 'Art of War', 'isbn_10': '1599869772', 'author_names': ['Sunzi']},
+            ]}, f)
+        self.addCleanup(os.remove, f.name)
+
+        call_command('import_library', f.name, '--enrich', stdout=StringIO())
+        self.assertEqual(self.adapter.calls['/api/books'], 1)
+        meditations = Book.find_by_isbn('9780140449334')
+        self.assertEqual((meditations.title, meditations.publisher), ('Meditations (my copy)', 'Penguin'))
+        self.assertEqual(Book.find_by_isbn('1599869772').authors.get().name, 'Sunzi')
+
+
+@override_settings(GOOGLE_BOOKS_ENABLED=True, OPEN_LIBRARY_ENABLED=True)
+class OpenLibraryDumpTest(TestCase):
+    def setUp(self):
+        author_names.clear()
+        self.addCleanup(author_names.clear)
+        edition = {
+            'type': {'key': '/type/edition'},
+            'key': '/books/OL1M',
+            'title': 'The Art of War',
+            'publishers': ['Filiquarian'],
+            'publish_date': '2007',
+            'number_of_pages': 68,
+            'isbn_10': ['1599869772'],
+            'isbn_13': ['9781599869773'],
+            'covers': [42],
+            'authors': [{'key': '/authors/OL1A'}],
+        }
+        lines = [
+            json.dumps({'type': {'key': '/type/author'}, 'key': '/authors/OL1A', 'name': 'Sun Tzu'}),
+            # Official dumps are tab-separated with the record in the last column
+            '\t'.join(['/type/edition', '/books/OL1M', '3', '2020-01-01', json.dumps(edition)]),
+            json.dumps({'type': {'key': '/type/edition'}, 'key': '/books/OL2M', 'title': 'No ISBN'}),
+            'not json',
+        ]
+        with tempfile.NamedTemporaryFile(suffix='.jsonl.gz', delete=False) as f:
+            f.write(gzip.compress('\n'.join(lines).encode()))
+        self.addCleanup(os.remove, f.name)
+        self.path = f.name
+
+        self.adapter = RoutedAdapter({})
+        for prefix in ('https://www.googleapis.com/', 'https://openlibrary.org/'):
+            http_client.mount(prefix, self.adapter)
+            self.addCleanup(http_client.session.adapters.pop, prefix)
+
+    def test_import_reports_throughput(self):
+        """Test that the dump streams into the lookup tables and reports rows/s"""
+        out = StringIO()
+        call_command('import_openlibrary_dump', self.path, '--batch-size', '1', stdout=out)
+        self.assertIn('rows/s', out.getvalue())
+        self.assertIn('Imported 1 ISBNs and 1 authors from 4 records', out.getvalue())
+        edition = OpenLibraryEdition.objects.get()
+        self.assertEqual((edition.isbn, edition.isbn_10, edition.page_count), ('9781599869773', '1599869772', 68))
+        self.assertTrue(OpenLibraryAuthor.objects.get().imported)
+
+        # Re-importing updates rows in place
+        call_command('import_openlibrary_dump', self.path, stdout=StringIO())
+        self.assertEqual(OpenLibraryEdition.objects.count(), 1)
+
+    def test_upsert_target_follows_backend(self):
+        """Test that conflict columns are only named where the backend accepts a target"""
+        features = connection.features
+        with mock.patch.object(features, 'supports_update_conflicts_with_target', True):
+            self.assertEqual(_conflict_target(['isbn']), {'unique_fields': ['isbn']})
+        # MySQL upserts on any unique key and rejects unique_fields
+        with mock.patch.object(features, 'supports_update_conflicts_with_target', False):
+            self.assertEqual(_conflict_target(['isbn']), {})
+
+    def test_dump_answers_before_network(self):
+        """Test that a complete local answer skips the network providers"""
+        call_command('import_openlibrary_dump', self.path, stdout=StringIO())
+        result = BookMetadataClient().lookup_by_isbn('1599869772')
+        self.assertEqual(result['title'], 'The Art of War')
+        self.assertEqual(result['authors'], ['Sun Tzu'])
+        self.assertEqual(result['publication_date'], '2007-01-01')
+        self.assertEqual(result['sources'], ['open_library_dump'])
+
+        results = BookMetadataClient().lookup_many(['9781599869773'])
+        self.assertEqual(results['9781599869773']['cover_url'], 'https://covers.openlibrary.org/b/id/42-L.jpg')
+        self.assertEqual(sum(self.adapter.calls.values()), 0)
+
+        # Imported names are read per lookup, not loaded into the warm cache
+        author_names.warm()
+        self.assertNotIn('/authors/OL1A', author_names._names)
+
+
+class ReplayBenchmarkTest(TestCase):
+    def setUp(self):
+        volume = {'volumeInfo': {
+            'title': 'The Art of War',
+            'authors': ['Sun Tzu'],
+            'industryIdentifiers': [{'type': 'ISBN_13', 'identifier': '9781599869773'}],
+        }}
+        self.corpus = ProviderCorpus()
+        self.corpus.learn('https://www.googleapis.com/books/v1/volumes?q=isbn%3A9781599869773', {'totalItems': 1, 'items': [volume]})
+        self.corpus.learn('https://openlibrary.org/api/books?bibkeys=ISBN%3A9780140449334&jscmd=details', {
+            'ISBN:9780140449334': {'details': {'title': 'Meditations', 'authors': [{'key': '/authors/OL2A', 'name': 'Marcus Aurelius'}]}},
+        })
+        fd, self.path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+        self.corpus.save(self.path)
+
+    def test_corpus_answers_every_request_shape(self):
+        """Test that recorded records are replayed for single, batched and author requests"""
+        corpus = ProviderCorpus.load(self.path)
+        self.assertEqual(corpus.isbns, ['9780140449334', '9781599869773'])
+        status, body = corpus.respond('https://www.googleapis.com/books/v1/volumes?q=isbn:1599869772+OR+isbn:9780000000002')
+        self.assertEqual((status, body['totalItems']), (200, 1))
+        status, body = corpus.respond('https://openlibrary.org/isbn/0140449337.json')
+        self.assertEqual(body['authors'], [{'key': '/authors/OL2A'}])
+        self.assertEqual(corpus.respond('https://openlibrary.org/authors/OL2A.json'), (200, {'name': 'Marcus Aurelius'}))
+        self.assertEqual(corpus.respond('https://openlibrary.org/isbn/9780000000002.json')[0], 404)
+
+    def test_error_injection(self):
+        """Test that injected failures surface as the configured transport error"""
+        session = requests.Session()
+        session.mount('https://openlibrary.org/', ReplayAdapter(self.corpus, error_rate=1.0, error='timeout'))
+        with self.assertRaises(requests.Timeout):
+            session.get('https://openlibrary.org/isbn/9780140449334.json')
+        session.mount('https://openlibrary.org/', ReplayAdapter(self.corpus, error_rate=1.0, error_status=429))
+        self.assertEqual(session.get('https://openlibrary.org/isbn/9780140449334.json').status_code, 429)
+
+    def test_benchmark_reports_throughput_per_path(self):
+        """Test that each ingest path is timed against the replayed providers and rolled back"""
+        out = StringIO()
+        call_command('benchmark_ingest', '--replay', self.path, '--latency', '0.01', '--seed', '1', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual([line.split(':')[0] for line in lines], ['single', 'batched', 'bulk'])
+        for line in lines:
+            self.assertIn('ISBNs/s', line)
+            self.assertIn('2 found', line)
+        # Batching packs both ISBNs into one request per provider
+        self.assertIn('2 requests', lines[1])
+        self.assertFalse(Book.objects.exists())
+        self.assertFalse(MetadataLookup.objects.exists())
@@ -6,6 +6,9 @@ from libraries.models import Library, LibraryBook
 from libraries.serializers import LibraryImportSerializer, BookImportSerializer
 from books.models import Book, Tag, Shelf, Author
 from books.serializers import BookCreateSerializer
+from books.isbn import clean_isbn, normalize_isbn
+from ingest.bulk import book_fields_from_metadata
+from ingest.clients import BookMetadataClient
 
 
 class Command(BaseCommand):
@@ -27,6 +30,11 @@ class Command(BaseCommand):
             action='store_true',
             help='Validate the import file without actually importing'
         )
+        parser.add_argument(
+            '--enrich',
+            action='store_true',
+            help='Fill missing book fields from Google Books and Open Library using batched ISBN lookups'
+        )
 
     def handle(self, *args, **options):
         file_path = options['file_path']
@@ -51,6 +59,9 @@ class Command(BaseCommand):
             if library_name_override:
                 import_data['name'] = library_name_override
 
+            if options['enrich']:
+                self._enrich_books(import_data.get('library_books', []))
+
             # Validate the import data
             library_serializer = LibraryImportSerializer(data=import_data)
             if not library_serializer.is_valid():
@@ -91,15 +102,10 @@ class Command(BaseCommand):
                         validated_book_data = book_serializer.validated_data
 
                         # Check if book already exists
-                        existing_book = None
-                        if validated_book_data.get('primary_isbn_13'):
-                            existing_book = Book.objects.filter(
-                                primary_isbn_13=validated_book_data['primary_isbn_13']
-                            ).first()
-                        elif validated_book_data.get('isbn_10'):
-                            existing_book = Book.objects.filter(
-                                isbn_10=validated_book_data['isbn_10']
-                            ).first()
+                        existing_book = (
+                            Book.find_by_isbn(validated_book_data.get('primary_isbn_13'))
+                            or Book.find_by_isbn(validated_book_data.get('isbn_10'))
+                        )
 
                         if not existing_book:
                             # Create new book
@@ -108,6 +114,10 @@ class Command(BaseCommand):
                             book_serializer = BookCreateSerializer(data=book_create_data)
                             if book_serializer.is_valid():
                                 book = book_serializer.save()
+                                book.authors.set([
+                                    Author.objects.get_or_create(name=name.strip())[0]
+                                    for name in validated_book_data.get('author_names', []) if name.strip()
+                                ])
                             else:
                                 errors.append(f"Book '{validated_book_data.get('title', 'Unknown')}': {book_serializer.errors}")
                                 continue
@@ -157,3 +167,35 @@ class Command(BaseCommand):
 
         except Exception as e:
             raise CommandError(f'Import failed: {str(e)}')
+
+    def _enrich_books(self, book_entries):
+        """Fill blank fields of new books from one batched metadata lookup."""
+        entries = {}
+        for entry in book_entries:
+            if isinstance(entry, dict):
+                isbn = clean_isbn(entry.get('primary_isbn_13') or entry.get('isbn_10'))
+                if isbn:
+                    entries.setdefault(isbn, []).append(entry)
+
+        existing = Book.find_by_isbns(entries)
+        isbns = [isbn for isbn in entries if normalize_isbn(isbn) not in existing]
+        if not isbns:
+            return
+
+        metadata_by_isbn = BookMetadataClient().lookup_many(isbns)
+        enriched = 0
+        for isbn in isbns:
+            metadata = metadata_by_isbn.get(isbn)
+            if not metadata:
+                continue
+            fields = book_fields_from_metadata(metadata)
+            fields.pop('source', None)
+            for entry in entries[isbn]:
+                for key, value in fields.items():
+                    if not entry.get(key):
+                        entry[key] = value
+                if not entry.get('author_names') and metadata.get('authors'):
+                    entry['author_names'] = metadata['authors']
+                enriched += 1
+
+        self.stdout.write(f'Enriched {enriched} of {len(isbns)} new books from metadata providers')
@@ -68,6 +68,7 @@ class LibraryExportSerializer(serializers.ModelSerializer):
     def get_library_books(self, obj):
         library_books = obj.library_books.all().prefetch_related(
             'book__authors',
+            'book__cover_images',
             'tags',
             'shelves'
         )
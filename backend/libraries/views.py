@@ -587,15 +587,10 @@ class LibraryViewSet(viewsets.ModelViewSet):
                         validated_book_data = book_serializer.validated_data
                         
                         # Check if book already exists (by ISBN or title)
-                        existing_book = None
-                        if validated_book_data.get('primary_isbn_13'):
-                            existing_book = Book.objects.filter(
-                                primary_isbn_13=validated_book_data['primary_isbn_13']
-                            ).first()
-                        elif validated_book_data.get('isbn_10'):
-                            existing_book = Book.objects.filter(
-                                isbn_10=validated_book_data['isbn_10']
-                            ).first()
+                        existing_book = (
+                            Book.find_by_isbn(validated_book_data.get('primary_isbn_13'))
+                            or Book.find_by_isbn(validated_book_data.get('isbn_10'))
+                        )
                         
                         if not existing_book:
                             # Create new book
@@ -673,7 +668,8 @@ class LibraryBookViewSet(viewsets.ModelViewSet):
     ordering = ['-added_at']
 
     def get_queryset(self):
-        queryset = LibraryBook.objects.all()
+        # Grid pages render each book's cached cover variants
+        queryset = LibraryBook.objects.prefetch_related('book__cover_images')
         library_id = self.request.query_params.get('library_id')
         if library_id:
             queryset = queryset.filter(library_id=library_id)
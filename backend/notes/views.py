@@ -31,7 +31,7 @@ class NoteViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
 
     def get_queryset(self):
-        queryset = Note.objects.all()
+        queryset = Note.objects.prefetch_related('ref_book__cover_images')
         library_book_id = self.request.query_params.get('library_book_id')
         if library_book_id:
             queryset = queryset.filter(library_book_id=library_book_id)
@@ -141,7 +141,7 @@ class NoteViewSet(viewsets.ModelViewSet):
         elif note.ref_subsection:
             referenced_notes = Note.objects.filter(ref_subsection=note.ref_subsection).exclude(id=note.id)
         
-        serializer = self.get_serializer(referenced_notes, many=True)
+        serializer = self.get_serializer(referenced_notes.prefetch_related('ref_book__cover_images'), many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
@@ -1,10 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework.documentation import include_docs_urls
-from books.views import BookViewSet, AuthorViewSet, TagViewSet, ShelfViewSet, ChapterViewSet, SectionViewSet, SubSectionViewSet, PageRangeViewSet
+from books.views import cover_image, BookViewSet, AuthorViewSet, TagViewSet, ShelfViewSet, ChapterViewSet, SectionViewSet, SubSectionViewSet, PageRangeViewSet, DuplicateCandidateViewSet
 from libraries.views import LibraryViewSet, LibraryBookViewSet
 from notes.views import NoteViewSet, RatingViewSet, ReviewViewSet, DiagramViewSet, NoteDiagramViewSet
-from files.views import BookFileViewSet, PDFHighlightViewSet
+from files.views import download_book_file, BookFileViewSet, PDFHighlightViewSet, UploadSessionViewSet
 from search.views import SearchViewSet, SearchEmbeddingViewSet
 
 # Create a router and register our viewsets with it
@@ -17,6 +17,7 @@ router.register(r'chapters', ChapterViewSet)
 router.register(r'sections', SectionViewSet)
 router.register(r'subsections', SubSectionViewSet)
 router.register(r'page-ranges', PageRangeViewSet)
+router.register(r'book-duplicates', DuplicateCandidateViewSet)
 router.register(r'libraries', LibraryViewSet)
 router.register(r'library-books', LibraryBookViewSet)
 router.register(r'notes', NoteViewSet)
@@ -26,6 +27,7 @@ router.register(r'diagrams', DiagramViewSet)
 router.register(r'note-diagrams', NoteDiagramViewSet)
 router.register(r'files', BookFileViewSet)
 router.register(r'pdf-highlights', PDFHighlightViewSet)
+router.register(r'uploads', UploadSessionViewSet)
 router.register(r'search-embeddings', SearchEmbeddingViewSet)
 
 # The API URLs are now determined automatically by the router
@@ -33,6 +35,8 @@ urlpatterns = [
     path('', include(router.urls)),
     path('search/', include([
         path('basic/', SearchViewSet.as_view({'get': 'basic'}), name='search-basic'),
+        path('suggest/', SearchViewSet.as_view({'get': 'suggest'}), name='search-suggest'),
+        path('topics/', SearchViewSet.as_view({'get': 'topics'}), name='search-topics'),
         path('semantic/', SearchViewSet.as_view({'post': 'semantic'}), name='search-semantic'),
         path('status/', SearchViewSet.as_view({'get': 'status'}), name='search-status'),
         path('recommendations/', SearchViewSet.as_view({'get': 'recommendations'}), name='search-recommendations'),
@@ -41,7 +45,11 @@ urlpatterns = [
 
     path('books/', include([
         path('categorize/', BookViewSet.as_view({'post': 'categorize'}), name='book-categorize'),
+        path('categorize_batch/', BookViewSet.as_view({'post': 'categorize_batch'}), name='book-categorize-batch'),
     ])),
 
+    path('covers/<uuid:cover_id>/<str:variant>/', cover_image, name='cover-image'),
+    path('files/<int:pk>/download/', download_book_file, name='bookfile-download'),
+
     path('health/', include('preposition_core.health_urls')),
 ]
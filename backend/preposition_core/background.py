@@ -0,0 +1,51 @@
+"""
+In-process background jobs for work that should not block a request.
+
+Jobs run on a small thread pool inside the web worker. Each job gets its own
+database connection, which is closed when the job finishes. Set
+BACKGROUND_JOBS_EAGER to run jobs inline, e.g. in tests or management commands.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'BACKGROUND_JOB_WORKERS', 2),
+                    thread_name_prefix='background-job'
+                )
+    return _executor
+
+
+def _run_job(func, args, kwargs):
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        logger.exception(f"Background job {func.__name__} failed")
+        raise
+    finally:
+        connection.close()
+
+
+def run_in_background(func, *args, **kwargs):
+    """Schedule ``func(*args, **kwargs)`` on the background pool and return its future."""
+    if getattr(settings, 'BACKGROUND_JOBS_EAGER', False):
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            logger.exception(f"Background job {func.__name__} failed")
+        return None
+    return _get_executor().submit(_run_job, func, args, kwargs)
@@ -2,6 +2,7 @@ from django.urls import path
 from django.http import JsonResponse
 from django.db import connection
 from django.core.cache import cache
+from ingest.guards import OPEN, provider_guards
 
 def health_check(request):
     """Basic health check endpoint."""
@@ -28,8 +29,15 @@ def health_check_cache(request):
     except Exception as e:
         return JsonResponse({'status': 'unhealthy', 'cache': str(e)}, status=500)
 
+def health_check_providers(request):
+    """Metadata provider circuit breaker and rate limiter state."""
+    providers = provider_guards.metrics()
+    degraded = any(metrics['state'] == OPEN for metrics in providers.values())
+    return JsonResponse({'status': 'degraded' if degraded else 'healthy', 'providers': providers})
+
 urlpatterns = [
     path('', health_check, name='health'),
     path('db/', health_check_db, name='health-db'),
     path('cache/', health_check_cache, name='health-cache'),
+    path('providers/', health_check_providers, name='health-providers'),
 ]
@@ -206,6 +206,7 @@ CORS_ALLOW_HEADERS = [
     'content-type',
     'dnt',
     'origin',
+    'upload-checksum',
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
@@ -214,6 +215,14 @@ CORS_ALLOW_HEADERS = [
 # Redis settings
 REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
 
+# Shared by every worker process: provider guards, single-flight locks and search caches
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+}
+
 # Celery settings
 CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = REDIS_URL
@@ -221,17 +230,81 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 
+# In-process background jobs
+BACKGROUND_JOB_WORKERS = config('BACKGROUND_JOB_WORKERS', default=2, cast=int)
+BACKGROUND_JOBS_EAGER = config('BACKGROUND_JOBS_EAGER', default=False, cast=bool)
+
 # External API settings
 GOOGLE_BOOKS_ENABLED = config('GOOGLE_BOOKS_ENABLED', default=True, cast=bool)
 OPEN_LIBRARY_ENABLED = config('OPEN_LIBRARY_ENABLED', default=True, cast=bool)
+# Local lookups against an imported dump (manage.py import_openlibrary_dump); no network needed
+OPEN_LIBRARY_DUMP_ENABLED = config('OPEN_LIBRARY_DUMP_ENABLED', default=True, cast=bool)
+
+# Outbound HTTP settings (shared session for metadata and cover requests)
+HTTP_TIMEOUT = config('HTTP_TIMEOUT', default=10, cast=float)
+HTTP_POOL_MAXSIZE = config('HTTP_POOL_MAXSIZE', default=10, cast=int)
+HTTP_MAX_PER_HOST = config('HTTP_MAX_PER_HOST', default=4, cast=int)
+HTTP_MAX_RETRIES = config('HTTP_MAX_RETRIES', default=3, cast=int)
+HTTP_BACKOFF_BASE = config('HTTP_BACKOFF_BASE', default=0.5, cast=float)
+HTTP_BACKOFF_MAX = config('HTTP_BACKOFF_MAX', default=8.0, cast=float)
+# Overall seconds one request may take, retries and backoff included
+HTTP_REQUEST_BUDGET = config('HTTP_REQUEST_BUDGET', default=20.0, cast=float)
+
+# Per-provider circuit breaker and token bucket, shared through the cache backend
+PROVIDER_BREAKER_FAILURE_THRESHOLD = config('PROVIDER_BREAKER_FAILURE_THRESHOLD', default=5, cast=int)
+PROVIDER_BREAKER_COOLDOWN_SECONDS = config('PROVIDER_BREAKER_COOLDOWN_SECONDS', default=30, cast=int)
+PROVIDER_RATE_LIMITS = {  # Requests per second; 0 disables limiting
+    'google_books': config('GOOGLE_BOOKS_RATE_LIMIT', default=5, cast=float),
+    'open_library': config('OPEN_LIBRARY_RATE_LIMIT', default=5, cast=float),
+}
+PROVIDER_RATE_BURST = config('PROVIDER_RATE_BURST', default=10, cast=int)
+PROVIDER_RATE_MAX_WAIT_SECONDS = config('PROVIDER_RATE_MAX_WAIT_SECONDS', default=2.0, cast=float)
+
+# ISBN metadata cache (per provider; "not found" answers expire sooner)
+METADATA_CACHE_TTL_SECONDS = config('METADATA_CACHE_TTL_SECONDS', default=30 * 24 * 3600, cast=int)
+METADATA_CACHE_NEGATIVE_TTL_SECONDS = config('METADATA_CACHE_NEGATIVE_TTL_SECONDS', default=24 * 3600, cast=int)
+
+# Providers are queried concurrently; results arriving after the deadline are ignored
+METADATA_LOOKUP_DEADLINE_SECONDS = config('METADATA_LOOKUP_DEADLINE_SECONDS', default=12, cast=float)
+METADATA_LOOKUP_WORKERS = config('METADATA_LOOKUP_WORKERS', default=8, cast=int)
+OPEN_LIBRARY_AUTHOR_WORKERS = config('OPEN_LIBRARY_AUTHOR_WORKERS', default=8, cast=int)
+
+# Bulk ISBN ingest (POST /api/books/bulk_ingest/)
+BULK_INGEST_WORKERS = config('BULK_INGEST_WORKERS', default=8, cast=int)
+BULK_INGEST_MAX_ISBNS = config('BULK_INGEST_MAX_ISBNS', default=1000, cast=int)
+
+# Cover search results are cached; chosen covers are downloaded once and resized locally
+COVER_SEARCH_CACHE_SECONDS = config('COVER_SEARCH_CACHE_SECONDS', default=6 * 3600, cast=int)
+COVER_SEARCH_DEADLINE_SECONDS = config('COVER_SEARCH_DEADLINE_SECONDS', default=12, cast=float)
+COVER_MAX_BYTES = config('COVER_MAX_BYTES', default=5 * 1024 * 1024, cast=int)
+# Covers are only downloaded from these hosts and their subdomains
+COVER_ALLOWED_HOSTS = config(
+    'COVER_ALLOWED_HOSTS',
+    default='books.google.com,books.googleusercontent.com,covers.openlibrary.org,archive.org'
+).split(',')
 
 # AI Provider settings
 AI_PROVIDER = config('AI_PROVIDER', default='disabled')
 OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
 
+# Search autocomplete settings
+SEARCH_SUGGEST_SNAPSHOT_PATH = config('SEARCH_SUGGEST_SNAPSHOT_PATH', default=None)
+SEARCH_SUGGEST_REFRESH_SECONDS = config('SEARCH_SUGGEST_REFRESH_SECONDS', default=900, cast=int)
+
 # File upload settings
 MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # 50MB
 ALLOWED_FILE_TYPES = ['application/pdf', 'application/epub+zip']
+# Resumable uploads (api/uploads/) are stored chunk by chunk, so they can be much larger
+MAX_RESUMABLE_UPLOAD_SIZE = config('MAX_RESUMABLE_UPLOAD_SIZE', default=2 * 1024 * 1024 * 1024, cast=int)  # 2GB
+UPLOAD_CHUNK_SIZE = config('UPLOAD_CHUNK_SIZE', default=8 * 1024 * 1024, cast=int)  # Largest accepted chunk
+# A queued or running extraction older than this is taken to have died with its worker
+EXTRACTION_STALE_SECONDS = config('EXTRACTION_STALE_SECONDS', default=3600, cast=int)
+
+# File download settings: '' streams from Django, 'x-accel-redirect' (nginx) or
+# 'x-sendfile' (Apache/lighttpd) hands the transfer to the web server
+FILE_DOWNLOAD_OFFLOAD = config('FILE_DOWNLOAD_OFFLOAD', default='')
+# Internal nginx location aliased to MEDIA_ROOT, used with x-accel-redirect
+FILE_DOWNLOAD_OFFLOAD_PREFIX = config('FILE_DOWNLOAD_OFFLOAD_PREFIX', default='/protected-media/')
 
 # Security settings
 SECURE_BROWSER_XSS_FILTER = True
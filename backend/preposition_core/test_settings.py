@@ -15,6 +15,10 @@ DATABASES = {
 GOOGLE_BOOKS_ENABLED = False
 OPEN_LIBRARY_ENABLED = False
 AI_PROVIDER = 'disabled'
+PROVIDER_RATE_LIMITS = {}  # Tests exercising the rate limiter enable it explicitly
+
+# Run background jobs inline so tests can assert on their results
+BACKGROUND_JOBS_EAGER = True
 
 # Use console email backend for testing
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
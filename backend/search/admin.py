@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import SearchEmbedding
+from .models import SearchEmbedding, TopicMap, TopicCluster
 
 
 @admin.register(SearchEmbedding)
@@ -9,3 +9,18 @@ class SearchEmbeddingAdmin(admin.ModelAdmin):
     search_fields = ['owner_id']
     readonly_fields = ['created_at']
     ordering = ['-created_at']
+
+
+@admin.register(TopicMap)
+class TopicMapAdmin(admin.ModelAdmin):
+    list_display = ['library', 'embedding_model', 'fitted_items', 'is_stale', 'updated_at']
+    list_filter = ['is_stale', 'embedding_model']
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(TopicCluster)
+class TopicClusterAdmin(admin.ModelAdmin):
+    list_display = ['label', 'topic_map', 'index', 'size']
+    search_fields = ['label']
+    exclude = ['centroid']
+    ordering = ['topic_map', 'index']
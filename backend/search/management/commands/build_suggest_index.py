@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from search.suggest import suggestion_index
+import time
+
+
+class Command(BaseCommand):
+    help = 'Build the search autocomplete index and write it to a snapshot file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Snapshot path (defaults to SEARCH_SUGGEST_SNAPSHOT_PATH)',
+        )
+
+    def handle(self, *args, **options):
+        output = options['output'] or getattr(settings, 'SEARCH_SUGGEST_SNAPSHOT_PATH', None)
+        if not output:
+            raise CommandError('No snapshot path given. Use --output or set SEARCH_SUGGEST_SNAPSHOT_PATH.')
+
+        started = time.monotonic()
+        suggestion_index.rebuild()
+        suggestion_index.save_snapshot(output)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Wrote {len(suggestion_index.index)} suggestions to {output} in {time.monotonic() - started:.2f}s'
+            )
+        )
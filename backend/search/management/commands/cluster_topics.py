@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from libraries.models import Library
+from search.topics import cluster_library, topics_lock, update_library_topics
+import time
+
+
+class Command(BaseCommand):
+    help = 'Cluster library books and notes into topics from their embeddings'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--library-id',
+            type=int,
+            help='Only cluster this library (defaults to all libraries)',
+        )
+        parser.add_argument(
+            '--clusters',
+            type=int,
+            help='Number of topics (defaults to one per ~2 items, square-rooted)',
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Re-cluster from scratch instead of updating existing topic maps',
+        )
+
+    def handle(self, *args, **options):
+        libraries = Library.objects.all()
+        if options['library_id']:
+            libraries = libraries.filter(id=options['library_id'])
+            if not libraries.exists():
+                raise CommandError(f"Library {options['library_id']} does not exist")
+
+        for library in libraries:
+            started = time.monotonic()
+            with topics_lock(library.id) as acquired:
+                if not acquired:
+                    self.stdout.write(self.style.WARNING(f'Skipped "{library.name}": topics are already being built'))
+                    continue
+                if options['full'] or options['clusters']:
+                    topic_map = cluster_library(library.id, n_clusters=options['clusters'])
+                else:
+                    topic_map = update_library_topics(library.id)
+
+            if topic_map is None:
+                self.stdout.write(self.style.WARNING(f'Skipped "{library.name}": not enough embeddings'))
+                continue
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Clustered "{library.name}" into {topic_map.clusters.count()} topics '
+                    f'({topic_map.assignments.count()} items) in {time.monotonic() - started:.2f}s'
+                )
+            )
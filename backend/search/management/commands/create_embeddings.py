@@ -214,7 +214,7 @@ class Command(BaseCommand):
 
         for book_file in files:
             try:
-                if semantic_search_service._get_or_create_embedding('file_text', book_file.id, book_file.extracted_text):
+                if semantic_search_service._get_or_create_file_embedding(book_file):
                     created += 1
                     self.stdout.write(f'  ✓ Created embedding for file: {book_file.file_path}')
                 else:
@@ -226,7 +226,7 @@ class Command(BaseCommand):
                             model=semantic_search_service.ai_provider
                         ).delete()
                         
-                        if semantic_search_service._get_or_create_embedding('file_text', book_file.id, book_file.extracted_text):
+                        if semantic_search_service._get_or_create_file_embedding(book_file):
                             created += 1
                             self.stdout.write(f'  ✓ Recreated embedding for file: {book_file.file_path}')
                         else:
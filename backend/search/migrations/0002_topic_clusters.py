@@ -0,0 +1,127 @@
+# Generated by Django 5.0.2 on 2026-10-19 10:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("libraries", "0002_library_is_system"),
+        ("search", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TopicMap",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("embedding_model", models.CharField(max_length=100)),
+                ("dimensions", models.PositiveIntegerField()),
+                ("fitted_items", models.PositiveIntegerField(default=0)),
+                ("is_stale", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "library",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="topic_map",
+                        to="libraries.library",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="TopicCluster",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("index", models.PositiveIntegerField()),
+                ("label", models.CharField(max_length=255)),
+                ("centroid", models.BinaryField()),
+                ("size", models.PositiveIntegerField(default=0)),
+                (
+                    "topic_map",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="clusters",
+                        to="search.topicmap",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-size"],
+                "unique_together": {("topic_map", "index")},
+            },
+        ),
+        migrations.CreateModel(
+            name="TopicAssignment",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "owner_type",
+                    models.CharField(
+                        choices=[
+                            ("book", "Book"),
+                            ("note", "Note"),
+                            ("review", "Review"),
+                            ("file_text", "File Text"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("owner_id", models.CharField(max_length=255)),
+                ("distance", models.FloatField()),
+                (
+                    "cluster",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="assignments",
+                        to="search.topiccluster",
+                    ),
+                ),
+                (
+                    "topic_map",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="assignments",
+                        to="search.topicmap",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["distance"],
+                "indexes": [
+                    models.Index(
+                        fields=["cluster", "distance"],
+                        name="search_topi_cluster_973a8a_idx",
+                    )
+                ],
+                "unique_together": {("topic_map", "owner_type", "owner_id")},
+            },
+        ),
+    ]
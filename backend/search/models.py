@@ -28,3 +28,52 @@ class SearchEmbedding(models.Model):
 
     def __str__(self):
         return f"{self.owner_type}:{self.owner_id} ({self.model})"
+
+
+class TopicMap(models.Model):
+    """Cached topic clustering of a library's book and note embeddings."""
+    library = models.OneToOneField('libraries.Library', on_delete=models.CASCADE, related_name='topic_map')
+    embedding_model = models.CharField(max_length=100)
+    dimensions = models.PositiveIntegerField()
+    fitted_items = models.PositiveIntegerField(default=0)  # Items in the last full fit
+    is_stale = models.BooleanField(default=False)  # New embeddings arrived since last update
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Topics for {self.library}"
+
+
+class TopicCluster(models.Model):
+    """A topic cluster with its centroid and a label built from member titles."""
+    topic_map = models.ForeignKey(TopicMap, on_delete=models.CASCADE, related_name='clusters')
+    index = models.PositiveIntegerField()
+    label = models.CharField(max_length=255)
+    centroid = models.BinaryField()  # float32 vector
+    size = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-size']
+        unique_together = ['topic_map', 'index']
+
+    def __str__(self):
+        return f"{self.label} ({self.size})"
+
+
+class TopicAssignment(models.Model):
+    """Assignment of a book or note embedding to a topic cluster."""
+    topic_map = models.ForeignKey(TopicMap, on_delete=models.CASCADE, related_name='assignments')
+    cluster = models.ForeignKey(TopicCluster, on_delete=models.CASCADE, related_name='assignments')
+    owner_type = models.CharField(max_length=20, choices=SearchEmbedding.OWNER_TYPE_CHOICES)
+    owner_id = models.CharField(max_length=255)
+    distance = models.FloatField()
+
+    class Meta:
+        ordering = ['distance']
+        unique_together = ['topic_map', 'owner_type', 'owner_id']
+        indexes = [
+            models.Index(fields=['cluster', 'distance']),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_type}:{self.owner_id} -> {self.cluster}"
@@ -17,6 +17,7 @@ class SearchResultSerializer(serializers.Serializer):
     score = serializers.FloatField()
     snippet = serializers.CharField()
     url = serializers.CharField()
+    page = serializers.IntegerField(required=False, allow_null=True)  # First matching page of a file
 
 
 class BasicSearchSerializer(serializers.Serializer):
@@ -27,6 +28,23 @@ class BasicSearchSerializer(serializers.Serializer):
     tag = serializers.CharField(required=False, help_text="Filter by tag")
     rating = serializers.IntegerField(required=False, min_value=1, max_value=5, help_text="Filter by rating")
     shelf = serializers.CharField(required=False, help_text="Filter by shelf")
+    facets = serializers.BooleanField(default=False, help_text="Include facet counts for matched books")
+
+
+class SuggestSerializer(serializers.Serializer):
+    """Serializer for autocomplete parameters."""
+    TYPE_CHOICES = ['book', 'author', 'tag', 'shelf']
+
+    q = serializers.CharField(help_text="Typed prefix")
+    limit = serializers.IntegerField(default=10, min_value=1, max_value=25, help_text="Number of completions to return")
+    types = serializers.MultipleChoiceField(choices=TYPE_CHOICES, required=False, help_text="Restrict completions to these types")
+
+
+class TopicsSerializer(serializers.Serializer):
+    """Serializer for topic cluster parameters."""
+    library_id = serializers.IntegerField(help_text="Library whose topics to return")
+    cluster_id = serializers.IntegerField(required=False, help_text="Include the members of this cluster")
+    refresh = serializers.BooleanField(default=False, help_text="Re-cluster the library from scratch")
 
 
 class SemanticSearchSerializer(serializers.Serializer):
@@ -188,9 +188,7 @@ class SemanticSearchService:
         
         for book_file in file_queryset:
             if book_file.extracted_text:
-                embedding = self._get_or_create_embedding(
-                    'file_text', book_file.id, book_file.extracted_text
-                )
+                embedding = self._get_or_create_file_embedding(book_file)
                 if embedding:
                     embeddings.append({
                         'id': str(book_file.id),
@@ -203,6 +201,21 @@ class SemanticSearchService:
         
         return embeddings
     
+    def _get_or_create_file_embedding(self, book_file: BookFile) -> Optional[List[float]]:
+        """Get or create a file text embedding, reusing one made for a file with identical contents."""
+        embeddings = SearchEmbedding.objects.filter(owner_type='file_text', model=self.ai_provider)
+        if book_file.checksum and not embeddings.filter(owner_id=book_file.id).exists():
+            twin_ids = BookFile.objects.filter(checksum=book_file.checksum).exclude(id=book_file.id).values_list('id', flat=True)
+            twin = embeddings.filter(owner_id__in=[str(twin_id) for twin_id in twin_ids]).first()
+            if twin:
+                SearchEmbedding.objects.get_or_create(
+                    owner_type='file_text',
+                    owner_id=book_file.id,
+                    model=self.ai_provider,
+                    defaults={'vector': twin.vector}
+                )
+        return self._get_or_create_embedding('file_text', book_file.id, book_file.extracted_text)
+    
     def _get_or_create_embedding(self, owner_type: str, owner_id: int, text: str) -> Optional[List[float]]:
         """Get existing embedding or create new one."""
         try:
@@ -0,0 +1,47 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from books.models import Book, Author, Tag, Shelf
+from libraries.models import LibraryBook
+from .models import SearchEmbedding, TopicMap
+from .suggest import suggestion_index
+
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, **kwargs):
+    suggestion_index.add('book', instance.id, instance.title)
+
+
+@receiver(post_save, sender=Author)
+def index_author(sender, instance, **kwargs):
+    suggestion_index.add('author', instance.id, instance.name)
+
+
+@receiver(post_save, sender=Tag)
+def index_tag(sender, instance, **kwargs):
+    suggestion_index.add('tag', instance.id, instance.name)
+
+
+@receiver(post_save, sender=Shelf)
+def index_shelf(sender, instance, **kwargs):
+    suggestion_index.add('shelf', instance.id, instance.name)
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Shelf)
+def unindex_suggestion(sender, instance, **kwargs):
+    suggestion_index.remove(sender.__name__.lower(), instance.id)
+
+
+@receiver(post_save, sender=SearchEmbedding)
+@receiver(post_delete, sender=SearchEmbedding)
+def mark_topics_stale(sender, instance, **kwargs):
+    # Embeddings are not tied to a library, so every cached map is re-checked lazily
+    TopicMap.objects.filter(is_stale=False).update(is_stale=True)
+
+
+@receiver(post_save, sender=LibraryBook)
+@receiver(post_delete, sender=LibraryBook)
+def mark_library_topics_stale(sender, instance, **kwargs):
+    TopicMap.objects.filter(library_id=instance.library_id, is_stale=False).update(is_stale=True)
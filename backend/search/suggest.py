@@ -0,0 +1,342 @@
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+from django.conf import settings
+from django.db.models import Count
+from preposition_core.background import run_in_background
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD_RE = re.compile(r'[^\w]+', re.UNICODE)
+
+
+def normalize_suggest_text(text: str) -> str:
+    """Fold case and accents and collapse punctuation to single spaces."""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_WORD_RE.sub(' ', text.casefold()).strip()
+
+
+class PrefixIndex:
+    """Compact prefix index mapping typed prefixes to weighted completions.
+
+    The trie is flattened into one sorted list of ``(key, type, id)`` tuples:
+    every prefix corresponds to a contiguous slice of that list, which is found
+    with two binary searches. Top-k results for short or very common prefixes
+    are cached and updated in place as entries are added or removed.
+    """
+
+    MAX_KEY_LENGTH = 64
+    MAX_WORD_KEYS = 6
+    TOP_K = 25
+    SCAN_LIMIT = 256
+    WARM_PREFIX_LENGTH = 2
+    CACHE_SIZE = 4096
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys: List[Tuple[str, str, str]] = []
+        self._entries: Dict[Tuple[str, str], Dict] = {}
+        self._top_cache: 'OrderedDict[str, List[Tuple[str, str]]]' = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _keys_for(self, text: str) -> List[str]:
+        """Index the full text plus each later word start, so 'war' finds 'The Art of War'."""
+        normalized = normalize_suggest_text(text)
+        if not normalized:
+            return []
+        keys = [normalized[:self.MAX_KEY_LENGTH]]
+        words = normalized.split(' ')
+        for i in range(1, min(len(words), self.MAX_WORD_KEYS)):
+            suffix = ' '.join(words[i:])
+            if len(suffix) >= 2:
+                keys.append(suffix[:self.MAX_KEY_LENGTH])
+        return list(dict.fromkeys(keys))
+
+    def _rank(self, ref: Tuple[str, str]):
+        entry = self._entries[ref]
+        return (entry['weight'], -len(entry['text']))
+
+    def _cache_insert(self, key: str, ref: Tuple[str, str]):
+        """Merge a new entry into the cached top-k lists of its prefixes."""
+        rank = self._rank(ref)
+        for i in range(1, len(key) + 1):
+            top = self._top_cache.get(key[:i])
+            if top is None or ref in top:
+                continue
+            if len(top) < self.TOP_K or rank > self._rank(top[-1]):
+                top.append(ref)
+                top.sort(key=self._rank, reverse=True)
+                del top[self.TOP_K:]
+
+    def _cache_discard(self, key: str, ref: Tuple[str, str]):
+        """Drop cached top-k lists that contained a removed entry."""
+        for i in range(1, len(key) + 1):
+            top = self._top_cache.get(key[:i])
+            if top is not None and ref in top:
+                del self._top_cache[key[:i]]
+
+    def add(self, kind: str, obj_id, text: str, weight: int = 1):
+        """Add or replace a completion."""
+        ref = (kind, str(obj_id))
+        with self._lock:
+            self._remove(ref)
+            keys = self._keys_for(text)
+            if not keys:
+                return
+            self._entries[ref] = {'text': text, 'type': kind, 'id': ref[1], 'weight': weight, 'keys': keys}
+            for key in keys:
+                insort(self._keys, (key, kind, ref[1]))
+                self._cache_insert(key, ref)
+
+    def remove(self, kind: str, obj_id):
+        """Remove a completion if present."""
+        with self._lock:
+            self._remove((kind, str(obj_id)))
+
+    def _remove(self, ref: Tuple[str, str]):
+        entry = self._entries.pop(ref, None)
+        if entry:
+            kind = ref[0]
+            for key in entry['keys']:
+                item = (key, kind, ref[1])
+                pos = bisect_left(self._keys, item)
+                if pos < len(self._keys) and self._keys[pos] == item:
+                    del self._keys[pos]
+                self._cache_discard(key, ref)
+
+    def weight_of(self, kind: str, obj_id, default: int = 1) -> int:
+        entry = self._entries.get((kind, str(obj_id)))
+        return entry['weight'] if entry else default
+
+    def load(self, items: Iterable[Tuple[str, str, str, int]]):
+        """Replace the index contents with ``(type, id, text, weight)`` rows."""
+        entries = {}
+        keys = []
+        for kind, obj_id, text, weight in items:
+            ref = (kind, str(obj_id))
+            item_keys = self._keys_for(text)
+            if not item_keys:
+                continue
+            entries[ref] = {'text': text, 'type': kind, 'id': ref[1], 'weight': weight, 'keys': item_keys}
+            keys.extend((key, kind, ref[1]) for key in item_keys)
+        keys.sort()
+
+        with self._lock:
+            self._entries = entries
+            self._keys = keys
+            self._top_cache = OrderedDict()
+            self._warm()
+
+    def _warm(self):
+        """Precompute top-k lists for every one- and two-character prefix in one pass."""
+        heaps: Dict[str, Dict[Tuple[str, str], Tuple]] = {}
+        for key, kind, obj_id in self._keys:
+            ref = (kind, obj_id)
+            rank = self._rank(ref)
+            for length in range(1, min(len(key), self.WARM_PREFIX_LENGTH) + 1):
+                bucket = heaps.setdefault(key[:length], {})
+                bucket[ref] = rank
+        for prefix, bucket in heaps.items():
+            if len(bucket) > self.SCAN_LIMIT:
+                top = heapq.nlargest(self.TOP_K, bucket.items(), key=lambda item: item[1])
+                self._top_cache[prefix] = [ref for ref, _ in top]
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        lo = bisect_left(self._keys, (prefix,))
+        hi = bisect_left(self._keys, (prefix + '\U0010ffff',), lo)
+        return lo, hi
+
+    def _top_refs(self, prefix: str, limit: int, kinds: Optional[Tuple[str, ...]]) -> List[Tuple[str, str]]:
+        use_cache = kinds is None and limit <= self.TOP_K
+        if use_cache and prefix in self._top_cache:
+            self._top_cache.move_to_end(prefix)
+            return self._top_cache[prefix][:limit]
+
+        lo, hi = self._range(prefix)
+        refs = {}
+        for _, kind, obj_id in self._keys[lo:hi]:
+            if kinds is None or kind in kinds:
+                refs[(kind, obj_id)] = None
+        top = heapq.nlargest(max(limit, self.TOP_K) if use_cache else limit, refs, key=self._rank)
+
+        if use_cache and hi - lo > self.SCAN_LIMIT:
+            self._top_cache[prefix] = top
+            if len(self._top_cache) > self.CACHE_SIZE:
+                self._top_cache.popitem(last=False)
+        return top[:limit]
+
+    def complete(self, prefix: str, limit: int = 10, kinds: Optional[Iterable[str]] = None) -> List[Dict]:
+        """Return the highest-weighted completions for a typed prefix."""
+        normalized = normalize_suggest_text(prefix)[:self.MAX_KEY_LENGTH]
+        if not normalized:
+            return []
+        kinds = tuple(sorted(kinds)) if kinds else None
+        with self._lock:
+            refs = self._top_refs(normalized, limit, kinds)
+            return [
+                {key: value for key, value in self._entries[ref].items() if key != 'keys'}
+                for ref in refs
+            ]
+
+    def dump(self) -> List[List]:
+        with self._lock:
+            return [[e['type'], e['id'], e['text'], e['weight']] for e in self._entries.values()]
+
+
+class SuggestionIndex:
+    """Process-wide autocomplete index over book titles, authors, tags and shelves."""
+
+    def __init__(self):
+        self.index = PrefixIndex()
+        self.built_at = None
+        self.refresh_seconds = getattr(settings, 'SEARCH_SUGGEST_REFRESH_SECONDS', 900)
+        self.snapshot_path = getattr(settings, 'SEARCH_SUGGEST_SNAPSHOT_PATH', None)
+        self._build_lock = threading.Lock()
+        self._rebuilding = False
+        # Signal updates seen while contents are being loaded, replayed after the swap
+        self._updates_lock = threading.Lock()
+        self._pending: Optional[List[Tuple]] = None
+
+    @property
+    def is_built(self) -> bool:
+        return self.built_at is not None
+
+    @property
+    def is_stale(self) -> bool:
+        return not self.is_built or bool(self.refresh_seconds and time.time() - self.built_at >= self.refresh_seconds)
+
+    def _collect(self):
+        """Yield index rows with popularity weights, using one aggregate query per type."""
+        from books.models import Book, Author, Tag, Shelf
+
+        for book in Book.objects.annotate(weight=Count('library_books')).values('id', 'title', 'weight').iterator():
+            yield ('book', book['id'], book['title'], book['weight'] + 1)
+        for author in Author.objects.annotate(weight=Count('books')).values('id', 'name', 'weight').iterator():
+            yield ('author', author['id'], author['name'], author['weight'] + 1)
+        for tag in Tag.objects.annotate(weight=Count('librarybook')).values('id', 'name', 'weight').iterator():
+            yield ('tag', tag['id'], tag['name'], tag['weight'] + 1)
+        for shelf in Shelf.objects.annotate(weight=Count('librarybook')).values('id', 'name', 'weight').iterator():
+            yield ('shelf', shelf['id'], shelf['name'], shelf['weight'] + 1)
+
+    def _load(self, rows: Iterable[Tuple[str, str, str, int]]):
+        """Swap in new contents, then replay the updates made while they were read."""
+        with self._updates_lock:
+            self._pending = []
+        try:
+            self.index.load(rows)
+        except BaseException:
+            with self._updates_lock:
+                self._pending = None
+            raise
+        with self._updates_lock:
+            for update in self._pending:
+                self._apply(*update)
+            self._pending = None
+
+    def rebuild(self):
+        """Rebuild the index from the database."""
+        started = time.monotonic()
+        self._load(self._collect())
+        self.built_at = time.time()
+        logger.info(f"Built suggestion index with {len(self.index)} entries in {time.monotonic() - started:.2f}s")
+
+    def load_snapshot(self, path: str) -> bool:
+        """Load index rows from a JSON snapshot written by ``save_snapshot``."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load suggestion snapshot {path}: {e}")
+            return False
+        self._load(tuple(row) for row in snapshot.get('entries', []))
+        self.built_at = snapshot.get('built_at') or time.time()
+        return True
+
+    def save_snapshot(self, path: str):
+        """Write the current index rows to a JSON snapshot."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'built_at': self.built_at, 'entries': self.index.dump()}, f)
+        os.replace(tmp_path, path)
+
+    def ensure_built(self):
+        """Make sure an index is served, building it inside the request only once.
+
+        The first call loads the snapshot when one is configured, or builds the
+        index synchronously when there is none, so early requests do not get
+        empty suggestions. A stale index is rebuilt on the background pool
+        while the current contents keep being served.
+        """
+        if not self.is_stale:
+            return
+        if not self.is_built:
+            with self._build_lock:
+                if not self.is_built:
+                    self._initial_build()
+            if not self.is_stale:
+                return
+        self.schedule_rebuild()
+
+    def _initial_build(self):
+        if self.snapshot_path and os.path.exists(self.snapshot_path) and self.load_snapshot(self.snapshot_path):
+            return
+        self.rebuild()
+
+    def schedule_rebuild(self):
+        """Rebuild on the background pool unless a rebuild is already running."""
+        with self._build_lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        run_in_background(self._rebuild_job)
+
+    def _rebuild_job(self):
+        try:
+            self.rebuild()
+        finally:
+            self._rebuilding = False
+
+    def invalidate(self):
+        """Mark the index unbuilt so the next query builds it again."""
+        self.built_at = None
+
+    def _apply(self, action: str, kind: str, obj_id, text: Optional[str] = None):
+        if action == 'add':
+            self.index.add(kind, obj_id, text, self.index.weight_of(kind, obj_id))
+        else:
+            self.index.remove(kind, obj_id)
+
+    def _update(self, *update):
+        """Apply a signal update now and again after a load that is in progress."""
+        with self._updates_lock:
+            if self.is_built:
+                self._apply(*update)
+            if self._pending is not None:
+                self._pending.append(update)
+
+    def add(self, kind: str, obj_id, text: str):
+        self._update('add', kind, obj_id, text)
+
+    def remove(self, kind: str, obj_id):
+        self._update('remove', kind, obj_id)
+
+    def suggest(self, prefix: str, limit: int = 10, kinds: Optional[Iterable[str]] = None) -> List[Dict]:
+        self.ensure_built()
+        return self.index.complete(prefix, limit, kinds)
+
+
+# Global instance
+suggestion_index = SuggestionIndex()
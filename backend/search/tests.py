@@ -1,3 +1,6 @@
+import numpy as np
+from unittest import mock
+from django.db import DatabaseError
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APITestCase
@@ -6,7 +9,10 @@ from books.models import Book, Author, Tag, Shelf
 from libraries.models import Library, LibraryBook
 from notes.models import Note, Rating, Review
 from files.models import BookFile
-from search.models import SearchEmbedding
+from search.models import SearchEmbedding, TopicMap, TopicAssignment
+from search.services import semantic_search_service
+from search.suggest import PrefixIndex, suggestion_index
+from search.topics import cluster_library
 
 
 class SearchAPITest(APITestCase):
@@ -90,6 +96,46 @@ class SearchAPITest(APITestCase):
         })
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_basic_search_with_facets(self):
+        """Test basic search returns facet counts for matched books"""
+        tag = Tag.objects.create(name="Programming")
+        self.library_book.tags.add(tag)
+        url = reverse('search-basic')
+        response = self.client.get(url, {
+            'q': 'programming',
+            'library_id': self.library.id,
+            'facets': 'true'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        facets = response.data['facets']
+        self.assertEqual(facets['authors'], [{'value': 'Test Author', 'count': 1}])
+        self.assertEqual(facets['tags'], [{'value': 'Programming', 'count': 1}])
+        self.assertEqual(facets['publishers'], [{'value': 'Test Publisher', 'count': 1}])
+        self.assertEqual(facets['ratings'][0], {'value': 5, 'count': 1})
+
+    def test_basic_search_rating_filter_uses_latest_rating(self):
+        """Test that the rating filter excludes books rated below the threshold"""
+        url = reverse('search-basic')
+        Rating.objects.filter(library_book=self.library_book).update(rating=2)
+        response = self.client.get(url, {
+            'q': 'programming',
+            'library_id': self.library.id,
+            'rating': 4
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('book', [r['type'] for r in response.data['results']])
+
+    def test_facet_ratings_use_latest_rating(self):
+        """Test that the ratings facet buckets books by their latest rating, like the filter"""
+        Rating.objects.create(library_book=self.library_book, rating=2, category='plot')
+        response = self.client.get(reverse('search-basic'), {
+            'q': 'programming',
+            'library_id': self.library.id,
+            'facets': 'true'
+        })
+        ratings = {row['value']: row['count'] for row in response.data['facets']['ratings']}
+        self.assertEqual((ratings[5], ratings[2]), (0, 1))
+
     def test_basic_search_empty_query(self):
         """Test basic search with empty query"""
         url = reverse('search-basic')
@@ -186,3 +232,217 @@ class SearchEmbeddingTest(TestCase):
             vector=b'test-vector-data'
         )
         self.assertEqual(str(embedding), f"book:{self.book.id} (test-model)")
+
+
+class PrefixIndexTest(TestCase):
+    def setUp(self):
+        self.index = PrefixIndex()
+        self.index.load([
+            ('book', '1', 'The Art of War', 3),
+            ('book', '2', 'Art and Fear', 1),
+            ('author', '1', 'Sun Tzu', 2),
+        ])
+
+    def test_complete_by_prefix(self):
+        """Test completions are ranked by weight"""
+        results = self.index.complete('art')
+        self.assertEqual([r['text'] for r in results], ['The Art of War', 'Art and Fear'])
+
+    def test_complete_matches_later_words(self):
+        """Test that prefixes match the start of any word"""
+        results = self.index.complete('WAR')
+        self.assertEqual(results[0]['text'], 'The Art of War')
+
+    def test_add_and_remove(self):
+        """Test incremental updates"""
+        self.index.add('tag', '7', 'Artificial Intelligence', 5)
+        self.assertEqual(self.index.complete('art')[0]['type'], 'tag')
+        self.index.remove('tag', '7')
+        self.assertNotIn('tag', [r['type'] for r in self.index.complete('art')])
+
+    def test_filter_by_type(self):
+        """Test restricting completions to a type"""
+        results = self.index.complete('s', kinds=['author'])
+        self.assertEqual([r['text'] for r in results], ['Sun Tzu'])
+
+
+class SuggestAPITest(APITestCase):
+    def setUp(self):
+        suggestion_index.invalidate()
+        self.author = Author.objects.create(name="Marcus Aurelius")
+        self.book = Book.objects.create(title="Meditations", primary_isbn_13="9780140449334")
+        self.book.authors.add(self.author)
+
+    def tearDown(self):
+        suggestion_index.invalidate()
+
+    def test_suggest(self):
+        """Test suggest endpoint returns completions"""
+        url = reverse('search-suggest')
+        response = self.client.get(url, {'q': 'med'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['suggestions'][0]['id'], str(self.book.id))
+
+    def test_suggest_tracks_model_changes(self):
+        """Test that the index is kept current from model signals"""
+        url = reverse('search-suggest')
+        self.client.get(url, {'q': 'm'})
+        Tag.objects.create(name="Meditation")
+        response = self.client.get(url, {'q': 'medit', 'types': 'tag'})
+        self.assertEqual([s['text'] for s in response.data['suggestions']], ['Meditation'])
+
+        self.book.delete()
+        response = self.client.get(url, {'q': 'medit', 'types': 'book'})
+        self.assertEqual(response.data['suggestions'], [])
+
+    def test_stale_index_served_while_rebuilding(self):
+        """Test that a stale index keeps answering and schedules one background rebuild"""
+        url = reverse('search-suggest')
+        self.client.get(url, {'q': 'med'})
+        suggestion_index.built_at -= suggestion_index.refresh_seconds + 1
+
+        with mock.patch('search.suggest.run_in_background') as schedule:
+            for _ in range(2):
+                response = self.client.get(url, {'q': 'med'})
+                self.assertEqual(response.data['suggestions'][0]['id'], str(self.book.id))
+        schedule.assert_called_once()
+        suggestion_index._rebuilding = False
+
+    def test_first_query_builds_without_snapshot(self):
+        """Test that the first query builds the index itself rather than answering empty"""
+        with mock.patch('search.suggest.run_in_background') as schedule:
+            response = self.client.get(reverse('search-suggest'), {'q': 'med'})
+        self.assertEqual(response.data['suggestions'][0]['id'], str(self.book.id))
+        schedule.assert_not_called()
+
+    def test_updates_during_rebuild_are_kept(self):
+        """Test that a model saved while the index is being read survives the swap"""
+        url = reverse('search-suggest')
+        self.client.get(url, {'q': 'med'})
+        collect = suggestion_index._collect
+
+        def collect_then_save():
+            rows = list(collect())
+            Tag.objects.create(name="Meditation")
+            yield from rows
+
+        with mock.patch.object(suggestion_index, '_collect', collect_then_save):
+            suggestion_index.rebuild()
+        response = self.client.get(url, {'q': 'medit', 'types': 'tag'})
+        self.assertEqual([s['text'] for s in response.data['suggestions']], ['Meditation'])
+
+
+class TopicClusterTest(APITestCase):
+    def setUp(self):
+        self.library = Library.objects.create(name="Topic Library")
+        self.model = semantic_search_service.ai_provider
+        rng = np.random.RandomState(0)
+        centers = {'war': np.eye(8)[0], 'cooking': np.eye(8)[1]}
+        self.books = {}
+        for topic, titles in (
+            ('war', ["The Art of War", "War and Strategy", "On War"]),
+            ('cooking', ["Italian Cooking", "Cooking Basics", "French Cooking"]),
+        ):
+            for title in titles:
+                book = Book.objects.create(title=title)
+                library_book = LibraryBook.objects.create(library=self.library, book=book)
+                self.books[title] = book
+                self._embed('book', book.id, centers[topic] + rng.normal(0, 0.05, 8))
+                note = Note.objects.create(library_book=library_book, title=f"{topic} notes", content_markdown="")
+                self._embed('note', note.id, centers[topic] + rng.normal(0, 0.05, 8))
+
+    def _embed(self, owner_type, owner_id, vector):
+        SearchEmbedding.objects.create(
+            owner_type=owner_type,
+            owner_id=str(owner_id),
+            model=self.model,
+            vector=np.asarray(vector, dtype=np.float32).tobytes()
+        )
+
+    def test_topics_endpoint_builds_clusters(self):
+        """Test topics endpoint clusters a library and returns member counts"""
+        url = reverse('search-topics')
+        response = self.client.get(url, {'library_id': self.library.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        clusters = response.data['clusters']
+        self.assertEqual(len(clusters), 2)
+        self.assertEqual(sorted(c['label'].split(' · ')[0] for c in clusters), ['Cooking', 'War'])
+        for cluster in clusters:
+            self.assertEqual((cluster['books'], cluster['notes'], cluster['size']), (3, 3, 6))
+
+        war = next(c for c in clusters if c['label'].startswith('War'))
+        response = self.client.get(url, {'library_id': self.library.id, 'cluster_id': war['id']})
+        book_titles = {m['title'] for m in response.data['members'] if m['type'] == 'book'}
+        self.assertIn("The Art of War", book_titles)
+
+    def test_topics_not_rescheduled_while_clustering(self):
+        """Test that a request during a running clustering gets 202 without scheduling another run"""
+        url = reverse('search-topics')
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with self.settings(CACHES=locmem):
+            from django.core.cache import cache
+            cache.add(f'topics:cluster:{self.library.id}', True)
+            with mock.patch('search.topics.run_in_background') as schedule:
+                response = self.client.get(url, {'library_id': self.library.id})
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertTrue(response.data['building'])
+            schedule.assert_not_called()
+
+            # Once the run finishes the lock is released
+            cache.delete(f'topics:cluster:{self.library.id}')
+            response = self.client.get(url, {'library_id': self.library.id})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIsNone(cache.get(f'topics:cluster:{self.library.id}'))
+
+    def test_existing_map_served_while_building(self):
+        """Test that refreshes and updates wait for a running job and serve the existing map meanwhile"""
+        cluster_library(self.library.id)
+        TopicMap.objects.filter(library=self.library).update(is_stale=True)
+        url = reverse('search-topics')
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with self.settings(CACHES=locmem):
+            from django.core.cache import cache
+            cache.add(f'topics:cluster:{self.library.id}', True)
+            with mock.patch('search.topics.run_in_background') as schedule:
+                for params in ({'refresh': 'true'}, {}):
+                    response = self.client.get(url, {'library_id': self.library.id, **params})
+                    self.assertEqual(response.status_code, status.HTTP_200_OK)
+                    self.assertEqual(len(response.data['clusters']), 2)
+                    self.assertTrue(response.data['building'])
+                    self.assertTrue(response.data['stale'])
+            schedule.assert_not_called()
+            cache.delete(f'topics:cluster:{self.library.id}')
+
+    def test_failed_update_leaves_map_stale(self):
+        """Test that a topic map stays stale when its incremental update fails"""
+        cluster_library(self.library.id)
+        TopicMap.objects.filter(library=self.library).update(is_stale=True)
+        with mock.patch('search.topics.TopicAssignment.objects.bulk_create', side_effect=DatabaseError):
+            book = Book.objects.create(title="War Diaries")
+            LibraryBook.objects.create(library=self.library, book=book)
+            self._embed('book', book.id, np.eye(8)[0])
+            response = self.client.get(reverse('search-topics'), {'library_id': self.library.id})
+        self.assertTrue(response.data['stale'])
+        self.assertTrue(TopicMap.objects.get(library=self.library).is_stale)
+
+    def test_topics_update_incrementally(self):
+        """Test new embeddings are assigned to the nearest existing topic"""
+        cluster_library(self.library.id)
+        topic_map = TopicMap.objects.get(library=self.library)
+
+        book = Book.objects.create(title="War Diaries")
+        LibraryBook.objects.create(library=self.library, book=book)
+        self._embed('book', book.id, np.eye(8)[0])
+        topic_map.refresh_from_db()
+        self.assertTrue(topic_map.is_stale)
+
+        response = self.client.get(reverse('search-topics'), {'library_id': self.library.id})
+        self.assertFalse(response.data['stale'])
+        assignment = TopicAssignment.objects.get(owner_type='book', owner_id=str(book.id))
+        self.assertEqual(assignment.topic_map_id, topic_map.id)
+        self.assertEqual(
+            assignment.cluster,
+            TopicAssignment.objects.get(owner_type='book', owner_id=str(self.books["On War"].id)).cluster
+        )
+        self.assertEqual(assignment.cluster.size, 7)
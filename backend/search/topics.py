@@ -0,0 +1,259 @@
+import logging
+import math
+import re
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from preposition_core.background import run_in_background
+from .models import SearchEmbedding, TopicMap, TopicCluster, TopicAssignment
+from .services import semantic_search_service
+from books.models import Book
+from libraries.models import Library, LibraryBook
+from notes.models import Note
+
+logger = logging.getLogger(__name__)
+
+MIN_CLUSTERS = 2
+MAX_CLUSTERS = 30
+REFIT_RATIO = 0.25  # Re-cluster from scratch once this share of items is new
+LABEL_WORDS = 3
+LABEL_SAMPLE = 10  # Members nearest the centroid used to build its label
+CLUSTER_LOCK_SECONDS = 600  # Upper bound on a clustering run, after which the lock expires
+
+_WORD_RE = re.compile(r"[a-zA-Z][a-zA-Z'-]{2,}")
+_LABEL_STOP_WORDS = {
+    'the', 'and', 'for', 'with', 'from', 'into', 'about', 'that', 'this', 'your',
+    'book', 'books', 'notes', 'note', 'chapter', 'edition', 'volume', 'introduction',
+}
+
+
+def _library_items(library: Library, embedding_model: str) -> List[Tuple[str, str, bytes]]:
+    """Return ``(owner_type, owner_id, vector)`` for the library's book and note embeddings."""
+    book_ids = [str(pk) for pk in LibraryBook.objects.filter(library=library).values_list('book_id', flat=True)]
+    note_ids = [str(pk) for pk in Note.objects.filter(library_book__library=library).values_list('id', flat=True)]
+    items = []
+    for owner_type, owner_ids in (('book', book_ids), ('note', note_ids)):
+        if owner_ids:
+            items.extend(SearchEmbedding.objects.filter(
+                owner_type=owner_type, owner_id__in=owner_ids, model=embedding_model
+            ).values_list('owner_type', 'owner_id', 'vector'))
+    return items
+
+
+def _to_matrix(vectors: List[bytes], dimensions: int) -> np.ndarray:
+    """Stack vectors into unit-length rows, zero-padding or truncating to ``dimensions``."""
+    matrix = np.zeros((len(vectors), dimensions), dtype=np.float32)
+    for i, vector in enumerate(vectors):
+        values = np.frombuffer(bytes(vector), dtype=np.float32)[:dimensions]
+        matrix[i, :len(values)] = values
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _titles(refs: List[Tuple[str, str]]) -> Dict[Tuple[str, str], str]:
+    book_ids = [owner_id for owner_type, owner_id in refs if owner_type == 'book']
+    note_ids = [owner_id for owner_type, owner_id in refs if owner_type == 'note']
+    titles = {('book', str(pk)): title for pk, title in Book.objects.filter(id__in=book_ids).values_list('id', 'title')}
+    titles.update({('note', str(pk)): title for pk, title in Note.objects.filter(id__in=note_ids).values_list('id', 'title')})
+    return titles
+
+
+def _label(member_titles: List[str]) -> str:
+    """Label a cluster with the most frequent significant words of its central members."""
+    words = Counter()
+    for title in member_titles:
+        words.update({word.lower() for word in _WORD_RE.findall(title or '')} - _LABEL_STOP_WORDS)
+    top = [word for word, count in words.most_common(LABEL_WORDS) if count > 1 or len(member_titles) == 1]
+    if top:
+        return ' · '.join(word.capitalize() for word in top)
+    return member_titles[0] if member_titles else 'Untitled topic'
+
+
+def _default_cluster_count(items: int) -> int:
+    return max(MIN_CLUSTERS, min(MAX_CLUSTERS, round(math.sqrt(items / 2))))
+
+
+def cluster_library(library_id: int, n_clusters: Optional[int] = None, embedding_model: Optional[str] = None) -> Optional[TopicMap]:
+    """Cluster a library's embeddings with MiniBatchKMeans and replace its cached topic map."""
+    from sklearn.cluster import MiniBatchKMeans
+
+    library = Library.objects.get(id=library_id)
+    embedding_model = embedding_model or semantic_search_service.ai_provider
+    items = _library_items(library, embedding_model)
+    if len(items) < MIN_CLUSTERS:
+        logger.info(f"Not enough embeddings to cluster library {library_id}")
+        return None
+
+    dimensions = max(len(bytes(vector)) // 4 for _, _, vector in items)
+    matrix = _to_matrix([vector for _, _, vector in items], dimensions)
+    n_clusters = min(n_clusters or _default_cluster_count(len(items)), len(items))
+
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=0, batch_size=256, n_init=3)
+    labels = kmeans.fit_predict(matrix)
+    distances = np.linalg.norm(matrix - kmeans.cluster_centers_[labels], axis=1)
+
+    refs = [(owner_type, str(owner_id)) for owner_type, owner_id, _ in items]
+    titles = _titles(refs)
+
+    with transaction.atomic():
+        TopicMap.objects.filter(library=library).delete()
+        topic_map = TopicMap.objects.create(
+            library=library,
+            embedding_model=embedding_model,
+            dimensions=dimensions,
+            fitted_items=len(items)
+        )
+        clusters = []
+        for index in range(n_clusters):
+            members = np.where(labels == index)[0]
+            central = members[np.argsort(distances[members])][:LABEL_SAMPLE]
+            clusters.append(TopicCluster(
+                topic_map=topic_map,
+                index=index,
+                label=_label([titles.get(refs[i], '') for i in central])[:255],
+                centroid=kmeans.cluster_centers_[index].astype(np.float32).tobytes(),
+                size=len(members)
+            ))
+        clusters = TopicCluster.objects.bulk_create(clusters)
+        TopicAssignment.objects.bulk_create([
+            TopicAssignment(
+                topic_map=topic_map,
+                cluster=clusters[labels[i]],
+                owner_type=owner_type,
+                owner_id=owner_id,
+                distance=float(distances[i])
+            )
+            for i, (owner_type, owner_id) in enumerate(refs)
+        ], batch_size=1000)
+
+    logger.info(f"Clustered {len(items)} items of library {library_id} into {n_clusters} topics")
+    return topic_map
+
+
+def _cluster_lock_key(library_id: int) -> str:
+    return f"topics:cluster:{library_id}"
+
+
+def topics_in_flight(library_id: int) -> bool:
+    """Whether a clustering run or incremental update for the library holds its lock."""
+    return cache.get(_cluster_lock_key(library_id)) is not None
+
+
+@contextmanager
+def topics_lock(library_id: int):
+    """Hold the library's topics lock for the block; yields False, without it, when a run holds it."""
+    acquired = cache.add(_cluster_lock_key(library_id), True, CLUSTER_LOCK_SECONDS)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            cache.delete(_cluster_lock_key(library_id))
+
+
+def schedule_clustering(library_id: int) -> bool:
+    """Cluster a library on the background pool unless a run for it is already in flight.
+
+    Returns False when another run holds the lock.
+    """
+    return _schedule_locked(cluster_library, library_id)
+
+
+def schedule_topic_update(library_id: int) -> bool:
+    """Update a library's topic map on the background pool, under the same lock as clustering.
+
+    Both replace the map's rows, so at most one of them runs per library.
+    """
+    return _schedule_locked(update_library_topics, library_id)
+
+
+def _schedule_locked(job, library_id: int) -> bool:
+    if not cache.add(_cluster_lock_key(library_id), True, CLUSTER_LOCK_SECONDS):
+        return False
+    run_in_background(_run_locked, job, library_id)
+    return True
+
+
+def _run_locked(job, library_id: int) -> Optional[TopicMap]:
+    try:
+        return job(library_id)
+    finally:
+        cache.delete(_cluster_lock_key(library_id))
+
+
+def update_library_topics(library_id: int) -> Optional[TopicMap]:
+    """Bring a library's topic map up to date with its embeddings.
+
+    New embeddings are assigned to the nearest centroid, and each centroid moves
+    by a running-mean step, the same online update MiniBatchKMeans applies.
+    Removed owners lose their assignments. The library is re-clustered from
+    scratch when no map exists or when too much of it is new.
+
+    The stale flag is cleared as the update starts, so embeddings arriving
+    during it mark the map stale again, and restored if the update fails.
+    """
+    topic_map = TopicMap.objects.filter(library_id=library_id).first()
+    if topic_map is None:
+        return cluster_library(library_id)
+
+    TopicMap.objects.filter(id=topic_map.id).update(is_stale=False)
+    topic_map.is_stale = False
+    try:
+        return _update_topic_map(topic_map)
+    except Exception:
+        TopicMap.objects.filter(id=topic_map.id).update(is_stale=True)
+        raise
+
+
+def _update_topic_map(topic_map: TopicMap) -> Optional[TopicMap]:
+    library_id = topic_map.library_id
+    items = _library_items(topic_map.library, topic_map.embedding_model)
+    current = {(owner_type, str(owner_id)): vector for owner_type, owner_id, vector in items}
+    assigned = set(topic_map.assignments.values_list('owner_type', 'owner_id'))
+    new_refs = [ref for ref in current if ref not in assigned]
+    removed_refs = assigned - set(current)
+
+    if len(new_refs) > REFIT_RATIO * max(topic_map.fitted_items, 1):
+        return cluster_library(library_id, embedding_model=topic_map.embedding_model)
+
+    clusters = list(topic_map.clusters.order_by('index'))
+    if not clusters:
+        return cluster_library(library_id, embedding_model=topic_map.embedding_model)
+    centroids = np.stack([np.frombuffer(bytes(c.centroid), dtype=np.float32) for c in clusters]).copy()
+    sizes = np.array([c.size for c in clusters], dtype=np.float64)
+
+    with transaction.atomic():
+        for owner_type, owner_id in removed_refs:
+            topic_map.assignments.filter(owner_type=owner_type, owner_id=owner_id).delete()
+
+        assignments = []
+        if new_refs:
+            matrix = _to_matrix([current[ref] for ref in new_refs], topic_map.dimensions)
+            for row, (owner_type, owner_id) in zip(matrix, new_refs):
+                distances = np.linalg.norm(centroids - row, axis=1)
+                index = int(np.argmin(distances))
+                sizes[index] += 1
+                centroids[index] += (row - centroids[index]) / sizes[index]
+                assignments.append(TopicAssignment(
+                    topic_map=topic_map,
+                    cluster=clusters[index],
+                    owner_type=owner_type,
+                    owner_id=owner_id,
+                    distance=float(distances[index])
+                ))
+            TopicAssignment.objects.bulk_create(assignments, batch_size=1000)
+
+        member_counts = dict(topic_map.assignments.values_list('cluster_id').annotate(count=Count('id')))
+        for index, cluster in enumerate(clusters):
+            cluster.centroid = centroids[index].astype(np.float32).tobytes()
+            cluster.size = member_counts.get(cluster.id, 0)
+        TopicCluster.objects.bulk_update(clusters, ['centroid', 'size'])
+
+        topic_map.save(update_fields=['updated_at'])
+
+    logger.info(f"Updated topics for library {library_id}: {len(new_refs)} assigned, {len(removed_refs)} removed")
+    return topic_map
@@ -3,17 +3,30 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
-from django.db.models import Q
-from .models import SearchEmbedding
+from django.db.models import F, Q, Count, Min, OuterRef, Subquery, Window
+from django.db.models.functions import RowNumber
+import logging
+import time
+from .models import SearchEmbedding, TopicMap
 from .serializers import (
     SearchEmbeddingSerializer, BasicSearchSerializer,
-    SemanticSearchSerializer, SearchResultSerializer
+    SemanticSearchSerializer, SearchResultSerializer, SuggestSerializer,
+    TopicsSerializer
 )
 from books.models import Book
-from libraries.models import LibraryBook
-from notes.models import Note, Review
-from files.models import BookFile
+from books.isbn import normalize_isbn
+from libraries.models import LibraryBook, LibraryBookTag, ShelfItem
+from notes.models import Note, Rating, Review
+from files.models import BookFile, BookFilePage
 from .services import semantic_search_service
+from .suggest import suggestion_index
+from .topics import schedule_clustering, schedule_topic_update, topics_in_flight
+
+logger = logging.getLogger(__name__)
+
+# Bounds on page-level file hits in basic search
+MAX_FILE_HITS = 100
+MAX_PAGES_PER_FILE = 50
 
 
 class SearchEmbeddingViewSet(viewsets.ModelViewSet):
@@ -46,44 +59,43 @@ class SearchViewSet(viewsets.ViewSet):
         
         # Search in books with enhanced scoring
         book_results = []
-        book_queryset = Book.objects.filter(
+        book_filter = (
             Q(title__icontains=query) |
-            Q(primary_isbn_13__icontains=query) |
-            Q(isbn_10__icontains=query) |
             Q(authors__name__icontains=query) |
             Q(subtitle__icontains=query) |
             Q(description__icontains=query) |
             Q(publisher__icontains=query)
-        ).distinct()
+        )
+        # ISBN queries hit the canonical ISBN index instead of scanning ISBN columns
+        canonical_isbn = normalize_isbn(query)
+        if canonical_isbn:
+            book_filter |= Q(canonical_isbn=canonical_isbn)
+        book_queryset = Book.objects.filter(book_filter).distinct()
         
         # Apply additional filters
         if author:
             book_queryset = book_queryset.filter(authors__name__icontains=author)
         
-        for book in book_queryset:
-            # Check if book is in the specified library
-            if library_id:
-                library_book = LibraryBook.objects.filter(library_id=library_id, book=book).first()
-                if not library_book:
-                    continue
-                
-                # Apply tag filter
-                if tag:
-                    if not library_book.tags.filter(name__icontains=tag).exists():
-                        continue
-                
-                # Apply rating filter
-                if rating:
-                    book_rating = library_book.ratings.first()
-                    if not book_rating or book_rating.rating < int(rating):
-                        continue
-                
-                # Apply shelf filter
-                if shelf:
-                    if not library_book.shelves.filter(name__icontains=shelf).exists():
-                        continue
-            else:
-                library_book = None
+        # Restrict to the library and apply library-specific filters in the database
+        library_book_ids = {}
+        if library_id:
+            library_books = LibraryBook.objects.filter(library_id=library_id)
+            if tag:
+                library_books = library_books.filter(tags__name__icontains=tag)
+            if rating:
+                library_books = library_books.annotate(
+                    latest_rating=self._latest_rating()
+                ).filter(latest_rating__gte=rating)
+            if shelf:
+                library_books = library_books.filter(shelves__name__icontains=shelf)
+            
+            book_queryset = book_queryset.filter(library_books__in=library_books.values('id'))
+            library_book_ids = dict(
+                library_books.filter(book__in=book_queryset.values('id')).values_list('book_id', 'id')
+            )
+        
+        for book in book_queryset.prefetch_related('authors'):
+            library_book_id = library_book_ids.get(book.id)
             
             # Calculate relevance score
             score = self._calculate_book_score(book, query)
@@ -99,7 +111,7 @@ class SearchViewSet(viewsets.ViewSet):
                 'snippet': snippet,
                 'url': f'/api/books/{book.id}/',
                 'authors': [author.name for author in book.authors.all()],
-                'library_book_id': str(library_book.id) if library_book else None
+                'library_book_id': str(library_book_id) if library_book_id else None
             })
         
         # Search in notes
@@ -144,43 +156,60 @@ class SearchViewSet(viewsets.ViewSet):
                 'url': f'/api/reviews/{review.id}/'
             })
         
-        # Search in file text
+        # Search in file text, page by page
         file_results = []
-        file_queryset = BookFile.objects.filter(
-            Q(text_extracted=True) &
-            Q(extracted_text__icontains=query)
+        page_queryset = BookFilePage.objects.filter(book_file__text_extracted=True, text__icontains=query)
+        if library_id:
+            page_queryset = page_queryset.filter(book_file__library_book__library_id=library_id)
+        file_hits = {
+            hit['book_file_id']: hit
+            for hit in page_queryset.order_by().values('book_file_id').annotate(
+                first_page=Min('page_number'), matches=Count('id')
+            ).order_by('book_file_id')[:MAX_FILE_HITS]
+        }
+        
+        # Pages are numbered within each file so only the first few are listed, and only the first is read
+        ranked_pages = page_queryset.filter(book_file_id__in=file_hits).annotate(
+            rank=Window(RowNumber(), partition_by=[F('book_file_id')], order_by=F('page_number').asc())
         )
-        
+        matched_pages = {}
+        if file_hits:
+            for book_file_id, page_number in ranked_pages.filter(rank__lte=MAX_PAGES_PER_FILE).order_by(
+                'book_file_id', 'page_number'
+            ).values_list('book_file_id', 'page_number'):
+                matched_pages.setdefault(book_file_id, []).append(page_number)
+        first_pages = dict(ranked_pages.filter(rank=1).values_list('book_file_id', 'text')) if file_hits else {}
+        
+        file_queryset = BookFile.objects.filter(id__in=file_hits).select_related('library_book__book').defer('extracted_text')
         for book_file in file_queryset:
-            if library_id:
-                if book_file.library_book.library_id != library_id:
-                    continue
-            
-            # Find the matching text snippet
-            text = book_file.extracted_text
-            query_lower = query.lower()
-            text_lower = text.lower()
-            
-            # Find the position of the query in the text
-            pos = text_lower.find(query_lower)
-            if pos != -1:
-                # Extract a snippet around the match
-                start = max(0, pos - 100)
-                end = min(len(text), pos + len(query) + 100)
-                snippet = text[start:end]
-                if start > 0:
-                    snippet = '...' + snippet
-                if end < len(text):
-                    snippet = snippet + '...'
-            else:
-                snippet = text[:200] + '...' if len(text) > 200 else text
-            
+            hit = file_hits[book_file.id]
             file_results.append({
                 'id': str(book_file.id),
                 'title': f"{book_file.library_book.book.title} - {book_file.file_type.upper()}",
                 'type': 'file_text',
                 'score': 0.6,
-                'snippet': snippet,
+                'snippet': self._create_text_snippet(first_pages.get(book_file.id, ''), query),
+                'page': hit['first_page'],
+                'pages': matched_pages.get(book_file.id, []),
+                'page_matches': hit['matches'],
+                'url': f'/api/files/{book_file.id}/'
+            })
+        
+        # Files extracted before text was stored per page only have the joined text
+        legacy_queryset = BookFile.objects.filter(
+            text_extracted=True, page_count__isnull=True, extracted_text__icontains=query
+        ).select_related('library_book__book')
+        if library_id:
+            legacy_queryset = legacy_queryset.filter(library_book__library_id=library_id)
+        for book_file in legacy_queryset:
+            file_results.append({
+                'id': str(book_file.id),
+                'title': f"{book_file.library_book.book.title} - {book_file.file_type.upper()}",
+                'type': 'file_text',
+                'score': 0.6,
+                'snippet': self._create_text_snippet(book_file.extracted_text, query),
+                'page': None,
+                'pages': [],
                 'url': f'/api/files/{book_file.id}/'
             })
         
@@ -188,7 +217,66 @@ class SearchViewSet(viewsets.ViewSet):
         all_results = book_results + note_results + review_results + file_results
         all_results.sort(key=lambda x: x['score'], reverse=True)
         
-        return Response({'results': all_results})
+        response_data = {'results': all_results}
+        if serializer.validated_data.get('facets'):
+            response_data['facets'] = self._compute_facets(book_queryset, library_id)
+        
+        return Response(response_data)
+    
+    def _compute_facets(self, book_queryset, library_id=None, limit=20):
+        """Compute facet counts for matched books with grouped aggregate queries."""
+        match_ids = book_queryset.order_by().values('id')
+        books = Book.objects.filter(id__in=match_ids)
+        
+        # Library-scoped facets count each matching book once per value
+        library_book_filter = Q(library_book__book_id__in=match_ids)
+        if library_id:
+            library_book_filter &= Q(library_book__library_id=library_id)
+        
+        def histogram(queryset, field, count_field):
+            rows = queryset.values(field).annotate(
+                count=Count(count_field, distinct=True)
+            ).order_by('-count', field)[:limit]
+            return [{'value': row[field], 'count': row['count']} for row in rows]
+        
+        # Bucket by each library book's latest rating, as the rating filter does
+        rated = LibraryBook.objects.filter(book_id__in=match_ids)
+        if library_id:
+            rated = rated.filter(library_id=library_id)
+        rating_counts = rated.annotate(latest_rating=self._latest_rating()).exclude(
+            latest_rating__isnull=True
+        ).order_by().values('latest_rating').annotate(count=Count('book_id', distinct=True))
+        rating_counts = {row['latest_rating']: row['count'] for row in rating_counts}
+        
+        return {
+            'authors': histogram(Book.authors.through.objects.filter(book_id__in=match_ids), 'author__name', 'book_id'),
+            'tags': histogram(LibraryBookTag.objects.filter(library_book_filter), 'tag__name', 'library_book__book_id'),
+            'shelves': histogram(ShelfItem.objects.filter(library_book_filter), 'shelf__name', 'library_book__book_id'),
+            'ratings': [{'value': value, 'count': rating_counts.get(value, 0)} for value in range(5, 0, -1)],
+            'languages': histogram(books.exclude(language=''), 'language', 'id'),
+            'publishers': histogram(books.exclude(publisher__isnull=True).exclude(publisher=''), 'publisher', 'id'),
+        }
+    
+    def _latest_rating(self):
+        """Subquery for the most recent rating of the outer library book."""
+        return Subquery(
+            Rating.objects.filter(library_book=OuterRef('pk')).order_by('-created_at').values('rating')[:1]
+        )
+    
+    def _create_text_snippet(self, text, query):
+        """Create a snippet of text around the first match of the query."""
+        pos = text.lower().find(query.lower())
+        if pos == -1:
+            return text[:200] + '...' if len(text) > 200 else text
+        
+        start = max(0, pos - 100)
+        end = min(len(text), pos + len(query) + 100)
+        snippet = text[start:end]
+        if start > 0:
+            snippet = '...' + snippet
+        if end < len(text):
+            snippet = snippet + '...'
+        return snippet
     
     def _calculate_book_score(self, book, query):
         """Calculate relevance score for a book based on query."""
@@ -202,9 +290,8 @@ class SearchViewSet(viewsets.ViewSet):
                 score += 5.0  # Bonus for title starting with query
         
         # ISBN match (high weight)
-        if query in (book.primary_isbn_13 or ''):
-            score += 8.0
-        if query in (book.isbn_10 or ''):
+        canonical_isbn = normalize_isbn(query)
+        if canonical_isbn and book.canonical_isbn == canonical_isbn:
             score += 8.0
         
         # Author match (high weight)
@@ -252,6 +339,110 @@ class SearchViewSet(viewsets.ViewSet):
         else:
             return book.title
 
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """Prefix autocomplete over book titles, authors, tags and shelves."""
+        serializer = SuggestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        query = serializer.validated_data['q']
+        limit = serializer.validated_data['limit']
+        types = serializer.validated_data.get('types')
+
+        started = time.perf_counter()
+        suggestions = suggestion_index.suggest(query, limit, types)
+        took_ms = (time.perf_counter() - started) * 1000
+
+        url_prefixes = {
+            'book': '/api/books/',
+            'author': '/api/authors/',
+            'tag': '/api/tags/',
+            'shelf': '/api/shelves/',
+        }
+        for suggestion in suggestions:
+            suggestion['url'] = f"{url_prefixes[suggestion['type']]}{suggestion['id']}/"
+
+        return Response({
+            'query': query,
+            'suggestions': suggestions,
+            'took_ms': round(took_ms, 3)
+        })
+
+    @action(detail=False, methods=['get'])
+    def topics(self, request):
+        """Topic clusters of a library's books and notes, served from the cached topic map."""
+        serializer = TopicsSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        library_id = serializer.validated_data['library_id']
+        cluster_id = serializer.validated_data.get('cluster_id')
+
+        topic_map = TopicMap.objects.filter(library_id=library_id).first()
+        # Clustering and incremental updates share one lock, so neither is scheduled during the other
+        if topic_map is None or serializer.validated_data['refresh']:
+            schedule_clustering(library_id)
+        elif topic_map.is_stale:
+            schedule_topic_update(library_id)
+
+        # Jobs that already finished (inline ones) are reflected; otherwise the existing map is served meanwhile
+        topic_map = TopicMap.objects.filter(library_id=library_id).first()
+        building = topics_in_flight(library_id)
+        if topic_map is None:
+            return Response({
+                'library_id': library_id,
+                'building': True,
+                'clusters': []
+            }, status=status.HTTP_202_ACCEPTED)
+
+        counts = {}
+        for cluster, owner_type, count in topic_map.assignments.values_list('cluster_id', 'owner_type').annotate(count=Count('id')):
+            counts.setdefault(cluster, {})[owner_type] = count
+
+        clusters = [
+            {
+                'id': cluster.id,
+                'label': cluster.label,
+                'size': cluster.size,
+                'books': counts.get(cluster.id, {}).get('book', 0),
+                'notes': counts.get(cluster.id, {}).get('note', 0),
+            }
+            for cluster in topic_map.clusters.order_by('-size', 'index')
+        ]
+
+        response = {
+            'library_id': library_id,
+            'building': building,
+            'stale': building or topic_map.is_stale,
+            'updated_at': topic_map.updated_at,
+            'clusters': clusters
+        }
+        if cluster_id is not None:
+            response['members'] = self._topic_members(topic_map, cluster_id)
+        return Response(response)
+
+    def _topic_members(self, topic_map, cluster_id):
+        """Books and notes of one cluster, nearest to the centroid first."""
+        assignments = list(
+            topic_map.assignments.filter(cluster_id=cluster_id)
+            .order_by('distance')
+            .values_list('owner_type', 'owner_id', 'distance')
+        )
+        book_ids = [owner_id for owner_type, owner_id, _ in assignments if owner_type == 'book']
+        note_ids = [owner_id for owner_type, owner_id, _ in assignments if owner_type == 'note']
+        titles = {('book', str(pk)): title for pk, title in Book.objects.filter(id__in=book_ids).values_list('id', 'title')}
+        titles.update({('note', str(pk)): title for pk, title in Note.objects.filter(id__in=note_ids).values_list('id', 'title')})
+
+        return [
+            {
+                'type': owner_type,
+                'id': owner_id,
+                'title': titles[(owner_type, owner_id)],
+                'distance': round(distance, 4)
+            }
+            for owner_type, owner_id, distance in assignments
+            if (owner_type, owner_id) in titles
+        ]
+
     @action(detail=False, methods=['post'])
     def semantic(self, request):
         """Semantic search using embeddings."""
@@ -3,7 +3,8 @@ import { Star, Tag, Calendar, MoreVertical } from 'lucide-react'
 import { useState, useEffect, useRef } from 'react'
 
 const BookCard = ({ book, libraryId, libraryBookId, onDelete, libraryName }) => {
-  const { id, title, subtitle, authors, cover_url, tags = [], rating } = book
+  const { id, title, subtitle, authors, cover, tags = [], rating } = book
+  const cover_url = cover?.list || book.cover_url
   const [showMenu, setShowMenu] = useState(false)
   const menuRef = useRef(null)
 
@@ -39,6 +39,13 @@ const CoverImageManager = ({ book, onCoverChange }) => {
       // Update the book with the new cover URL
       await booksAPI.update(book.id, { cover_url: coverUrl })
       
+      // Cache it locally so lists load small variants instead of the remote image
+      try {
+        await booksAPI.cacheCover(book.id, coverUrl)
+      } catch (cacheError) {
+        console.error('Failed to cache cover:', cacheError)
+      }
+      
       // Notify parent component
       if (onCoverChange) {
         onCoverChange(coverUrl)
@@ -14,6 +14,28 @@ const FileList = ({ libraryBookId }) => {
     loadFiles()
   }, [libraryBookId])
 
+  // Poll the status of extractions still in progress
+  useEffect(() => {
+    const active = files.filter(file => ['queued', 'running'].includes(file.extraction_status))
+    if (active.length === 0) {
+      return
+    }
+    const timer = setTimeout(async () => {
+      try {
+        const statuses = await Promise.all(active.map(file => filesAPI.getExtractionStatus(file.id)))
+        if (statuses.some(response => !['queued', 'running'].includes(response.data.extraction_status))) {
+          await loadFiles()
+        } else {
+          const byId = Object.fromEntries(statuses.map(response => [response.data.id, response.data]))
+          setFiles(current => current.map(file => byId[file.id] ? { ...file, ...byId[file.id] } : file))
+        }
+      } catch (error) {
+        console.error('Failed to check extraction status:', error)
+      }
+    }, 2000)
+    return () => clearTimeout(timer)
+  }, [files])
+
   const loadFiles = async () => {
     try {
       setLoading(true)
@@ -53,11 +75,8 @@ const FileList = ({ libraryBookId }) => {
   }
 
   const handleReadPDF = (file) => {
-    // Construct the PDF URL - this will need to be adjusted based on your backend setup
-    const baseUrl = 'http://localhost:8000' // Use explicit localhost for now
-    const pdfUrl = `${baseUrl}/media/${file.file_path}`
     setSelectedPDF({
-      url: pdfUrl,
+      url: filesAPI.downloadUrl(file.id),
       name: file.filename || file.file_path.split('/').pop(),
       bookFileId: file.id
     })
@@ -153,9 +172,16 @@ const FileList = ({ libraryBookId }) => {
                 </div>
                 
                 {/* Text extraction status */}
-                {file.file_type === 'pdf' && (
+                {['pdf', 'epub'].includes(file.file_type) && (
                   <div className="flex items-center space-x-2 mt-2">
-                    {file.text_extracted ? (
+                    {['queued', 'running'].includes(file.extraction_status) ? (
+                      <>
+                        <Loader className="h-4 w-4 text-blue-500 animate-spin" />
+                        <span className="text-sm text-blue-600 dark:text-blue-400">
+                          {file.extraction_status === 'queued' ? 'Text extraction queued' : `Extracting text (${file.extraction_progress}%)`}
+                        </span>
+                      </>
+                    ) : file.text_extracted ? (
                       <>
                         <CheckCircle className="h-4 w-4 text-green-500" />
                         <span className="text-sm text-green-600 dark:text-green-400">
@@ -166,7 +192,7 @@ const FileList = ({ libraryBookId }) => {
                       <>
                         <AlertCircle className="h-4 w-4 text-yellow-500" />
                         <span className="text-sm text-yellow-600 dark:text-yellow-400">
-                          Text not extracted
+                          {file.extraction_status === 'failed' ? 'Text extraction failed' : 'Text not extracted'}
                         </span>
                         <button
                           onClick={() => handleExtractText(file.id)}
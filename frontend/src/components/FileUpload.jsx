@@ -1,6 +1,18 @@
 import { useState, useRef } from 'react'
 import { Upload, FileText, X, CheckCircle, AlertCircle, Loader } from 'lucide-react'
-import { filesAPI } from '../utils/api'
+import { filesAPI, uploadsAPI } from '../utils/api'
+
+// Files larger than this go through resumable chunked uploads
+const SINGLE_UPLOAD_LIMIT = 50 * 1024 * 1024 // 50MB
+const MAX_FILE_SIZE = 2 * 1024 * 1024 * 1024 // 2GB
+
+const sha256Hex = async (blob) => {
+  const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer())
+  return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('')
+}
+
+// Remember open sessions so a retried upload of the same file resumes where it stopped
+const sessionKey = (file, libraryBookId) => `upload:${libraryBookId}:${file.name}:${file.size}:${file.lastModified}`
 
 const FileUpload = ({ libraryBookId, onUploadComplete }) => {
   const [isDragging, setIsDragging] = useState(false)
@@ -45,10 +57,9 @@ const FileUpload = ({ libraryBookId, onUploadComplete }) => {
       return
     }
 
-    // Validate file size (50MB limit)
-    const maxSize = 50 * 1024 * 1024 // 50MB
-    if (file.size > maxSize) {
-      setError('File size must be less than 50MB')
+    // Validate file size (2GB limit)
+    if (file.size > MAX_FILE_SIZE) {
+      setError('File size must be less than 2GB')
       return
     }
 
@@ -58,16 +69,21 @@ const FileUpload = ({ libraryBookId, onUploadComplete }) => {
     setUploadProgress(0)
 
     try {
-      const formData = new FormData()
-      formData.append('file', file)
-      formData.append('library_book', libraryBookId)
-
-      const response = await filesAPI.create(formData, {
-        onUploadProgress: (progressEvent) => {
-          const progress = Math.round((progressEvent.loaded * 100) / progressEvent.total)
-          setUploadProgress(progress)
-        }
-      })
+      let response
+      if (file.size > SINGLE_UPLOAD_LIMIT) {
+        response = await uploadInChunks(file)
+      } else {
+        const formData = new FormData()
+        formData.append('file', file)
+        formData.append('library_book', libraryBookId)
+
+        response = await filesAPI.create(formData, {
+          onUploadProgress: (progressEvent) => {
+            const progress = Math.round((progressEvent.loaded * 100) / progressEvent.total)
+            setUploadProgress(progress)
+          }
+        })
+      }
 
       setSuccess('File uploaded successfully!')
       setUploadProgress(100)
@@ -89,13 +105,47 @@ const FileUpload = ({ libraryBookId, onUploadComplete }) => {
     }
   }
 
+  const uploadInChunks = async (file) => {
+    const key = sessionKey(file, libraryBookId)
+    let session = null
+    const savedId = localStorage.getItem(key)
+    if (savedId) {
+      try {
+        session = (await uploadsAPI.getById(savedId)).data
+      } catch {
+        localStorage.removeItem(key)
+      }
+    }
+    if (!session) {
+      session = (await uploadsAPI.create({ library_book: libraryBookId, filename: file.name, size: file.size })).data
+      localStorage.setItem(key, session.id)
+    }
+
+    let offset = session.offset
+    while (offset < file.size) {
+      const chunk = file.slice(offset, offset + session.max_chunk_size)
+      try {
+        offset = (await uploadsAPI.putChunk(session.id, offset, chunk, await sha256Hex(chunk))).data.offset
+      } catch (error) {
+        // Another request already stored this chunk; continue from the server's offset
+        if (error.response?.status !== 409) throw error
+        offset = error.response.data.offset
+      }
+      setUploadProgress(Math.round((offset * 100) / file.size))
+    }
+
+    const response = await uploadsAPI.complete(session.id)
+    localStorage.removeItem(key)
+    return response
+  }
+
   const handleExtractText = async (fileId) => {
     try {
       setUploading(true)
       setError(null)
       
       await filesAPI.extractText(fileId)
-      setSuccess('Text extraction completed!')
+      setSuccess('Text extraction started')
       
       if (onUploadComplete) {
         // Refresh the file list
@@ -149,7 +199,7 @@ const FileUpload = ({ libraryBookId, onUploadComplete }) => {
         </p>
         
         <p className="text-sm text-gray-500 dark:text-gray-400">
-          Maximum file size: 50MB
+          Maximum file size: 2GB
         </p>
       </div>
 
@@ -6,6 +6,9 @@ import {
 } from 'lucide-react'
 import { pdfHighlightsAPI } from '../utils/api'
 
+// Highlights are fetched for this many pages at a time
+const HIGHLIGHT_WINDOW = 50
+
 // Set up PDF.js worker
 pdfjs.GlobalWorkerOptions.workerSrc = '/pdf.worker.min.js'
 
@@ -31,6 +34,7 @@ const PDFReader = ({
   
   const canvasRef = useRef(null)
   const documentRef = useRef(null)
+  const loadedWindowsRef = useRef(new Set())
 
   const onDocumentLoadSuccess = useCallback(({ numPages }) => {
     console.log('PDF loaded successfully:', { numPages, fileUrl })
@@ -205,21 +209,40 @@ const PDFReader = ({
     return () => document.removeEventListener('keydown', handleKeyDown)
   }, [changePage, changeScale, rotate, isHighlighting])
 
-  // Load existing highlights when component mounts
+  // Start a fresh set of loaded windows when the file changes
+  useEffect(() => {
+    loadedWindowsRef.current = new Set()
+    setHighlights([])
+  }, [bookFileId])
+
+  // Load the highlights for the window of pages around the current page, once per window
   useEffect(() => {
     const loadHighlights = async () => {
-      if (bookFileId) {
-        try {
-          const response = await pdfHighlightsAPI.getByBookFile(bookFileId)
-          setHighlights(response.data.results || response.data || [])
-        } catch (error) {
-          console.error('Failed to load highlights:', error)
-        }
+      const start = Math.floor((pageNumber - 1) / HIGHLIGHT_WINDOW) * HIGHLIGHT_WINDOW + 1
+      if (!bookFileId || loadedWindowsRef.current.has(start)) return
+      loadedWindowsRef.current.add(start)
+      try {
+        const { data } = await pdfHighlightsAPI.getWindow(bookFileId, start, start + HIGHLIGHT_WINDOW - 1, { text: 1 })
+        const loaded = data.id.map((id, i) => ({
+          id,
+          book_file: bookFileId,
+          page: data.page[i],
+          x: data.x[i],
+          y: data.y[i],
+          width: data.width[i],
+          height: data.height[i],
+          color: data.colors[data.color[i]],
+          text: data.text[i],
+        }))
+        setHighlights(prev => [...prev.filter(h => h.page < start || h.page >= start + HIGHLIGHT_WINDOW), ...loaded])
+      } catch (error) {
+        loadedWindowsRef.current.delete(start)
+        console.error('Failed to load highlights:', error)
       }
     }
     
     loadHighlights()
-  }, [bookFileId])
+  }, [bookFileId, pageNumber])
 
   // Set up loading timeout
   useEffect(() => {
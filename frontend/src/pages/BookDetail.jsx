@@ -333,7 +333,7 @@ const BookDetail = () => {
           <div className="flex-shrink-0">
             {book.cover_url ? (
               <img
-                src={book.cover_url}
+                src={book.cover?.detail || book.cover_url}
                 alt={book.title}
                 className="w-32 h-40 object-cover rounded-2xl shadow-soft"
               />
@@ -52,11 +52,23 @@ export const booksAPI = {
   // Ingest book by ISBN
   ingest: (data) => api.post('/books/ingest/', data),
   
+  // Ingest many ISBNs; the response is NDJSON, one progress line per ISBN
+  bulkIngest: (data) => api.post('/books/bulk_ingest/', data, { responseType: 'text' }),
+  
   // Search for cover images
   searchCovers: (data) => api.post('/books/search_covers/', data),
   
+  // Download a chosen cover once and get local resized variant URLs
+  cacheCover: (id, url) => api.post(`/books/${id}/cache_cover/`, { url }),
+  
   // Categorize book
   categorize: (data) => api.post('/books/categorize/', data),
+
+  // Categorize a list of books, or start categorizing a library in the background
+  categorizeBatch: (data) => api.post('/books/categorize_batch/', data),
+
+  // Status and results of the latest library categorization
+  getCategorizeBatchStatus: (libraryId) => api.get('/books/categorize_batch/', { params: { library_id: libraryId } }),
 }
 
 export const tagsAPI = {
@@ -312,8 +324,40 @@ export const filesAPI = {
   // Delete file
   delete: (id) => api.delete(`/files/${id}/`),
   
-  // Extract text from PDF
+  // Extract text from PDF (runs in the background)
   extractText: (id) => api.post(`/files/${id}/extract_text/`),
+  
+  // Get text extraction status and progress
+  getExtractionStatus: (id) => api.get(`/files/${id}/status/`),
+  
+  // Get extracted text for a window of pages (1-based, inclusive)
+  getPages: (id, start, end) => api.get(`/files/${id}/pages/`, { params: { start, end } }),
+  
+  // URL of the file itself (supports Range requests); pass true to download as an attachment
+  downloadUrl: (id, attachment = false) => `${API_BASE_URL}/files/${id}/download/${attachment ? '?download=1' : ''}`,
+}
+
+export const uploadsAPI = {
+  // Open a resumable upload session: { library_book, filename, size, checksum? }
+  create: (data) => api.post('/uploads/', data),
+  
+  // Get a session, including the offset to resume from
+  getById: (id) => api.get(`/uploads/${id}/`),
+  
+  // Send one chunk at the session's offset with its SHA-256
+  putChunk: (id, offset, chunk, checksum, config = {}) => api.put(`/uploads/${id}/chunks/${offset}/`, chunk, {
+    ...config,
+    headers: {
+      'Content-Type': 'application/octet-stream',
+      'Upload-Checksum': checksum,
+    },
+  }),
+  
+  // Assemble the received chunks into a book file
+  complete: (id) => api.post(`/uploads/${id}/complete/`),
+  
+  // Cancel a session and delete its chunks
+  delete: (id) => api.delete(`/uploads/${id}/`),
 }
 
 export const pdfHighlightsAPI = {
@@ -334,12 +378,23 @@ export const pdfHighlightsAPI = {
   
   // Delete highlight
   delete: (id) => api.delete(`/pdf-highlights/${id}/`),
+  
+  // Get highlights on pages start to end (inclusive) as parallel arrays
+  getWindow: (bookFileId, start, end, params = {}) => api.get('/pdf-highlights/window/', {
+    params: { book_file: bookFileId, start, end, ...params },
+  }),
+  
+  // Create, update and delete many highlights at once: { create: [], update: [{ id, ... }], delete: [ids] }
+  bulk: (changes) => api.post('/pdf-highlights/bulk/', changes),
 }
 
 export const searchAPI = {
   // Basic search
   basic: (query, params = {}) => api.get('/search/basic/', { params: { q: query, ...params } }),
   
+  // Autocomplete
+  suggest: (query, params = {}) => api.get('/search/suggest/', { params: { q: query, ...params } }),
+  
   // Semantic search
   semantic: (data) => api.post('/search/semantic/', data),
   